@@ -0,0 +1,60 @@
+"""Compare find/du of CCIFileSystem and LocalFileSystem on a synthetic tree.
+
+The tree has ``--dirs`` directories of ``--files`` empty files each, split in
+two levels like the cache volumes. Pass ``--root`` to reuse a tree, e.g., on
+NFS, where the speed-up of the thread pool is larger.
+
+Usage: python benchmarks/cci_filesystem.py [--dirs N] [--files N] [--root PATH]
+"""
+
+import argparse
+import os
+import pathlib
+import tempfile
+import time
+from typing import Any, Callable
+
+import fsspec
+
+
+def make_tree(root: pathlib.Path, n_dirs: int, n_files: int) -> None:
+    for i in range(n_dirs):
+        dirname = root / f"{i % 100:02d}" / f"{i:06d}"
+        dirname.mkdir(parents=True, exist_ok=True)
+        for j in range(n_files):
+            (dirname / f"{j:06d}.grib").touch()
+
+
+def timeit(func: Callable[[], Any]) -> float:
+    tic = time.perf_counter()
+    func()
+    return time.perf_counter() - tic
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--dirs", type=int, default=1_000)
+    parser.add_argument("--files", type=int, default=100)
+    parser.add_argument("--max-workers", type=int, default=16)
+    parser.add_argument("--root", default=None)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        root = args.root
+        if root is None:
+            root = tmpdir
+            make_tree(pathlib.Path(root), args.dirs, args.files)
+        n_entries = sum(len(files) + len(dirs) for _, dirs, files in os.walk(root))
+        print(f"{n_entries} entries in {root}")
+
+        local_fs = fsspec.filesystem("file")
+        cci_fs = fsspec.filesystem("cci1", max_workers=args.max_workers)
+        print(f"{'operation':<12}{'local [s]':>12}{'cci [s]':>12}{'speed-up':>10}")
+        for operation in ("find", "du"):
+            local = timeit(lambda: getattr(local_fs, operation)(root))
+            cci = timeit(lambda: getattr(cci_fs, operation)(root))
+            print(f"{operation:<12}{local:>12.2f}{cci:>12.2f}{local / cci:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
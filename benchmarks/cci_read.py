@@ -0,0 +1,74 @@
+"""Compare read throughput and peak RSS of the CCI filesystem read modes.
+
+Each mode runs in a subprocess that checksums the file chunk by chunk:
+
+- buffered: default LocalFileOpener, ``read`` copies each chunk
+- mmap: ``mmap_read=True``, ``read`` copies each chunk from the memory map
+- mmap-buffer: ``mmap_read=True``, zero-copy slices of ``getbuffer()``
+
+Usage: python benchmarks/cci_read.py [--size-mb N] [--chunk-mb N] [--path PATH]
+"""
+
+import argparse
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+import zlib
+
+import fsspec
+
+MODES = ("buffered", "mmap", "mmap-buffer")
+
+
+def run(mode: str, path: str, chunk_size: int, readahead: bool) -> None:
+    fs = fsspec.filesystem("cci1", mmap_read=mode != "buffered", readahead=readahead)
+    checksum = 0
+    tic = time.perf_counter()
+    with fs.open(path, "rb") as f:
+        if mode == "mmap-buffer":
+            with f.getbuffer() as view:
+                for start in range(0, len(view), chunk_size):
+                    checksum = zlib.crc32(view[start : start + chunk_size], checksum)
+        else:
+            while chunk := f.read(chunk_size):
+                checksum = zlib.crc32(chunk, checksum)
+    elapsed = time.perf_counter() - tic
+    size_mb = os.path.getsize(path) / 2**20
+    max_rss_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 2**10
+    print(f"{mode:<14}{size_mb / elapsed:>12.0f}{max_rss_mb:>14.0f}{checksum:>12x}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--size-mb", type=int, default=1_024)
+    parser.add_argument("--chunk-mb", type=int, default=8)
+    parser.add_argument("--path", default=None)
+    parser.add_argument("--readahead", action="store_true")
+    parser.add_argument("--mode", choices=MODES, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.mode is not None:
+        run(args.mode, args.path, args.chunk_mb * 2**20, args.readahead)
+        return
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        path = args.path
+        if path is None:
+            path = os.path.join(tmpdir, "data.grib")
+            with open(path, "wb") as f:
+                for _ in range(args.size_mb):
+                    f.write(os.urandom(2**20))
+        print(f"{'mode':<14}{'MB/s':>12}{'max RSS [MB]':>14}{'crc32':>12}")
+        for mode in MODES:
+            cmd = [sys.executable, __file__, "--mode", mode, "--path", path]
+            cmd += ["--chunk-mb", str(args.chunk_mb)]
+            if args.readahead:
+                cmd.append("--readahead")
+            subprocess.run(cmd, check=True)
+
+
+if __name__ == "__main__":
+    main()
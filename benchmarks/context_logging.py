@@ -0,0 +1,46 @@
+"""Measure the per-call cost of Context logging at suppressed and emitted levels.
+
+The database is replaced by an in-memory SQLite session maker and events are
+not written, so the numbers only include logging and session overhead.
+
+Usage: python benchmarks/context_logging.py [--calls N]
+"""
+
+import argparse
+import logging
+import os
+import timeit
+from unittest.mock import patch
+
+import sqlalchemy as sa
+import sqlalchemy.orm
+
+os.environ.setdefault("WORKER_LOG_LEVEL", "INFO")
+
+from cads_worker import worker  # noqa: E402
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--calls", type=int, default=10_000)
+    args = parser.parse_args()
+
+    # discard the rendered messages, keep the processor chain
+    logging.getLogger().handlers = [logging.NullHandler()]
+    session_maker = sa.orm.sessionmaker(sa.create_engine("sqlite://"))
+    context = worker.Context(job_id="benchmark")
+    print(f"WORKER_LOG_LEVEL={os.environ['WORKER_LOG_LEVEL']}")
+    print(f"{'method':<12}{'us/call':>10}")
+    with (
+        patch("cads_worker.worker.create_session_maker", return_value=session_maker),
+        patch("cads_broker.database.add_event"),
+    ):
+        for method in ("debug", "info", "warning"):
+            seconds = timeit.timeit(
+                lambda: getattr(context, method)("message"), number=args.calls
+            )
+            print(f"{method:<12}{seconds / args.calls * 1e6:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
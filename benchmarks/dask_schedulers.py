@@ -0,0 +1,134 @@
+"""Compare the Dask scheduler profiles of the jobs on xarray workloads.
+
+Workloads run on a chunked (time, latitude, longitude) dataset:
+
+- regrid: 4x4 coarsening of the grid
+- climatology: monthly means and standard deviations
+- convert: unit conversion to float64, computed in memory
+
+Each workload runs with the single-threaded scheduler and with thread pools
+of increasing size. With ``--jobs``, concurrent jobs share the thread budget
+(``--max-threads``, default: number of CPUs); ``uncapped`` gives each job
+all the threads it asks for.
+
+Requires numpy and xarray.
+Usage: python benchmarks/dask_schedulers.py [--days N] [--jobs N]
+"""
+
+import argparse
+import concurrent.futures
+import os
+import time
+from collections.abc import Callable
+from typing import Any
+
+import dask.config
+import numpy as np
+import xarray as xr
+
+from cads_worker import schedulers
+
+
+def make_dataset(days: int, chunk_days: int) -> xr.Dataset:
+    time_ = (np.datetime64("2000-01-01") + np.arange(days)).astype("datetime64[ns]")
+    shape = (time_.size, 181, 360)
+    data = np.random.default_rng(0).random(shape, dtype="float32")
+    ds = xr.Dataset(
+        {"t2m": (("time", "latitude", "longitude"), data)},
+        coords={
+            "time": time_,
+            "latitude": np.linspace(90, -90, 181),
+            "longitude": np.arange(360.0),
+        },
+    )
+    return ds.chunk(time=chunk_days)
+
+
+WORKLOADS: dict[str, Callable[[xr.Dataset], Any]] = {
+    "regrid": lambda ds: ds.coarsen(latitude=4, longitude=4, boundary="trim").mean(),
+    "climatology": lambda ds: xr.merge(
+        [
+            ds.groupby("time.month").mean().rename(t2m="mean"),
+            ds.groupby("time.month").std().rename(t2m="std"),
+        ]
+    ),
+    "convert": lambda ds: ds.astype("float64") * 1.8 - 459.67,
+}
+
+
+def run(
+    ds: xr.Dataset,
+    workload: str,
+    profile: schedulers.SchedulerProfile,
+    budget: schedulers.ThreadBudget | None,
+) -> float:
+    with schedulers.use_scheduler(profile, budget):
+        tic = time.perf_counter()
+        WORKLOADS[workload](ds).compute()
+        return time.perf_counter() - tic
+
+
+def run_jobs(
+    ds: xr.Dataset,
+    workload: str,
+    profile: schedulers.SchedulerProfile,
+    budget: schedulers.ThreadBudget | None,
+    n_jobs: int,
+) -> float:
+    tic = time.perf_counter()
+    with concurrent.futures.ThreadPoolExecutor(n_jobs) as executor:
+        futures = [
+            executor.submit(run, ds, workload, profile, budget) for _ in range(n_jobs)
+        ]
+        for future in futures:
+            future.result()
+    return time.perf_counter() - tic
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--days", type=int, default=730)
+    parser.add_argument("--chunk-days", type=int, default=31)
+    parser.add_argument("--jobs", type=int, default=4, help="concurrent jobs")
+    parser.add_argument("--max-threads", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--workload", choices=WORKLOADS, action="append")
+    args = parser.parse_args()
+
+    ds = make_dataset(args.days, args.chunk_days)
+    dask.config.set(scheduler=schedulers.dispatch)
+    n_threads = [n for n in (2, 4, 8, 16, 32) if n <= args.max_threads]
+
+    print(f"{'workload':<14}{'profile':<22}{'seconds':>10}{'speed-up':>10}")
+    for workload in args.workload or WORKLOADS:
+        reference = run(ds, workload, schedulers.SchedulerProfile(), None)
+        print(f"{workload:<14}{'single-threaded':<22}{reference:>10.2f}{1:>10.2f}")
+        for n in n_threads:
+            seconds = run(ds, workload, schedulers.SchedulerProfile("threads", n), None)
+            print(
+                f"{workload:<14}{f'threads:{n}':<22}"
+                f"{seconds:>10.2f}{reference / seconds:>10.2f}"
+            )
+
+        if args.jobs <= 1:
+            continue
+        reference = run_jobs(
+            ds, workload, schedulers.SchedulerProfile(), None, args.jobs
+        )
+        print(
+            f"{workload:<14}{f'{args.jobs} jobs single':<22}"
+            f"{reference:>10.2f}{1:>10.2f}"
+        )
+        profile = schedulers.SchedulerProfile("threads", args.max_threads)
+        for name, budget in {
+            "uncapped": None,
+            "capped": schedulers.ThreadBudget(args.max_threads),
+        }.items():
+            seconds = run_jobs(ds, workload, profile, budget, args.jobs)
+            print(
+                f"{workload:<14}{f'{args.jobs} jobs {name}':<22}"
+                f"{seconds:>10.2f}{reference / seconds:>10.2f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""Simulate how evenly each volume selection strategy balances the volumes.
+
+Usage: python benchmarks/volume_selection.py [--jobs N] [--stats-ttl N]
+"""
+
+import argparse
+import random
+import statistics
+
+from cads_worker import models, selection
+
+VOLUMES = {
+    "/data/a": models.DataVolumeConfig(max_size=100_000),
+    "/data/b": models.DataVolumeConfig(max_size=100_000),
+    "/data/c": models.DataVolumeConfig(max_size=50_000),
+    "/data/d": models.DataVolumeConfig(max_size=200_000),
+}
+INITIAL_USAGE = {"/data/a": 90_000, "/data/b": 10_000, "/data/c": 0, "/data/d": 50_000}
+CLEANER_TARGET = 0.9
+
+
+class SimulatedStats(selection.VolumeStats):
+    """Stats refreshed every ``ttl`` jobs rather than every ``ttl`` seconds."""
+
+    def __init__(self, usage: dict[str, int], ttl: int) -> None:
+        super().__init__()
+        self.usage = usage
+        self.refresh_every = max(ttl, 1)
+        self.snapshot = dict(usage)
+        self.n_jobs = 0
+
+    def tick(self) -> None:
+        self.n_jobs += 1
+        if self.n_jobs % self.refresh_every == 0:
+            self.snapshot = dict(self.usage)
+
+    def used_bytes(self, volume: str) -> int | None:
+        return self.snapshot[volume]
+
+
+def simulate(strategy: str, n_jobs: int, stats_ttl: int, seed: int) -> dict[str, float]:
+    random.seed(seed)
+    usage = dict(INITIAL_USAGE)
+    stats = SimulatedStats(usage, stats_ttl)
+    select = selection.SELECTION_STRATEGIES[strategy]
+    cum_weights = []
+    total = 0.0
+    for config in VOLUMES.values():
+        total += config.weight
+        cum_weights.append(total)
+
+    evicted = 0
+    for _ in range(n_jobs):
+        size = int(random.lognormvariate(5, 1.5))
+        volume = select(VOLUMES, cum_weights, stats)
+        stats.record_write(volume, size)
+        usage[volume] += size
+        max_size = VOLUMES[volume].max_size
+        if usage[volume] > max_size:
+            # the cache cleaner evicts down to the target
+            target = int(max_size * CLEANER_TARGET)
+            evicted += usage[volume] - target
+            usage[volume] = target
+        stats.tick()
+
+    fills = [usage[volume] / config.max_size for volume, config in VOLUMES.items()]
+    return {
+        "fill_mean": statistics.mean(fills),
+        "fill_stdev": statistics.pstdev(fills),
+        "fill_max": max(fills),
+        "evicted_bytes": evicted,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--jobs", type=int, default=5_000)
+    parser.add_argument("--stats-ttl", type=int, default=20, help="jobs")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    print(f"{'strategy':<24}{'fill mean':>10}{'stdev':>10}{'max':>10}{'evicted':>12}")
+    for strategy in selection.SELECTION_STRATEGIES:
+        result = simulate(strategy, args.jobs, args.stats_ttl, args.seed)
+        print(
+            f"{strategy:<24}{result['fill_mean']:>10.3f}{result['fill_stdev']:>10.3f}"
+            f"{result['fill_max']:>10.3f}{result['evicted_bytes']:>12}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,295 @@
+"""Benchmark the fixed cost of the worker hot paths.
+
+``submit_workflow`` runs end to end with a dummy adaptor, a local data volume
+and a SQLite (or ``--db-url``) database for both the cache entries and the
+broker events. The broker request lookup and the Dask worker are stand-ins.
+Cache-miss jobs write a new result, cache-hit jobs repeat the same request.
+
+Microbenchmarks cover ``Context`` logging, ``ensure_session`` and the data
+volume selection.
+
+Results are written as JSON. With ``--baseline``, the run fails if any
+timing regresses by more than ``--tolerance``.
+
+Usage: python benchmarks/worker_hot_paths.py [--jobs N] [--output PATH]
+       [--baseline PATH] [--tolerance 0.2] [--db-url URL]
+"""
+
+import argparse
+import contextlib
+import datetime
+import json
+import os
+import pathlib
+import platform
+import statistics
+import sys
+import tempfile
+import time
+import timeit
+import uuid
+from types import SimpleNamespace
+from typing import Any, BinaryIO, Callable
+from unittest.mock import patch
+
+os.environ.setdefault("WORKER_LOG_LEVEL", "WARNING")
+
+import cacholote  # noqa: E402
+import distributed.worker  # noqa: E402
+import sqlalchemy as sa  # noqa: E402
+import sqlalchemy.orm  # noqa: E402
+
+from cads_worker import models, selection, worker  # noqa: E402
+
+
+class Base(sa.orm.DeclarativeBase):
+    pass
+
+
+class Event(Base):
+    """Stand-in for the broker events table."""
+
+    __tablename__ = "benchmark_events"
+    event_id = sa.Column(sa.Integer, primary_key=True)
+    request_uid = sa.Column(sa.String)
+    event_type = sa.Column(sa.String)
+    timestamp = sa.Column(sa.TIMESTAMP, default=sa.func.now())
+    message = sa.Column(sa.Text)
+
+
+class AdaptorProperties(Base):
+    """Stand-in for the broker adaptor properties."""
+
+    __tablename__ = "benchmark_adaptor_properties"
+    hash = sa.Column(sa.String, primary_key=True)
+    form = sa.Column(sa.JSON)
+    config = sa.Column(sa.JSON)
+
+
+class Request(Base):
+    """Stand-in for the broker requests, expired on commit as the real ones."""
+
+    __tablename__ = "benchmark_requests"
+    request_uid = sa.Column(sa.String, primary_key=True)
+    request_body = sa.Column(sa.JSON)
+    adaptor_properties_hash = sa.Column(
+        sa.String, sa.ForeignKey(AdaptorProperties.hash)
+    )
+    adaptor_properties = sa.orm.relationship(AdaptorProperties)
+
+
+CACHE_TMP_PATH: pathlib.Path | None = None
+
+
+def make_result(request: dict[str, Any]) -> BinaryIO:
+    assert CACHE_TMP_PATH is not None
+    path = CACHE_TMP_PATH / f"{uuid.uuid4().hex}.grib"
+    path.write_bytes(os.urandom(request["size"]))
+    return open(path, "rb")
+
+
+class DummyAdaptor:
+    def __init__(
+        self, form: Any, context: Any, cache_tmp_path: pathlib.Path, **config: Any
+    ) -> None:
+        self.cache_tmp_path = cache_tmp_path
+
+    def retrieve(self, request: dict[str, Any]) -> Any:
+        global CACHE_TMP_PATH
+        CACHE_TMP_PATH = self.cache_tmp_path
+        with cacholote.config.set(return_cache_entry=True):
+            return cacholote.cacheable(make_result)(request)
+
+
+def summarize(seconds: list[float]) -> dict[str, float]:
+    quantiles = statistics.quantiles(seconds, n=100, method="inclusive")
+    return {
+        "jobs_per_second": len(seconds) / sum(seconds),
+        "p50": quantiles[49],
+        "p99": quantiles[98],
+    }
+
+
+@contextlib.contextmanager
+def stand_ins(tmpdir: str, db_url: str | None) -> Any:
+    engine = sa.create_engine(db_url or f"sqlite:///{tmpdir}/benchmark.db")
+    cacholote.database.Base.metadata.create_all(engine)
+    Base.metadata.create_all(engine)
+    session_maker = sa.orm.sessionmaker(engine)
+
+    volume = os.path.join(tmpdir, "volume")
+    os.makedirs(volume)
+    volumes_config = os.path.join(tmpdir, "volumes.yaml")
+    with open(volumes_config, "w") as f:
+        f.write(f"{volume}:\n")
+
+    with session_maker() as session:
+        session.add(
+            AdaptorProperties(
+                hash="benchmark", form={}, config={"collection_id": "benchmark"}
+            )
+        )
+        session.commit()
+
+    def add_request(request_uid: str, request: dict[str, Any]) -> None:
+        with session_maker() as session:
+            session.add(
+                Request(
+                    request_uid=request_uid,
+                    request_body={"request": request},
+                    adaptor_properties_hash="benchmark",
+                )
+            )
+            session.commit()
+
+    def get_request(request_uid: str, session: sa.orm.Session) -> Request:
+        return session.scalars(
+            sa.select(Request).filter_by(request_uid=request_uid)
+        ).one()
+
+    def add_event(session: Any, **kwargs: Any) -> None:
+        session.add(Event(**kwargs))
+        session.commit()
+
+    with contextlib.ExitStack() as stack:
+        for target, new in {
+            "cads_broker.database.Events": Event,
+            "cads_broker.database.get_request": get_request,
+            "cads_broker.database.set_request_cache_id": lambda **kwargs: None,
+            "cads_broker.database.add_event": add_event,
+            "cads_adaptors.get_adaptor_class": lambda *args: DummyAdaptor,
+            "cads_worker.models.is_volume_available": lambda volume: True,
+            "cads_worker.worker.create_session_maker": lambda: session_maker,
+            "cads_worker.worker.get_worker": lambda: SimpleNamespace(
+                address="tcp://benchmark"
+            ),
+        }.items():
+            stack.enter_context(patch(target, new))
+        stack.enter_context(patch.dict(os.environ, DATA_VOLUMES_CONFIG=volumes_config))
+        yield add_request
+
+
+def run_job(
+    add_request: Callable[[str, dict[str, Any]], None], request: dict[str, Any]
+) -> float:
+    request_uid = uuid.uuid4().hex
+    add_request(request_uid, request)
+    distributed.worker.thread_state.key = f"request-{request_uid}"  # type: ignore[attr-defined]
+    tic = time.perf_counter()
+    worker.submit_workflow("benchmark:DummyAdaptor", request=request)
+    return time.perf_counter() - tic
+
+
+def bench_submit_workflow(
+    n_jobs: int, size: int, db_url: str | None
+) -> dict[str, dict[str, float]]:
+    with tempfile.TemporaryDirectory() as tmpdir, stand_ins(tmpdir, db_url) as reqs:
+        run_job(reqs, {"size": size, "warmup": True})
+        miss = [run_job(reqs, {"size": size, "i": i}) for i in range(n_jobs)]
+        hit = [run_job(reqs, {"size": size, "i": 0}) for _ in range(n_jobs)]
+    return {
+        "submit_workflow_miss": summarize(miss),
+        "submit_workflow_hit": summarize(hit),
+    }
+
+
+def per_call(func: Callable[[], Any], number: int) -> float:
+    return min(timeit.repeat(func, number=number, repeat=5)) / number
+
+
+def bench_micro(number: int) -> dict[str, dict[str, float]]:
+    results = {}
+    engine = sa.create_engine("sqlite://")
+    Base.metadata.create_all(engine)
+    session_maker = sa.orm.sessionmaker(engine)
+    with (
+        patch("cads_worker.worker.create_session_maker", return_value=session_maker),
+        patch("cads_broker.database.add_event"),
+    ):
+        context = worker.Context(job_id="benchmark")
+        context.worker_log_level = 20  # INFO
+        results["context_debug_suppressed"] = {
+            "seconds": per_call(lambda: context.debug("message"), number)
+        }
+        results["context_info_emitted"] = {
+            "seconds": per_call(lambda: context.info("message"), number)
+        }
+
+        @worker.ensure_session
+        def noop(self: Any, session: Any = None) -> None:
+            pass
+
+        results["ensure_session"] = {"seconds": per_call(lambda: noop(context), number)}
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        volumes_config = os.path.join(tmpdir, "volumes.yaml")
+        with open(volumes_config, "w") as f:
+            f.writelines(f"{tmpdir}/volume-{i}:\n" for i in range(20))
+        with patch("cads_worker.models.is_volume_available", return_value=True):
+            registry = models.VolumeRegistry(volumes_config)
+            for strategy in selection.SELECTION_STRATEGIES:
+                results[f"select_volume_{strategy}"] = {
+                    "seconds": per_call(
+                        lambda: selection.select_volume(registry, strategy), number
+                    )
+                }
+    return results
+
+
+TIMINGS = ("seconds", "p50", "p99")
+
+
+def compare(
+    results: dict[str, dict[str, float]],
+    baseline: dict[str, dict[str, float]],
+    tolerance: float,
+) -> list[str]:
+    regressions = []
+    for name, metrics in results.items():
+        for metric, value in metrics.items():
+            reference = baseline.get(name, {}).get(metric)
+            if metric in TIMINGS and reference and value > reference * (1 + tolerance):
+                regressions.append(
+                    f"{name}.{metric}: {value:.6f} > {reference:.6f} (+{tolerance:.0%})"
+                )
+    return regressions
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--jobs", type=int, default=200)
+    parser.add_argument("--size", type=int, default=1_024, help="bytes per result")
+    parser.add_argument("--number", type=int, default=1_000, help="micro calls")
+    parser.add_argument("--db-url", default=None)
+    parser.add_argument("--output", default="benchmark-results.json")
+    parser.add_argument("--baseline", default=None)
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    args = parser.parse_args()
+
+    results = {
+        **bench_submit_workflow(args.jobs, args.size, args.db_url),
+        **bench_micro(args.number),
+    }
+    with open(args.output, "w") as f:
+        json.dump(
+            {
+                "created_at": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+                "python": platform.python_version(),
+                "results": results,
+            },
+            f,
+            indent=2,
+        )
+    for name, metrics in results.items():
+        print(name, " ".join(f"{k}={v:.6g}" for k, v in metrics.items()))
+
+    if args.baseline is not None:
+        with open(args.baseline) as f:
+            baseline = json.load(f)["results"]
+        if regressions := compare(results, baseline, args.tolerance):
+            print("Regressions:", *regressions, sep="\n  ")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+import collections
+import functools
+import hashlib
+import json
+import os
+import threading
+from typing import Any
+
+import structlog
+
+LOGGER = structlog.get_logger(__name__)
+
+
+class AdaptorClassCache:
+    """LRU cache of adaptor classes, keyed by entry point and setup code.
+
+    Collections in ``skip_collections`` (e.g., datasets whose setup code isn't
+    pure) always resolve a new class. ``maxsize=0`` disables the cache.
+    """
+
+    def __init__(
+        self, maxsize: int = 128, skip_collections: set[str] | None = None
+    ) -> None:
+        self.maxsize = maxsize
+        self.skip_collections = skip_collections or set()
+        self.hits = 0
+        self.misses = 0
+        self._classes: collections.OrderedDict[str, Any] = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._classes)
+
+    @staticmethod
+    def make_key(entry_point: str, setup_code: str | None) -> str:
+        return hashlib.sha256(
+            json.dumps([entry_point, setup_code]).encode()
+        ).hexdigest()
+
+    def get_adaptor_class(
+        self,
+        entry_point: str,
+        setup_code: str | None = None,
+        collection_id: str | None = None,
+    ) -> Any:
+        import cads_adaptors
+
+        if self.maxsize <= 0 or collection_id in self.skip_collections:
+            return cads_adaptors.get_adaptor_class(entry_point, setup_code)
+
+        key = self.make_key(entry_point, setup_code)
+        with self._lock:
+            if key in self._classes:
+                self.hits += 1
+                self._classes.move_to_end(key)
+                return self._classes[key]
+            self.misses += 1
+
+        adaptor_class = cads_adaptors.get_adaptor_class(entry_point, setup_code)
+        with self._lock:
+            self._classes[key] = adaptor_class
+            self._classes.move_to_end(key)
+            while len(self._classes) > self.maxsize:
+                self._classes.popitem(last=False)
+        LOGGER.debug(
+            "Adaptor class resolved",
+            entry_point=entry_point,
+            hits=self.hits,
+            misses=self.misses,
+        )
+        return adaptor_class
+
+
+@functools.lru_cache
+def get_adaptor_class_cache() -> AdaptorClassCache:
+    skip_collections = os.getenv("WORKER_ADAPTOR_CACHE_SKIP_COLLECTIONS", "")
+    return AdaptorClassCache(
+        maxsize=int(os.getenv("WORKER_ADAPTOR_CACHE_SIZE", 128)),
+        skip_collections={
+            collection_id.strip()
+            for collection_id in skip_collections.split(",")
+            if collection_id.strip()
+        },
+    )
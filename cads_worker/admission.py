@@ -0,0 +1,162 @@
+"""Admission of the jobs running on a worker process.
+
+Before the adaptor runs, each job is admitted against the per-collection
+concurrency caps and the memory budget of the worker. The memory of a job
+is estimated from its collection and from the number of items of its
+request. A job is admitted if both the memory reserved by the running jobs
+and the live RSS of the process leave room for its estimate. A job running
+alone is always admitted, so estimates larger than the budget can't block
+the worker.
+
+Jobs that are not admitted within ``WORKER_ADMISSION_MAX_WAIT`` seconds are
+rescheduled, before they are started: the broker doesn't record them as
+running on this worker, and the Dask scheduler may place them elsewhere.
+"""
+
+import dataclasses
+import functools
+import math
+import os
+import threading
+import time
+from typing import Any
+
+import dask.utils
+import distributed
+import structlog
+
+from . import utils
+
+LOGGER = structlog.get_logger(__name__)
+
+
+class AdmissionTimeoutError(RuntimeError):
+    pass
+
+
+@dataclasses.dataclass
+class Ticket:
+    collection_id: str | None
+    memory: int
+
+
+def get_request_items(request: dict[str, Any]) -> int:
+    """Return the number of items of a request (product of the list lengths)."""
+    return math.prod(
+        max(len(value), 1) if isinstance(value, list | tuple) else 1
+        for value in request.values()
+    )
+
+
+class AdmissionController:
+    """Admit jobs against concurrency caps and a memory budget.
+
+    ``caps`` are the maximum numbers of running jobs of each collection,
+    ``default_cap`` applies to the other collections (0 is unlimited).
+    ``memory`` are the estimated bytes of each collection, increased by
+    ``memory_per_item`` bytes per request item. ``memory_budget`` 0 disables
+    the memory check. Jobs wait up to ``max_wait`` seconds to be admitted.
+    """
+
+    def __init__(
+        self,
+        caps: dict[str, int] | None = None,
+        default_cap: int = 0,
+        memory: dict[str, int] | None = None,
+        default_memory: int = 0,
+        memory_per_item: int = 0,
+        memory_budget: int = 0,
+        max_wait: float = 30,
+        poll_interval: float = 1,
+    ) -> None:
+        self.caps = caps or {}
+        self.default_cap = default_cap
+        self.memory = memory or {}
+        self.default_memory = default_memory
+        self.memory_per_item = memory_per_item
+        self.memory_budget = memory_budget
+        self.max_wait = max_wait
+        self.poll_interval = poll_interval
+        self.running: dict[str | None, int] = {}
+        self.reserved_memory = 0
+        self._condition = threading.Condition()
+
+    def estimate(self, collection_id: str | None, request: dict[str, Any]) -> int:
+        memory = self.memory.get(collection_id or "", self.default_memory)
+        return memory + self.memory_per_item * get_request_items(request)
+
+    def _can_admit(self, collection_id: str | None, memory: int) -> bool:
+        cap = self.caps.get(collection_id or "", self.default_cap)
+        if cap and self.running.get(collection_id, 0) >= cap:
+            return False
+        if not self.memory_budget or not self.running:
+            return True
+        return (
+            self.reserved_memory + memory <= self.memory_budget
+            and utils.get_rss() + memory <= self.memory_budget
+        )
+
+    def acquire(self, collection_id: str | None, memory: int) -> Ticket:
+        tic = time.monotonic()
+        waiting = False
+        with self._condition:
+            while not self._can_admit(collection_id, memory):
+                remaining = self.max_wait - (time.monotonic() - tic)
+                if remaining <= 0:
+                    raise AdmissionTimeoutError(
+                        f"Job of collection {collection_id!r} not admitted"
+                        f" after {self.max_wait} seconds."
+                    )
+                if not waiting:
+                    LOGGER.info(
+                        "Waiting for admission",
+                        collection_id=collection_id,
+                        memory=memory,
+                        running=self.running,
+                        reserved_memory=self.reserved_memory,
+                    )
+                    waiting = True
+                self._condition.wait(min(remaining, self.poll_interval))
+            self.running[collection_id] = self.running.get(collection_id, 0) + 1
+            self.reserved_memory += memory
+        return Ticket(collection_id, memory)
+
+    def release(self, ticket: Ticket) -> None:
+        with self._condition:
+            self.running[ticket.collection_id] -= 1
+            if not self.running[ticket.collection_id]:
+                del self.running[ticket.collection_id]
+            self.reserved_memory -= ticket.memory
+            self._condition.notify_all()
+
+
+def get_memory_budget() -> int:
+    """Return the memory budget, ``auto`` is a fraction of the Dask memory limit."""
+    budget = os.getenv("WORKER_ADMISSION_MEMORY_BUDGET", "0")
+    if budget != "auto":
+        return dask.utils.parse_bytes(budget)
+    try:
+        memory_limit = distributed.get_worker().memory_manager.memory_limit
+    except ValueError:
+        return 0
+    fraction = float(os.getenv("WORKER_ADMISSION_MEMORY_FRACTION", 0.8))
+    return int((memory_limit or 0) * fraction)
+
+
+@functools.lru_cache
+def get_admission_controller() -> AdmissionController:
+    return AdmissionController(
+        caps=utils.parse_mapping(os.getenv("WORKER_ADMISSION_CAPS", ""), int),
+        default_cap=int(os.getenv("WORKER_ADMISSION_DEFAULT_CAP", 0)),
+        memory=utils.parse_mapping(
+            os.getenv("WORKER_ADMISSION_MEMORY", ""), dask.utils.parse_bytes
+        ),
+        default_memory=dask.utils.parse_bytes(
+            os.getenv("WORKER_ADMISSION_DEFAULT_MEMORY", "0")
+        ),
+        memory_per_item=dask.utils.parse_bytes(
+            os.getenv("WORKER_ADMISSION_MEMORY_PER_ITEM", "0")
+        ),
+        memory_budget=get_memory_budget(),
+        max_wait=float(os.getenv("WORKER_ADMISSION_MAX_WAIT", 30)),
+    )
@@ -0,0 +1,151 @@
+import concurrent.futures
+import dataclasses
+import json
+import os
+import time
+import urllib
+from typing import Any
+
+import boto3
+import botocore.config
+import botocore.exceptions
+import cads_broker.object_storage
+import structlog
+
+LOGGER = structlog.get_logger(__name__)
+
+
+@dataclasses.dataclass
+class BucketSummary:
+    data_volume: str
+    status: str
+    duration: float
+    error: str | None = None
+
+
+def _as_list(value: Any) -> list[Any]:
+    return value if isinstance(value, list) else [value]
+
+
+def allows_download(policy: dict[str, Any], bucket_name: str) -> bool:
+    """Check that a bucket policy allows anyone to download the objects."""
+    for statement in _as_list(policy.get("Statement", [])):
+        principal = statement.get("Principal")
+        if isinstance(principal, dict):
+            principal = principal.get("AWS")
+        if (
+            statement.get("Effect") == "Allow"
+            and "*" in _as_list(principal)
+            and {"s3:GetObject", "s3:*"} & set(_as_list(statement.get("Action")))
+            and f"arn:aws:s3:::{bucket_name}/*" in _as_list(statement.get("Resource"))
+        ):
+            return True
+    return False
+
+
+def is_subset(expected: Any, actual: Any) -> bool:
+    """Check that ``actual`` contains ``expected``, ignoring additional keys."""
+    if isinstance(expected, dict):
+        return isinstance(actual, dict) and all(
+            key in actual and is_subset(value, actual[key])
+            for key, value in expected.items()
+        )
+    if isinstance(expected, list):
+        return (
+            isinstance(actual, list)
+            and len(expected) == len(actual)
+            and all(map(is_subset, expected, actual))
+        )
+    return bool(expected == actual)
+
+
+def get_lifecycle_configuration() -> dict[str, Any] | None:
+    """Return the lifecycle configuration of the buckets, if any."""
+    if lifecycle := os.getenv("BUCKET_LIFECYCLE_CONFIGURATION"):
+        configuration: dict[str, Any] = json.loads(lifecycle)
+        return configuration
+    return None
+
+
+def is_bucket_configured(
+    client: Any, bucket_name: str, lifecycle: dict[str, Any] | None = None
+) -> bool:
+    """Check a bucket against the expected policy and lifecycle, without changing it.
+
+    ``lifecycle`` is the expected lifecycle configuration, None skips the check.
+    """
+    try:
+        client.head_bucket(Bucket=bucket_name)
+        policy = json.loads(client.get_bucket_policy(Bucket=bucket_name)["Policy"])
+        if lifecycle is not None:
+            rules = client.get_bucket_lifecycle_configuration(Bucket=bucket_name)[
+                "Rules"
+            ]
+    except botocore.exceptions.ClientError:
+        return False
+    if not allows_download(policy, bucket_name):
+        return False
+    return lifecycle is None or is_subset(lifecycle["Rules"], rules)
+
+
+def init_bucket(
+    client: Any,
+    data_volume: str,
+    object_storage_url: str,
+    lifecycle: dict[str, Any] | None = None,
+    **storage_kws: Any,
+) -> BucketSummary:
+    tic = time.perf_counter()
+    bucket_name = urllib.parse.urlparse(data_volume).netloc
+    error = None
+    try:
+        if is_bucket_configured(client, bucket_name, lifecycle):
+            status = "skipped"
+        else:
+            LOGGER.info("Initializing bucket", data_volume=data_volume)
+            cads_broker.object_storage.create_download_bucket(
+                data_volume, object_storage_url, client=client, **storage_kws
+            )
+            if lifecycle is not None:
+                client.put_bucket_lifecycle_configuration(
+                    Bucket=bucket_name, LifecycleConfiguration=lifecycle
+                )
+            if is_bucket_configured(client, bucket_name, lifecycle):
+                status = "initialized"
+            else:
+                LOGGER.warning("Bucket is misconfigured", data_volume=data_volume)
+                status = "misconfigured"
+    except Exception as exc:
+        LOGGER.exception("Bucket initialization crashed", data_volume=data_volume)
+        status = "failed"
+        error = repr(exc)
+    return BucketSummary(data_volume, status, time.perf_counter() - tic, error)
+
+
+def init_buckets(
+    data_volumes: list[str],
+    object_storage_url: str,
+    max_workers: int = 8,
+    lifecycle: dict[str, Any] | None = None,
+    **storage_kws: Any,
+) -> list[BucketSummary]:
+    """Initialize buckets concurrently, sharing one client and connection pool."""
+    client = boto3.client(
+        "s3",
+        endpoint_url=object_storage_url,
+        config=botocore.config.Config(max_pool_connections=max(max_workers, 10)),
+        **storage_kws,
+    )
+    with concurrent.futures.ThreadPoolExecutor(max_workers) as executor:
+        futures = [
+            executor.submit(
+                init_bucket,
+                client,
+                data_volume,
+                object_storage_url,
+                lifecycle=lifecycle,
+                **storage_kws,
+            )
+            for data_volume in data_volumes
+        ]
+        return [future.result() for future in futures]
@@ -0,0 +1,85 @@
+"""Files of the cacholote cache entries.
+
+Adapted from ``cacholote.clean``, whose helpers are private. Keep them in
+sync with the cache entries written by the supported cacholote versions.
+"""
+
+import concurrent.futures
+from typing import Any
+
+import cacholote
+import fsspec
+import sqlalchemy as sa
+from cacholote.database import CacheEntry
+
+FILE_RESULT_KEYS = ("type", "callable", "args", "kwargs")
+FILE_RESULT_CALLABLES = (
+    "cacholote.extra_encoders:decode_xr_dataarray",
+    "cacholote.extra_encoders:decode_xr_dataset",
+    "cacholote.extra_encoders:decode_io_object",
+)
+
+
+def get_files(cache_entry: CacheEntry, key: str | None) -> dict[str, Any]:
+    """Return the files of a cache entry, mapped to their ``key`` metadata."""
+    result: Any = cache_entry.result
+    if not isinstance(result, (list, tuple, set)):
+        result = [result]
+
+    storage_options = cacholote.config.get().cache_files_storage_options
+    files = {}
+    for obj in result:
+        if (
+            isinstance(obj, dict)
+            and set(FILE_RESULT_KEYS) == set(obj)
+            and obj["callable"] in FILE_RESULT_CALLABLES
+        ):
+            file_json = obj["args"][0]
+            urlpath = file_json["file:local_path"]
+            fs, *_ = fsspec.get_fs_token_paths(urlpath, storage_options=storage_options)
+            files[fs.unstrip_protocol(urlpath)] = (
+                file_json if key is None else file_json[key]
+            )
+    return files
+
+
+def commit_or_rollback(session: sa.orm.Session) -> None:
+    try:
+        session.commit()
+    finally:
+        session.rollback()
+
+
+def remove_file(fs: fsspec.AbstractFileSystem, file: str, recursive: bool) -> None:
+    try:
+        fs.rm(file, recursive=recursive)
+    except FileNotFoundError:
+        # Another concurrent process might have deleted the file
+        pass
+
+
+def delete_cache_entries(
+    session: sa.orm.Session,
+    cache_entries: list[CacheEntry],
+    executor: concurrent.futures.Executor | None = None,
+) -> int:
+    """Delete cache entries and their files, return the number of bytes freed."""
+    fs, _ = cacholote.utils.get_cache_files_fs_dirname()
+    files: dict[str, tuple[bool, int]] = {}
+    for cache_entry in cache_entries:
+        session.delete(cache_entry)
+        for file, file_json in get_files(cache_entry, key=None).items():
+            recursive = file_json["type"] == "application/vnd+zarr"
+            files[file] = (recursive, file_json["file:size"])
+    commit_or_rollback(session)
+
+    if executor is None:
+        for file, (recursive, _) in files.items():
+            remove_file(fs, file, recursive)
+    else:
+        for future in [
+            executor.submit(remove_file, fs, file, recursive)
+            for file, (recursive, _) in files.items()
+        ]:
+            future.result()
+    return sum(size for _, size in files.values())
@@ -0,0 +1,166 @@
+import concurrent.futures
+import dataclasses
+import functools
+import time
+from typing import Literal, TypedDict
+
+import cacholote
+import structlog
+
+from . import size_index
+
+LOGGER = structlog.get_logger(__name__)
+
+
+class CleanerKwargs(TypedDict):
+    maxsize: int
+    method: Literal["LRU", "LFU"]
+    delete_unknown_files: bool
+    lock_validity_period: float
+    use_database: bool
+    depth: int
+    batch_size: int | None
+    batch_delay: float
+
+
+@dataclasses.dataclass
+class VolumeSummary:
+    """Outcome of the cleaning of a volume.
+
+    Freed bytes and deleted files are only measured with the size index.
+    """
+
+    cache_files_urlpath: str
+    duration: float = 0
+    bytes_freed: int | None = None
+    files_deleted: int | None = None
+    error: str | None = None
+
+
+def clean_volume(
+    cache_files_urlpath: str, cleaner_kwargs: CleanerKwargs
+) -> VolumeSummary:
+    """Clean one volume. Errors are logged and reported in the summary."""
+    summary = VolumeSummary(cache_files_urlpath)
+    LOGGER.info(
+        "Running cache cleaner",
+        cache_files_urlpath=cache_files_urlpath,
+        **cleaner_kwargs,
+    )
+    tic = time.perf_counter()
+    try:
+        with cacholote.config.set(cache_files_urlpath=cache_files_urlpath):
+            cacholote.clean_cache_files(**cleaner_kwargs)
+    except Exception as exc:
+        LOGGER.exception(
+            "cache_cleaner crashed", cache_files_urlpath=cache_files_urlpath
+        )
+        summary.error = repr(exc)
+    finally:
+        summary.duration = time.perf_counter() - tic
+    return summary
+
+
+def clean_volume_with_index(
+    cache_files_urlpath: str,
+    cleaner_kwargs: CleanerKwargs,
+    reconcile_sample_size: int = 0,
+) -> VolumeSummary:
+    """Clean one volume using the size index rather than scanning the volume.
+
+    The cost is proportional to the number of entries to evict.
+    ``reconcile_sample_size`` indexed results are checked against the
+    filesystem beforehand.
+    """
+    summary = VolumeSummary(cache_files_urlpath, bytes_freed=0, files_deleted=0)
+    LOGGER.info(
+        "Running cache cleaner with size index",
+        cache_files_urlpath=cache_files_urlpath,
+        reconcile_sample_size=reconcile_sample_size,
+        **cleaner_kwargs,
+    )
+    tic = time.perf_counter()
+    maxsize = cleaner_kwargs["maxsize"]
+    try:
+        with cacholote.config.set(cache_files_urlpath=cache_files_urlpath):
+            sessionmaker = cacholote.config.get().instantiated_sessionmaker
+            with sessionmaker() as session:
+                if reconcile_sample_size:
+                    fs, _ = cacholote.utils.get_cache_files_fs_dirname()
+                    n_fixed = size_index.reconcile(
+                        session, fs, cache_files_urlpath, reconcile_sample_size
+                    )
+                    LOGGER.info("size index reconciled", n_fixed=n_fixed)
+                disk_usage = size_index.get_disk_usage(session, cache_files_urlpath)
+            LOGGER.info("check disk usage", disk_usage=disk_usage)
+
+            while disk_usage > maxsize:
+                with sessionmaker() as session:
+                    n_deleted, bytes_freed = size_index.evict(
+                        session,
+                        cache_files_urlpath,
+                        method=cleaner_kwargs["method"],
+                        limit=cleaner_kwargs["batch_size"] or 1_000,
+                        bytes_to_free=disk_usage - maxsize,
+                    )
+                if not n_deleted:
+                    raise ValueError(
+                        f"Unable to clean {cache_files_urlpath!r}."
+                        f" Final disk usage: {disk_usage!r}."
+                        f" Target disk usage: {maxsize!r}"
+                    )
+                disk_usage -= bytes_freed
+                summary.bytes_freed = (summary.bytes_freed or 0) + bytes_freed
+                summary.files_deleted = (summary.files_deleted or 0) + n_deleted
+                LOGGER.info("check disk usage", disk_usage=disk_usage)
+                if disk_usage > maxsize:
+                    time.sleep(cleaner_kwargs["batch_delay"])
+    except Exception as exc:
+        LOGGER.exception(
+            "cache_cleaner crashed", cache_files_urlpath=cache_files_urlpath
+        )
+        summary.error = repr(exc)
+    finally:
+        summary.duration = time.perf_counter() - tic
+    return summary
+
+
+def clean_volumes(
+    volumes_kwargs: dict[str, CleanerKwargs],
+    max_workers: int = 1,
+    use_size_index: bool = False,
+    reconcile_sample_size: int = 0,
+) -> list[VolumeSummary]:
+    """Clean volumes, concurrently if ``max_workers`` is greater than 1.
+
+    cacholote settings are global, so concurrent volumes are cleaned in
+    separate processes, each with its own settings.
+    """
+    func = (
+        functools.partial(
+            clean_volume_with_index, reconcile_sample_size=reconcile_sample_size
+        )
+        if use_size_index
+        else clean_volume
+    )
+    if max_workers <= 1:
+        return [func(*item) for item in volumes_kwargs.items()]
+
+    with concurrent.futures.ProcessPoolExecutor(max_workers) as executor:
+        futures = {
+            cache_files_urlpath: executor.submit(
+                func, cache_files_urlpath, cleaner_kwargs
+            )
+            for cache_files_urlpath, cleaner_kwargs in volumes_kwargs.items()
+        }
+        summaries = []
+        for cache_files_urlpath, future in futures.items():
+            try:
+                summaries.append(future.result())
+            except Exception as exc:
+                # e.g., the process running the task died
+                LOGGER.exception(
+                    "cache_cleaner crashed", cache_files_urlpath=cache_files_urlpath
+                )
+                summaries.append(VolumeSummary(cache_files_urlpath, error=repr(exc)))
+    return summaries
@@ -0,0 +1,162 @@
+import contextlib
+import dataclasses
+import functools
+import os
+import threading
+import time
+from typing import Any
+
+import cads_broker.config
+import distributed
+import sqlalchemy as sa
+import sqlalchemy.orm
+import structlog
+
+from . import metrics, utils
+
+LOGGER = structlog.get_logger(__name__)
+
+
+@dataclasses.dataclass
+class PoolStats:
+    checkouts: int = 0
+    wait_time: float = 0
+    max_wait_time: float = 0
+    timeouts: int = 0
+
+
+class InstrumentedQueuePool(sa.pool.QueuePool):
+    """QueuePool measuring how long threads wait to check out a connection."""
+
+    def __init__(self, *args: Any, **kwargs: Any) -> None:
+        super().__init__(*args, **kwargs)
+        self.stats = PoolStats()
+        self._stats_lock = threading.Lock()
+
+    def _do_get(self) -> Any:
+        tic = time.perf_counter()
+        try:
+            return super()._do_get()
+        except sa.exc.TimeoutError:
+            with self._stats_lock:
+                self.stats.timeouts += 1
+            metrics.DB_POOL_TIMEOUTS.inc()
+            raise
+        finally:
+            wait_time = time.perf_counter() - tic
+            metrics.DB_POOL_CHECKOUTS.inc()
+            metrics.DB_POOL_WAIT.observe(wait_time)
+            with self._stats_lock:
+                self.stats.checkouts += 1
+                self.stats.wait_time += wait_time
+                self.stats.max_wait_time = max(self.stats.max_wait_time, wait_time)
+
+    def recreate(self) -> "InstrumentedQueuePool":
+        pool = super().recreate()
+        assert isinstance(pool, InstrumentedQueuePool)
+        pool.stats, pool._stats_lock = self.stats, self._stats_lock
+        return pool
+
+
+def get_default_pool_size() -> int:
+    """Return the number of threads of the Dask worker, or CPUs outside a worker."""
+    try:
+        return int(distributed.get_worker().state.nthreads)
+    except ValueError:
+        return os.cpu_count() or 1
+
+
+def create_engine(
+    connection_string: str,
+    pool_size: int | None = None,
+    max_overflow: int = 2,
+    pool_timeout: float = 30,
+    pool_recycle: int = 300,
+    pool_pre_ping: bool = True,
+    statement_timeout: int = 0,
+) -> sa.engine.Engine:
+    """Create an engine with an instrumented pool.
+
+    ``statement_timeout`` is in milliseconds (PostgreSQL only, 0 disables it).
+    """
+    connect_args = {}
+    if statement_timeout and connection_string.startswith("postgresql"):
+        connect_args["options"] = f"-c statement_timeout={statement_timeout}"
+    return sa.create_engine(
+        connection_string,
+        poolclass=InstrumentedQueuePool,
+        pool_size=pool_size or get_default_pool_size(),
+        max_overflow=max_overflow,
+        pool_timeout=pool_timeout,
+        pool_recycle=pool_recycle,
+        pool_pre_ping=pool_pre_ping,
+        connect_args=connect_args,
+    )
+
+
+def create_session_maker() -> sa.orm.sessionmaker[Any]:
+    connection_string = cads_broker.config.ensure_settings().connection_string
+    engine = create_engine(
+        connection_string,
+        pool_size=int(os.getenv("WORKER_DB_POOL_SIZE", 0)),
+        max_overflow=int(os.getenv("WORKER_DB_MAX_OVERFLOW", 2)),
+        pool_timeout=float(os.getenv("WORKER_DB_POOL_TIMEOUT", 30)),
+        pool_recycle=int(os.getenv("WORKER_DB_POOL_RECYCLE", 300)),
+        pool_pre_ping=utils.strtobool(os.getenv("WORKER_DB_POOL_PRE_PING", "true")),
+        statement_timeout=int(os.getenv("WORKER_DB_STATEMENT_TIMEOUT", 0)),
+    )
+    LOGGER.info(
+        "Database pool created",
+        pool_size=engine.pool.size(),  # type: ignore[attr-defined]
+        max_overflow=engine.pool._max_overflow,  # type: ignore[attr-defined]
+    )
+    # the pool is replaced when the engine is disposed
+    metrics.DB_POOL_CHECKED_OUT.set_function(
+        lambda: engine.pool.checkedout()  # type: ignore[attr-defined]
+    )
+    metrics.DB_POOL_OVERFLOW.set_function(
+        lambda: engine.pool.overflow()  # type: ignore[attr-defined]
+    )
+    return sa.orm.sessionmaker(engine)
+
+
+@functools.lru_cache
+def get_session_maker() -> sa.orm.sessionmaker[Any]:
+    """Return the session maker shared by the process."""
+    return create_session_maker()
+
+
+def get_pool_stats(session_maker: sa.orm.sessionmaker[Any]) -> dict[str, Any]:
+    """Return pool occupancy and checkout wait times of the session maker engine."""
+    bind = session_maker.kw.get("bind")
+    pool = getattr(bind, "pool", None)
+    if not isinstance(pool, InstrumentedQueuePool):
+        return {}
+    with pool._stats_lock:
+        stats = dataclasses.asdict(pool.stats)
+    return {
+        "pool_size": pool.size(),
+        "checked_out": pool.checkedout(),
+        "overflow": pool.overflow(),
+        "checked_in": pool.checkedin(),
+        **stats,
+    }
+
+
+def warm_up_pool(
+    session_maker: sa.orm.sessionmaker[Any], connections: int | None = None
+) -> int:
+    """Open ``connections`` pool connections (default: pool size).
+
+    Return the number of connections opened.
+    """
+    engine = session_maker.kw["bind"]
+    pool_size = engine.pool.size() if isinstance(engine.pool, sa.pool.QueuePool) else 1
+    if connections is None:
+        connections = pool_size
+    connections = min(connections, pool_size)
+    with contextlib.ExitStack() as stack:
+        for _ in range(connections):
+            connection = stack.enter_context(engine.connect())
+            connection.execute(sa.text("SELECT 1"))
+    return connections
@@ -1,37 +1,30 @@
+"""Command line entry points.
+
+Heavy dependencies (cacholote, boto3, ...) are imported by the commands
+that need them, to keep the start-up of each command short.
+"""
+
+import dataclasses
 import datetime
+import functools
 import os
-from typing import Annotated, Literal, TypedDict
+from typing import Annotated, Literal
 
-import cacholote
-import cads_broker.object_storage
 import structlog
 import typer
 from typer import Option
 
-from . import config, models
+from . import config, utils
 
 config.configure_logger()
 LOGGER = structlog.get_logger(__name__)
-cacholote.config.set(logger=LOGGER)
-
 
-def strtobool(value: str) -> bool:
-    if value.lower() in ("y", "yes", "t", "true", "on", "1"):
-        return True
-    if value.lower() in ("n", "no", "f", "false", "off", "0"):
-        return False
-    raise ValueError(f"invalid truth value {value!r}")
 
+@functools.lru_cache
+def _configure_cacholote() -> None:
+    import cacholote
 
-class CleanerKwargs(TypedDict):
-    maxsize: int
-    method: Literal["LRU", "LFU"]
-    delete_unknown_files: bool
-    lock_validity_period: float
-    use_database: bool
-    depth: int
-    batch_size: int | None
-    batch_delay: float
+    cacholote.config.set(logger=LOGGER)
 
 
 def _get_cache_method() -> Literal["LRU", "LFU"]:
@@ -44,11 +37,41 @@ def _get_cache_method() -> Literal["LRU", "LFU"]:
             raise NotImplementedError(f"{method=}")
 
 
+def _reap_tmp_paths(volumes: list[str]) -> list[str]:
+    from . import reaper
+
+    summaries = reaper.reap_volumes(
+        volumes,
+        max_workers=int(os.getenv("REAPER_WORKERS", 8)),
+        depth=int(os.getenv("CACHE_DEPTH", 2)),
+        max_age=float(
+            os.getenv("REAPER_MAX_AGE", os.getenv("LOCK_VALIDITY_PERIOD", 86400))
+        ),
+        delete_workers=int(os.getenv("REAPER_DELETE_WORKERS", 8)),
+        batch_size=int(os.getenv("REAPER_BATCH_SIZE", 100)),
+        batch_delay=float(os.getenv("BATCH_DELAY", 0)),
+        dry_run=utils.strtobool(os.getenv("REAPER_DRY_RUN", "0")),
+    )
+    for summary in summaries:
+        LOGGER.info("Reaper summary", **dataclasses.asdict(summary))
+    return [summary.cache_files_urlpath for summary in summaries if summary.error]
+
+
 def _cache_cleaner() -> None:
-    use_database = strtobool(os.environ.get("USE_DATABASE", "1"))
+    from . import cleaner, models
+
+    _configure_cacholote()
+    use_database = utils.strtobool(os.environ.get("USE_DATABASE", "1"))
     volumes = models.DataVolumes.from_yaml().volumes
-    for cache_files_urlpath, volume_config in volumes.items():
-        cleaner_kwargs = CleanerKwargs(
+    reaper_failed = []
+    if utils.strtobool(os.getenv("USE_REAPER", "0")):
+        reaper_failed = _reap_tmp_paths(list(volumes))
+    if utils.strtobool(os.getenv("REAPER_ONLY", "0")):
+        if reaper_failed:
+            raise RuntimeError(f"Reaper failed on volumes: {reaper_failed}")
+        return
+    volumes_kwargs = {
+        cache_files_urlpath: cleaner.CleanerKwargs(
             maxsize=volume_config.max_size,
             method=_get_cache_method(),
             delete_unknown_files=not use_database,
@@ -58,17 +81,22 @@ def _cache_cleaner() -> None:
             batch_size=int(os.getenv("BATCH_SIZE", 0)) or None,
             batch_delay=float(os.getenv("BATCH_DELAY", 0)),
         )
-        cacholote.config.set(cache_files_urlpath=cache_files_urlpath)
-        LOGGER.info(
-            "Running cache cleaner",
-            cache_files_urlpath=cache_files_urlpath,
-            **cleaner_kwargs,
-        )
-        try:
-            cacholote.clean_cache_files(**cleaner_kwargs)
-        except Exception:
-            LOGGER.exception("cache_cleaner crashed")
-            raise
+        for cache_files_urlpath, volume_config in volumes.items()
+    }
+    summaries = cleaner.clean_volumes(
+        volumes_kwargs,
+        max_workers=int(os.getenv("CLEANER_WORKERS", 1)),
+        use_size_index=utils.strtobool(os.getenv("USE_SIZE_INDEX", "0")),
+        reconcile_sample_size=int(os.getenv("SIZE_INDEX_RECONCILE_SAMPLE_SIZE", 100)),
+    )
+    for summary in summaries:
+        LOGGER.info("Cache cleaner summary", **dataclasses.asdict(summary))
+    if reaper_failed:
+        raise RuntimeError(f"Reaper failed on volumes: {reaper_failed}")
+    if failed := [
+        summary.cache_files_urlpath for summary in summaries if summary.error
+    ]:
+        raise RuntimeError(f"Cache cleaner failed on volumes: {failed}")
 
 
 def _add_tzinfo(timestamp: datetime.datetime) -> datetime.datetime:
@@ -107,13 +135,60 @@ def _expire_cache_entries(
         bool,
         Option("--dry-run", help="Perform a trial run that doesn't make any changes"),
     ] = False,
+    stream: Annotated[
+        bool,
+        Option(
+            "--stream",
+            help="Process entries in chunks, with progress and parallel deletion",
+        ),
+    ] = False,
+    checkpoint: Annotated[
+        str | None,
+        Option(help="Checkpoint file used by '--stream' to resume"),
+    ] = None,
+    resume: Annotated[
+        bool,
+        Option("--resume", help="Resume from the checkpoint file"),
+    ] = False,
+    max_workers: Annotated[
+        int,
+        Option(help="Number of files deleted in parallel by '--stream'"),
+    ] = 8,
+    progress_interval: Annotated[
+        float,
+        Option(help="Seconds between progress lines of '--stream'"),
+    ] = 10,
 ) -> int:
     """Expire cache entries."""
+    import cacholote
+
+    from . import expire
+
+    _configure_cacholote()
     if (all_collections and collection_id) or not (all_collections or collection_id):
         raise ValueError(
             "Either '--collection-id' or '--all-collections' must be chosen, but not both."
         )
 
+    if stream:
+        count = expire.expire_cache_entries(
+            tags=None if all_collections else collection_id,
+            before=_add_tzinfo(before),
+            after=_add_tzinfo(after),
+            delete=delete,
+            batch_size=batch_size,
+            batch_delay=batch_delay,
+            dry_run=dry_run,
+            checkpoint_path=checkpoint,
+            resume=resume,
+            max_workers=max_workers,
+            progress_interval=progress_interval,
+        )
+        typer.echo(
+            f"Number of entries {'to expire' if dry_run else 'expired'}: {count}"
+        )
+        return count
+
     count = cacholote.expire_cache_entries(
         tags=None if all_collections else collection_id,
         before=_add_tzinfo(before),
@@ -128,6 +203,8 @@ def _expire_cache_entries(
 
 
 def _init_buckets() -> None:
+    from . import buckets, models
+
     object_storage_url = os.environ["OBJECT_STORAGE_URL"]
     storage_kws: dict[str, str] = {
         "aws_access_key_id": os.environ["STORAGE_ADMIN"],
@@ -135,15 +212,37 @@ def _init_buckets() -> None:
     }
     LOGGER.info("Initializing buckets", object_storage_url=object_storage_url)
     data_volumes = models.DataVolumes.from_yaml().volumes
-    for data_volume in data_volumes:
-        if data_volume.startswith("s3://"):
-            LOGGER.info("Initializing bucket", data_volume=data_volume)
-            cads_broker.object_storage.create_download_bucket(
-                data_volume, object_storage_url, **storage_kws
-            )
+    summaries = buckets.init_buckets(
+        [
+            data_volume
+            for data_volume in data_volumes
+            if data_volume.startswith("s3://")
+        ],
+        object_storage_url,
+        max_workers=int(os.getenv("INIT_BUCKETS_WORKERS", 8)),
+        lifecycle=buckets.get_lifecycle_configuration(),
+        **storage_kws,
+    )
+    for summary in summaries:
+        LOGGER.info("Bucket initialized", **dataclasses.asdict(summary))
+    if failed := [
+        summary.data_volume
+        for summary in summaries
+        if summary.status not in ("initialized", "skipped")
+    ]:
+        raise RuntimeError(f"Bucket initialization failed on volumes: {failed}")
     LOGGER.info("Buckets initialized")
 
 
+def _init_size_index() -> None:
+    import cacholote
+
+    from . import size_index
+
+    size_index.init_table(cacholote.config.get().instantiated_sessionmaker)
+    LOGGER.info("Size index initialized", table=size_index.CACHE_SIZES.name)
+
+
 def cache_cleaner() -> None:
     typer.run(_cache_cleaner)
 
@@ -154,3 +253,7 @@ def expire_cache_entries() -> None:
 
 def init_buckets() -> None:
     typer.run(_init_buckets)
+
+
+def init_size_index() -> None:
+    typer.run(_init_size_index)
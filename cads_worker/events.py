@@ -0,0 +1,140 @@
+import collections
+import datetime
+import threading
+from typing import Any, Callable, Literal, get_args
+
+import structlog
+
+LOGGER = structlog.get_logger(__name__)
+
+OverflowPolicy = Literal["block", "drop_newest", "drop_oldest"]
+
+
+class EventBuffer:
+    """Queue broker events in memory and write them in batches from a thread.
+
+    Parameters
+    ----------
+    write_events: callable
+        Function writing a list of events (dictionaries with ``event_type``,
+        ``request_uid``, ``message`` and ``timestamp``) in a single transaction.
+    max_size: int
+        Maximum number of queued events.
+    batch_size: int
+        Number of queued events that triggers a write.
+    flush_interval: float
+        Maximum time in seconds that an event can wait in the queue.
+    overflow: {"block", "drop_newest", "drop_oldest"}
+        What to do when the queue is full.
+    """
+
+    def __init__(
+        self,
+        write_events: Callable[[list[dict[str, Any]]], None],
+        max_size: int = 10_000,
+        batch_size: int = 500,
+        flush_interval: float = 1,
+        overflow: OverflowPolicy = "block",
+    ) -> None:
+        if overflow not in get_args(OverflowPolicy):
+            raise ValueError(f"{overflow=}")
+        if not 0 < batch_size <= max_size:
+            raise ValueError(f"{batch_size=} {max_size=}")
+
+        self.write_events = write_events
+        self.max_size = max_size
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.overflow = overflow
+        self.dropped = 0
+
+        self._events: collections.deque[dict[str, Any]] = collections.deque()
+        self._in_flight = 0
+        self._flush_requested = False
+        self._closed = False
+        self._condition = threading.Condition()
+        self._thread = threading.Thread(
+            target=self._run, name="cads-worker-event-buffer", daemon=True
+        )
+        self._thread.start()
+
+    def __len__(self) -> int:
+        with self._condition:
+            return len(self._events) + self._in_flight
+
+    def put(self, event_type: str, request_uid: str | None, message: str) -> bool:
+        """Queue an event. Return False if the event has been dropped."""
+        event = {
+            "event_type": event_type,
+            "request_uid": request_uid,
+            "message": message,
+            # written later, keep the time of the event
+            "timestamp": datetime.datetime.now(datetime.timezone.utc),
+        }
+        with self._condition:
+            if self._closed:
+                raise RuntimeError("EventBuffer is closed.")
+            while len(self._events) >= self.max_size:
+                if self.overflow == "drop_newest":
+                    self.dropped += 1
+                    return False
+                if self.overflow == "drop_oldest":
+                    self._events.popleft()
+                    self.dropped += 1
+                    break
+                self._condition.wait()
+            self._events.append(event)
+            if len(self._events) >= self.batch_size:
+                self._condition.notify_all()
+        return True
+
+    def flush(self, timeout: float | None = None) -> bool:
+        """Wait until all queued events are written. Return False on timeout."""
+        with self._condition:
+            self._flush_requested = True
+            self._condition.notify_all()
+            return self._condition.wait_for(
+                lambda: not self._events and not self._in_flight, timeout
+            )
+
+    def close(self, timeout: float | None = None) -> None:
+        """Write all queued events and stop the background thread."""
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+        self._thread.join(timeout)
+
+    def _ready(self) -> bool:
+        return (
+            self._closed
+            or self._flush_requested
+            or len(self._events) >= self.batch_size
+        )
+
+    def _run(self) -> None:
+        while True:
+            with self._condition:
+                self._condition.wait_for(self._ready, self.flush_interval)
+                if not self._events:
+                    self._flush_requested = False
+                    self._condition.notify_all()
+                    if self._closed:
+                        return
+                    continue
+                batch = [
+                    self._events.popleft()
+                    for _ in range(min(self.batch_size, len(self._events)))
+                ]
+                self._in_flight = len(batch)
+                self._condition.notify_all()
+
+            try:
+                self.write_events(batch)
+            except Exception:
+                LOGGER.exception("Failed to write events", n_events=len(batch))
+                with self._condition:
+                    self.dropped += len(batch)
+            finally:
+                with self._condition:
+                    self._in_flight = 0
+                    self._condition.notify_all()
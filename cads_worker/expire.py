@@ -0,0 +1,142 @@
+import concurrent.futures
+import dataclasses
+import datetime
+import hashlib
+import json
+import os
+import time
+
+import cacholote
+import sqlalchemy as sa
+import structlog
+from cacholote.database import CacheEntry
+
+from . import cache_files
+
+LOGGER = structlog.get_logger(__name__)
+
+COLUMNS = CacheEntry.__table__.c
+
+
+@dataclasses.dataclass
+class Checkpoint:
+    key: str
+    last_id: int = 0
+    count: int = 0
+    bytes_freed: int = 0
+
+    @classmethod
+    def load(cls, path: str, key: str) -> "Checkpoint":
+        with open(path) as f:
+            checkpoint = cls(**json.load(f))
+        if checkpoint.key != key:
+            raise ValueError(
+                f"Checkpoint {path!r} was created with different parameters."
+            )
+        return checkpoint
+
+    def save(self, path: str) -> None:
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(dataclasses.asdict(self), f)
+        os.replace(tmp_path, path)
+
+
+def expire_cache_entries(
+    tags: list[str] | None,
+    before: datetime.datetime,
+    after: datetime.datetime,
+    delete: bool = False,
+    batch_size: int | None = None,
+    batch_delay: float = 0,
+    dry_run: bool = False,
+    checkpoint_path: str | None = None,
+    resume: bool = False,
+    max_workers: int = 8,
+    progress_interval: float = 10,
+) -> int:
+    """Expire cache entries in chunks, with progress and a resumable checkpoint.
+
+    Entries are selected in chunks of ``batch_size`` ordered by id (keyset
+    pagination). Files of deleted entries are removed by ``max_workers``
+    threads. After each chunk, the last processed id is saved in the
+    checkpoint file, which is removed once all entries are processed.
+    """
+    batch_size = batch_size or 1_000
+    key = hashlib.md5(
+        json.dumps([tags, before.isoformat(), after.isoformat(), delete]).encode()
+    ).hexdigest()
+    if resume:
+        if checkpoint_path is None:
+            raise ValueError("'--resume' requires '--checkpoint'.")
+        checkpoint = Checkpoint.load(checkpoint_path, key)
+        LOGGER.info("Resuming from checkpoint", **dataclasses.asdict(checkpoint))
+    else:
+        checkpoint = Checkpoint(key)
+
+    filters = [COLUMNS.created_at < before, COLUMNS.created_at > after]
+    if tags is not None:
+        filters.append(COLUMNS.tag.in_(tags))
+
+    sessionmaker = cacholote.config.get().instantiated_sessionmaker
+    with sessionmaker() as session:
+        total = session.scalar(
+            sa.select(sa.func.count(COLUMNS.id)).filter(
+                *filters, COLUMNS.id > checkpoint.last_id
+            )
+        )
+    assert isinstance(total, int)
+    if dry_run:
+        return total
+
+    now = cacholote.utils.utcnow()
+    tic = last_progress = time.perf_counter()
+    count = 0
+    with concurrent.futures.ThreadPoolExecutor(max_workers) as executor:
+        while True:
+            with sessionmaker() as session:
+                cache_entries = list(
+                    session.scalars(
+                        sa.select(CacheEntry)
+                        .filter(*filters, COLUMNS.id > checkpoint.last_id)
+                        .order_by(COLUMNS.id)
+                        .limit(batch_size)
+                    )
+                )
+                if not cache_entries:
+                    break
+                last_id: int = cache_entries[-1].id  # type: ignore[assignment]
+                if delete:
+                    checkpoint.bytes_freed += cache_files.delete_cache_entries(
+                        session, cache_entries, executor
+                    )
+                else:
+                    for cache_entry in cache_entries:
+                        cache_entry.expiration = now  # type: ignore[assignment]
+                    cache_files.commit_or_rollback(session)
+
+            count += len(cache_entries)
+            checkpoint.count += len(cache_entries)
+            checkpoint.last_id = last_id
+            if checkpoint_path is not None:
+                checkpoint.save(checkpoint_path)
+
+            toc = time.perf_counter()
+            if toc - last_progress >= progress_interval:
+                last_progress = toc
+                rate = count / (toc - tic)
+                LOGGER.info(
+                    "Expiring cache entries",
+                    count=checkpoint.count,
+                    remaining=total - count,
+                    entries_per_second=round(rate, 1),
+                    bytes_freed=checkpoint.bytes_freed,
+                    eta=round((total - count) / rate) if rate else None,
+                )
+            if len(cache_entries) == batch_size:
+                time.sleep(batch_delay)
+
+    if checkpoint_path is not None and os.path.exists(checkpoint_path):
+        os.remove(checkpoint_path)
+    LOGGER.info("Cache entries expired", **dataclasses.asdict(checkpoint))
+    return checkpoint.count
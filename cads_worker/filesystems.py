@@ -1,10 +1,47 @@
+import concurrent.futures
+import io
+import mmap
+import os
+import threading
+import time
+from typing import Any
+
+import fsspec
 import fsspec.implementations.local
 from fsspec.utils import stringify_path
 
 
 class CCIFileSystem(fsspec.implementations.local.LocalFileSystem):
+    """Local filesystem with fast paths for metadata-heavy operations.
+
+    ``find`` and ``du`` scan directories with ``os.scandir`` in a pool of
+    ``max_workers`` threads, and only stat entries when details are needed.
+    If ``metadata_ttl`` is positive, ``info`` results are cached for that
+    many seconds.
+
+    If ``mmap_read``, files opened in "rb" mode are memory-mapped.
+    If ``readahead``, the kernel is told that reads are sequential.
+    """
+
     protocol = "cci"
 
+    def __init__(
+        self,
+        *args,
+        max_workers=16,
+        metadata_ttl=0,
+        mmap_read=False,
+        readahead=False,
+        **kwargs,
+    ):
+        super().__init__(*args, **kwargs)
+        self.max_workers = max_workers
+        self.metadata_ttl = metadata_ttl
+        self.mmap_read = mmap_read
+        self.readahead = readahead
+        self._metadata = {}
+        self._metadata_lock = threading.Lock()
+
     @classmethod
     def _strip_protocol(cls, path):
         assert isinstance(cls.protocol, str)
@@ -18,6 +55,228 @@ class CCIFileSystem(fsspec.implementations.local.LocalFileSystem):
         name = self._strip_protocol(name)
         return f"{self.protocol}://{name}"
 
+    def _cache_info(self, info):
+        if self.metadata_ttl > 0:
+            with self._metadata_lock:
+                self._metadata[info["name"]] = (time.monotonic(), info)
+        return info
+
+    def invalidate_cache(self, path=None):
+        with self._metadata_lock:
+            if path is None:
+                self._metadata.clear()
+            else:
+                self._metadata.pop(self._strip_protocol(path), None)
+
+    def info(self, path, **kwargs):
+        if self.metadata_ttl <= 0:
+            return super().info(path, **kwargs)
+        if not isinstance(path, os.DirEntry):
+            with self._metadata_lock:
+                cached = self._metadata.get(self._strip_protocol(path))
+            if cached is not None and time.monotonic() - cached[0] < self.metadata_ttl:
+                return dict(cached[1])
+        return dict(self._cache_info(super().info(path, **kwargs)))
+
+    def _scandir(self, path, detail):
+        dirs = []
+        entries = {}
+        try:
+            with os.scandir(path) as it:
+                for entry in it:
+                    try:
+                        # is_dir uses the directory entry type, no stat needed
+                        is_dir = entry.is_dir(follow_symlinks=False)
+                        if detail:
+                            entries[entry.path] = self.info(entry)
+                        else:
+                            entries[entry.path] = {
+                                "name": entry.path,
+                                "type": "directory" if is_dir else "file",
+                            }
+                    except FileNotFoundError:
+                        continue
+                    if is_dir:
+                        dirs.append(entry.path)
+        except OSError:
+            # same as walk(on_error="omit")
+            pass
+        return dirs, entries
+
+    def _walk_parallel(self, path, maxdepth, detail):
+        entries = {}
+        with concurrent.futures.ThreadPoolExecutor(self.max_workers) as executor:
+            pending = {executor.submit(self._scandir, path, detail): 1}
+            while pending:
+                done, _ = concurrent.futures.wait(
+                    pending, return_when=concurrent.futures.FIRST_COMPLETED
+                )
+                for future in done:
+                    depth = pending.pop(future)
+                    dirs, dir_entries = future.result()
+                    entries.update(dir_entries)
+                    if maxdepth is None or depth < maxdepth:
+                        for dirname in dirs:
+                            future = executor.submit(self._scandir, dirname, detail)
+                            pending[future] = depth + 1
+        return entries
+
+    def find(self, path, maxdepth=None, withdirs=False, detail=False, **kwargs):
+        if maxdepth is not None and maxdepth < 1:
+            raise ValueError("maxdepth must be at least 1")
+        path = self._strip_protocol(path)
+        if not os.path.isdir(path):
+            if not self.exists(path):
+                return {} if detail else []
+            return {path: self.info(path)} if detail else [path]
+
+        out = {}
+        if withdirs and path != "":
+            out[path] = self.info(path) if detail else None
+        for name, info in self._walk_parallel(path, maxdepth, detail).items():
+            if withdirs or info["type"] != "directory":
+                out[name] = info
+        names = sorted(out)
+        if not detail:
+            return names
+        return {name: out[name] for name in names}
+
+    def du(self, path, total=True, maxdepth=None, withdirs=False, **kwargs):
+        sizes = {
+            name: info["size"]
+            for name, info in self.find(
+                path, maxdepth=maxdepth, withdirs=withdirs, detail=True
+            ).items()
+        }
+        if total:
+            return sum(sizes.values())
+        return sizes
+
+    def ls(self, path, detail=False, **kwargs):
+        infos = super().ls(path, detail=detail, **kwargs)
+        if detail:
+            for info in infos:
+                self._cache_info(info)
+        return infos
+
+    def rm_file(self, path):
+        self.invalidate_cache(path)
+        super().rm_file(path)
+
+    def rm(self, path, recursive=False, maxdepth=None):
+        self.invalidate_cache()
+        super().rm(path, recursive=recursive, maxdepth=maxdepth)
+
+    def mv(self, path1, path2, recursive=True, **kwargs):
+        self.invalidate_cache()
+        super().mv(path1, path2, recursive=recursive, **kwargs)
+
+    def cp_file(self, path1, path2, **kwargs):
+        self.invalidate_cache(path2)
+        super().cp_file(path1, path2, **kwargs)
+
+    def touch(self, path, truncate=True, **kwargs):
+        self.invalidate_cache(path)
+        super().touch(path, truncate=truncate, **kwargs)
+
+    def _open(self, path, mode="rb", block_size=None, **kwargs):
+        if mode != "rb":
+            self.invalidate_cache(path)
+        elif self.mmap_read:
+            path = self._strip_protocol(path)
+            if os.path.getsize(path):  # empty files can't be mapped
+                return MMapFile(self, path, readahead=self.readahead)
+        f = super()._open(path, mode=mode, block_size=block_size, **kwargs)
+        if mode == "rb" and self.readahead and hasattr(os, "posix_fadvise"):
+            os.posix_fadvise(f.fileno(), 0, 0, os.POSIX_FADV_SEQUENTIAL)
+        return f
+
+
+class MMapFile(io.BufferedIOBase):
+    """Read-only file served from a memory map.
+
+    ``getbuffer`` returns a zero-copy memoryview of the whole file.
+    """
+
+    def __init__(
+        self, fs: fsspec.AbstractFileSystem, path: str, readahead: bool = False
+    ) -> None:
+        super().__init__()
+        self.fs = fs
+        self.path = self.name = path
+        self.mode = "rb"
+        with open(path, "rb") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if readahead and hasattr(mmap, "MADV_SEQUENTIAL"):
+            self._mmap.madvise(mmap.MADV_SEQUENTIAL)
+        self._pos = 0
+
+    @property
+    def size(self) -> int:
+        return len(self._mmap)
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def tell(self) -> int:
+        return self._pos
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        if whence == io.SEEK_SET:
+            pos = offset
+        elif whence == io.SEEK_CUR:
+            pos = self._pos + offset
+        elif whence == io.SEEK_END:
+            pos = self.size + offset
+        else:
+            raise ValueError(f"invalid whence ({whence!r})")
+        if pos < 0:
+            raise ValueError(f"negative seek position {pos!r}")
+        self._pos = pos
+        return pos
+
+    def getbuffer(self) -> memoryview:
+        return memoryview(self._mmap)
+
+    def read(self, size: int | None = -1) -> bytes:
+        start = min(self._pos, self.size)
+        end = self.size if size is None or size < 0 else min(start + size, self.size)
+        self._pos = end
+        return self._mmap[start:end]
+
+    read1 = read
+
+    def readinto(self, b: Any) -> int:
+        start = min(self._pos, self.size)
+        with memoryview(b) as view, memoryview(self._mmap) as data:
+            n = min(view.nbytes, self.size - start)
+            view.cast("B")[:n] = data[start : start + n]
+        self._pos = start + n
+        return n
+
+    readinto1 = readinto
+
+    def readline(self, size: int | None = -1) -> bytes:
+        start = min(self._pos, self.size)
+        end = self._mmap.find(b"\n", start)
+        end = self.size if end == -1 else end + 1
+        if size is not None and size >= 0:
+            end = min(end, start + size)
+        self._pos = end
+        return self._mmap[start:end]
+
+    def close(self) -> None:
+        if not self.closed:
+            try:
+                self._mmap.close()
+            except BufferError:
+                # unmapped once the exported buffers are garbage collected
+                pass
+        super().close()
+
 
 class CCI1FileSystem(CCIFileSystem):
     protocol = "cci1"
@@ -0,0 +1,151 @@
+import datetime
+import json
+import os
+import socket
+import time
+from typing import Any, Callable, TypeVar
+
+import sqlalchemy as sa
+import structlog
+
+from . import metrics, retry
+
+LOGGER = structlog.get_logger(__name__)
+
+T = TypeVar("T")
+
+
+class JobLifecycle:
+    """Broker bookkeeping of a job, one transaction per phase.
+
+    Events added with ``add_event`` are written together with the next phase
+    (``start``, ``complete``, ``fail`` or ``reschedule``), so that each phase
+    costs a single session checkout and commit. Elapsed times are stored in
+    ``db_latency``.
+
+    Jobs are loaded with ``load`` and started once admitted: a rescheduled
+    job never records this worker as the one running it.
+    """
+
+    def __init__(
+        self,
+        job_id: str,
+        session_maker: Callable[[], sa.orm.Session],
+        logger: Any | None = None,
+    ) -> None:
+        self.job_id = job_id
+        self.session_maker = session_maker
+        self.logger = logger if logger is not None else LOGGER
+        self.db_latency: dict[str, float] = {}
+        self._events: list[tuple[str, str, datetime.datetime]] = []
+
+    def add_event(self, event_type: str, message: str) -> None:
+        timestamp = datetime.datetime.now(datetime.timezone.utc)
+        self._events.append((event_type, message, timestamp))
+
+    def _transaction(self, phase: str, func: Callable[[sa.orm.Session], T]) -> T:
+        """Run ``func`` and write the pending events in a single transaction.
+
+        Operational errors are retried with the process retry policy. While
+        the process circuit breaker is open, it fails fast.
+        """
+        import cads_broker.database
+
+        breaker = retry.get_circuit_breaker()
+        if not breaker.allow():
+            metrics.DB_CIRCUIT_OPEN.inc()
+            raise retry.CircuitOpenError("Database circuit breaker is open.")
+        policy = retry.get_retry_policy()
+        delays = policy.delays()
+        attempt = 1
+        tic = time.perf_counter()
+        while True:
+            try:
+                with self.session_maker() as session:
+                    session.add_all(
+                        [
+                            cads_broker.database.Events(
+                                event_type=event_type,
+                                request_uid=self.job_id,
+                                message=message,
+                                timestamp=timestamp,
+                            )
+                            for event_type, message, timestamp in self._events
+                        ]
+                    )
+                    result = func(session)
+                    session.commit()
+                break
+            except sa.exc.OperationalError as e:
+                delay = next(delays, None)
+                if delay is None:
+                    breaker.record_failure()
+                    self.logger.error(
+                        "Max retries reached. Aborting operation.", phase=phase
+                    )
+                    raise
+                attempt += 1
+                metrics.DB_RETRIES.inc()
+                self.logger.warning(
+                    f"Database operation failed. Retrying {attempt}/{policy.attempts}...",
+                    phase=phase,
+                    error=str(e),
+                    delay=delay,
+                )
+                time.sleep(delay)
+            except Exception:
+                # the database answered, or wasn't reached: not a database outage
+                breaker.record_success()
+                raise
+        breaker.record_success()
+        self._events.clear()
+        self.db_latency[phase] = time.perf_counter() - tic
+        return result
+
+    def _load(
+        self, session: sa.orm.Session
+    ) -> tuple[dict[str, Any], dict[str, Any], dict[str, Any]]:
+        import cads_broker.database
+
+        # read inside the session, the instances expire on commit
+        system_request = cads_broker.database.get_request(
+            request_uid=self.job_id, session=session
+        )
+        request = system_request.request_body.get("request", {})
+        form = system_request.adaptor_properties.form
+        config = system_request.adaptor_properties.config
+        return request, form, config
+
+    def load(self) -> tuple[dict[str, Any], dict[str, Any], dict[str, Any]]:
+        """Return the request, form and config of the job, writing nothing."""
+        return self._transaction("load", self._load)
+
+    def start(self, worker_address: str) -> None:
+        """Record where the job runs, once it is admitted."""
+        self.add_event(
+            "worker_pid", json.dumps({"worker": worker_address, "pid": os.getpid()})
+        )
+        self.add_event("worker_name", socket.gethostname())
+        self._transaction("start", lambda session: None)
+
+    def complete(self, cache_id: int) -> None:
+        """Write the pending events and the cache id of the result."""
+        import cads_broker.database
+
+        self._transaction(
+            "complete",
+            lambda session: cads_broker.database.set_request_cache_id(
+                request_uid=self.job_id, cache_id=cache_id, session=session
+            ),
+        )
+        self.logger.info("Job DB latency", **self.db_latency)
+
+    def reschedule(self, message: str) -> None:
+        """Write the pending events of a job given back to the scheduler."""
+        self.add_event("job_rescheduled", message)
+        self._transaction("reschedule", lambda session: None)
+
+    def fail(self) -> None:
+        """Write the pending events of a failed job."""
+        self._transaction("fail", lambda session: None)
+        self.logger.info("Job DB latency", **self.db_latency)
@@ -0,0 +1,131 @@
+"""Process-level metrics, collected with ``prometheus_client``.
+
+Metrics are registered in the default ``prometheus_client`` registry, which
+is served by the Dask worker dashboard at ``/metrics``. Workers without a
+dashboard can serve them on ``WORKER_METRICS_PORT`` by registering
+``MetricsPlugin``.
+
+The number of label sets of each metric is bounded: once the limit is
+reached, new label values are aggregated as ``OTHER``. Use ``labels`` to get
+the child of a labelled metric.
+"""
+
+import os
+import threading
+import wsgiref.simple_server
+from typing import Any, TypeVar
+
+import distributed
+import prometheus_client
+import structlog
+
+LOGGER = structlog.get_logger(__name__)
+
+OTHER = "__other__"
+MAX_LABEL_SETS = int(os.getenv("WORKER_METRICS_MAX_LABEL_SETS", 100))
+
+M = TypeVar("M", bound=prometheus_client.metrics.MetricWrapperBase)
+
+_LABEL_SETS: dict[int, set[tuple[str, ...]]] = {}
+_LABEL_SETS_LOCK = threading.Lock()
+
+
+def labels(metric: M, max_label_sets: int | None = None, **label_values: Any) -> M:
+    """Return the child of ``metric``, aggregating label sets beyond the limit."""
+    if max_label_sets is None:
+        max_label_sets = MAX_LABEL_SETS
+    key = tuple(str(label_values[name]) for name in metric._labelnames)
+    with _LABEL_SETS_LOCK:
+        label_sets = _LABEL_SETS.setdefault(id(metric), set())
+        if key not in label_sets:
+            if len(label_sets) >= max_label_sets:
+                key = (OTHER,) * len(key)
+            label_sets.add(key)
+    return metric.labels(*key)
+
+
+JOBS = prometheus_client.Counter(
+    "cads_worker_jobs", "Jobs processed by the worker.", ("collection_id", "status")
+)
+JOB_FAILURES = prometheus_client.Counter(
+    "cads_worker_job_failures",
+    "Failed jobs by exception type.",
+    ("collection_id", "error_type"),
+)
+JOB_DURATION = prometheus_client.Histogram(
+    "cads_worker_job_duration_seconds",
+    "Duration of the jobs.",
+    ("collection_id",),
+    buckets=(1, 5, 10, 30, 60, 300, 600, 1800, 3600),
+)
+DB_RETRIES = prometheus_client.Counter(
+    "cads_worker_db_retries", "Retried database operations."
+)
+DB_CIRCUIT_OPEN = prometheus_client.Counter(
+    "cads_worker_db_circuit_open",
+    "Database operations rejected while the circuit breaker is open.",
+)
+EVENTS = prometheus_client.Counter(
+    "cads_worker_events", "Events written by the job context.", ("event_type",)
+)
+BYTES_WRITTEN = prometheus_client.Counter(
+    "cads_worker_cache_bytes_written",
+    "Bytes of new results written to the cache.",
+    ("volume",),
+)
+DB_POOL_CHECKOUTS = prometheus_client.Counter(
+    "cads_worker_db_pool_checkouts", "Connections checked out of the database pool."
+)
+DB_POOL_TIMEOUTS = prometheus_client.Counter(
+    "cads_worker_db_pool_timeouts", "Checkouts of the database pool timed out."
+)
+DB_POOL_WAIT = prometheus_client.Histogram(
+    "cads_worker_db_pool_wait_seconds",
+    "Time waited to check out a connection of the database pool.",
+    buckets=(0.001, 0.01, 0.1, 0.5, 1, 5, 10, 30),
+)
+DB_POOL_CHECKED_OUT = prometheus_client.Gauge(
+    "cads_worker_db_pool_checked_out", "Connections of the database pool in use."
+)
+DB_POOL_OVERFLOW = prometheus_client.Gauge(
+    "cads_worker_db_pool_overflow",
+    "Overflow connections of the database pool (negative while below pool size).",
+)
+WARMUP_DURATION = prometheus_client.Histogram(
+    "cads_worker_warmup_duration_seconds",
+    "Duration of the worker warm-up steps.",
+    ("step",),
+    buckets=(0.1, 0.5, 1, 5, 10, 30, 60),
+)
+
+
+class MetricsPlugin(distributed.WorkerPlugin):
+    """Dask worker plugin serving the metrics of the worker process.
+
+    Only needed when the worker dashboard is disabled. Register it with
+    ``client.register_plugin(MetricsPlugin(port))``, the port defaults to
+    ``WORKER_METRICS_PORT``.
+    """
+
+    name = "cads-worker-metrics"
+
+    def __init__(self, port: int | None = None, addr: str = "0.0.0.0") -> None:
+        self.port = port
+        self.addr = addr
+        self.server: wsgiref.simple_server.WSGIServer | None = None
+
+    def setup(self, worker: distributed.Worker) -> None:
+        port = self.port
+        if port is None:
+            if not (env_port := os.getenv("WORKER_METRICS_PORT")):
+                LOGGER.warning("WORKER_METRICS_PORT is not set, metrics not served")
+                return
+            port = int(env_port)
+        self.server, _ = prometheus_client.start_http_server(port, self.addr)
+        LOGGER.info("Serving metrics", port=self.server.server_address[1])
+
+    def teardown(self, worker: distributed.Worker) -> None:
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
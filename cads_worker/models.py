@@ -1,5 +1,9 @@
+import functools
+import math
 import os
 import random
+import threading
+import time
 import urllib
 from typing import Annotated, Self
 
@@ -23,19 +27,31 @@ class DataVolumeConfig(BaseModel):
     )
 
 
+def get_local_path(volume: str) -> str | None:
+    """Return the local path of a volume, or None if it is not a local volume."""
+    parsed = urllib.parse.urlparse(volume)
+    fs = fsspec.filesystem(parsed.scheme)
+    if isinstance(fs, fsspec.implementations.local.LocalFileSystem):
+        return parsed.path
+    return None
+
+
+def is_volume_available(volume: str) -> bool:
+    path = get_local_path(volume)
+    return not (
+        path is not None
+        and path.startswith("/")
+        and not os.path.ismount(f"/{path.split('/')[1]}")
+    )
+
+
 class DataVolumes(BaseModel):
     volumes: dict[str, DataVolumeConfig]
 
     def filter_available_volumes(self) -> dict[str, DataVolumeConfig]:
         available_volumes = {}
         for volume in self.volumes:
-            parsed = urllib.parse.urlparse(volume)
-            fs = fsspec.filesystem(parsed.scheme)
-            if (
-                isinstance(fs, fsspec.implementations.local.LocalFileSystem)
-                and parsed.path.startswith("/")
-                and not os.path.ismount(f"/{parsed.path.split('/')[1]}")
-            ):
+            if not is_volume_available(volume):
                 LOGGER.warning(f"Volume {volume} is not available. Skipping it.")
                 continue
             available_volumes[volume] = self.volumes[volume]
@@ -63,3 +79,107 @@ class DataVolumes(BaseModel):
                 for k, v in raw_dict.items()
             }
         )
+
+
+class VolumeRegistry:
+    """Cache of the data volumes configuration and of their availability.
+
+    The configuration is reloaded only when the file changes (mtime/inode).
+    Volumes availability is probed again in a background thread once the
+    previous probe is older than ``probe_ttl`` seconds. Meanwhile, the previous
+    table of available volumes is used.
+    """
+
+    def __init__(self, path: str, probe_ttl: float = 60) -> None:
+        self.path = path
+        self.probe_ttl = probe_ttl
+        self._lock = threading.Lock()
+        self._file_id: tuple[int, int] | None = None
+        self._data_volumes = DataVolumes(volumes={})
+        self._table: tuple[dict[str, DataVolumeConfig], list[float]] = ({}, [])
+        self._probed_at = -math.inf
+        self._probing = False
+
+    @property
+    def data_volumes(self) -> DataVolumes:
+        self._maybe_reload()
+        return self._data_volumes
+
+    @property
+    def available_volumes(self) -> dict[str, DataVolumeConfig]:
+        available_volumes, _ = self.get_table()
+        return available_volumes
+
+    def get_random_volume(self) -> str:
+        available_volumes, cum_weights = self.get_table()
+        (volume,) = random.choices(
+            list(available_volumes), cum_weights=cum_weights, k=1
+        )
+        return volume
+
+    def get_table(self) -> tuple[dict[str, DataVolumeConfig], list[float]]:
+        """Return the available volumes and their cumulative weights."""
+        self._maybe_reload()
+        if time.monotonic() - self._probed_at > self.probe_ttl:
+            self._start_probe()
+        return self._table
+
+    def _maybe_reload(self) -> None:
+        stat = os.stat(self.path)
+        file_id = (stat.st_ino, stat.st_mtime_ns)
+        if file_id == self._file_id:
+            return
+        with self._lock:
+            if file_id == self._file_id:
+                return
+            data_volumes = DataVolumes.from_yaml(self.path)
+            self._set_available_volumes(data_volumes.filter_available_volumes())
+            self._data_volumes = data_volumes
+            self._file_id = file_id
+        LOGGER.info(
+            "Data volumes loaded", path=self.path, volumes=list(data_volumes.volumes)
+        )
+
+    def _set_available_volumes(
+        self, available_volumes: dict[str, DataVolumeConfig]
+    ) -> None:
+        cum_weights = []
+        total = 0.0
+        for config in available_volumes.values():
+            total += config.weight
+            cum_weights.append(total)
+        self._table = (available_volumes, cum_weights)
+        self._probed_at = time.monotonic()
+
+    def _start_probe(self) -> None:
+        with self._lock:
+            if self._probing:
+                return
+            self._probing = True
+        threading.Thread(
+            target=self._probe, name="cads-worker-volumes-probe", daemon=True
+        ).start()
+
+    def _probe(self) -> None:
+        try:
+            with self._lock:
+                data_volumes = self._data_volumes
+            available_volumes = data_volumes.filter_available_volumes()
+            with self._lock:
+                if data_volumes is self._data_volumes:
+                    self._set_available_volumes(available_volumes)
+        except Exception:
+            LOGGER.exception("Data volumes probe failed")
+        finally:
+            self._probing = False
+
+
+@functools.lru_cache
+def _get_volume_registry(path: str, probe_ttl: float) -> VolumeRegistry:
+    return VolumeRegistry(path, probe_ttl=probe_ttl)
+
+
+def get_volume_registry(path: str | None = None) -> VolumeRegistry:
+    if path is None:
+        path = os.environ["DATA_VOLUMES_CONFIG"]
+    return _get_volume_registry(path, float(os.getenv("DATA_VOLUMES_PROBE_TTL", 60)))
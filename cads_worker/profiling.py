@@ -0,0 +1,61 @@
+import contextlib
+import os
+import resource
+import time
+from collections.abc import Iterator
+from typing import Any
+
+from . import utils
+
+
+class JobProfile:
+    """Phase timings and resource usage of a job.
+
+    CPU time is measured on the thread running the job. ``rss_growth`` is
+    the growth of the RSS of the process during the job, sampled at the end
+    of each phase, so concurrent jobs of the process contribute to it.
+    ``process_max_rss`` is the high-water mark of the whole worker process
+    since it started, it isn't specific to the job.
+    """
+
+    def __init__(self, enabled: bool = True) -> None:
+        self.enabled = enabled
+        self.phases: dict[str, float] = {}
+        self.bytes_written = 0
+        self.scratch_high_water = 0
+        self._tic = time.perf_counter()
+        self._thread_time = time.thread_time()
+        self._start_rss = self._peak_rss = utils.get_rss()
+
+    @contextlib.contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        if not self.enabled:
+            yield
+            return
+        tic = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases[name] = self.phases.get(name, 0) + time.perf_counter() - tic
+            self.sample_rss()
+
+    def sample_rss(self) -> None:
+        self._peak_rss = max(self._peak_rss, utils.get_rss())
+
+    def summary(self) -> dict[str, Any]:
+        self.sample_rss()
+        return {
+            "phases": {name: round(value, 3) for name, value in self.phases.items()},
+            "elapsed": round(time.perf_counter() - self._tic, 3),
+            "cpu_time": round(time.thread_time() - self._thread_time, 3),
+            "rss_growth": self._peak_rss - self._start_rss,
+            # kilobytes on Linux
+            "process_max_rss": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+            * 1024,
+            "bytes_written": self.bytes_written,
+            "scratch_high_water": self.scratch_high_water,
+        }
+
+
+def is_enabled() -> bool:
+    return utils.strtobool(os.getenv("WORKER_JOB_PROFILE", "true"))
@@ -0,0 +1,37 @@
+import os
+from typing import Any
+
+import cacholote
+import fsspec
+import fsspec.implementations.local
+
+from . import utils
+
+
+def get_publish_settings(cache_files_urlpath: str) -> dict[str, Any]:
+    """Return the cacholote settings used to publish results.
+
+    On local volumes, results are copied in the cache directory. With
+    ``WORKER_PUBLISH_MOVE_LOCAL``, they are moved instead (atomic rename),
+    which deletes the files returned by the adaptors. On S3, the ACL is set
+    at upload time and multipart uploads send ``WORKER_S3_MAX_CONCURRENCY``
+    parts in parallel. Storage options already configured take precedence.
+    """
+    fs, _ = fsspec.core.url_to_fs(cache_files_urlpath)
+    if isinstance(fs, fsspec.implementations.local.LocalFileSystem):
+        return {
+            "io_delete_original": utils.strtobool(
+                os.getenv("WORKER_PUBLISH_MOVE_LOCAL", "false")
+            )
+        }
+    if "s3" in fs.protocol:
+        storage_options = dict(cacholote.config.get().cache_files_storage_options)
+        storage_options["s3_additional_kwargs"] = {
+            "ACL": "public-read",
+            **storage_options.get("s3_additional_kwargs", {}),
+        }
+        storage_options.setdefault(
+            "max_concurrency", int(os.getenv("WORKER_S3_MAX_CONCURRENCY", 8))
+        )
+        return {"cache_files_storage_options": storage_options}
+    return {}
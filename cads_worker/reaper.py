@@ -0,0 +1,189 @@
+"""Reap the cache tmp paths left on the volumes by dead workers.
+
+``utils.make_cache_tmp_path`` creates ``tmpXXXXXXXX`` directories and their
+``tmpXXXXXXXX.lock`` siblings in the cache directories. When a worker is
+killed, both are left on the volume and are never accounted for by the
+cache cleaner. A tmp path is orphaned when its lock is older than
+``max_age``, when it was created by a process of this host that is gone,
+or when it has no lock and is older than ``max_age``.
+"""
+
+import concurrent.futures
+import dataclasses
+import json
+import os
+import re
+import shutil
+import socket
+import time
+from collections.abc import Iterator
+from typing import Any
+
+import structlog
+
+from . import models, utils
+
+LOGGER = structlog.get_logger(__name__)
+
+# names of tempfile.TemporaryDirectory
+TMP_PATH_PATTERN = re.compile(r"tmp[a-z0-9_]{8}")
+
+
+@dataclasses.dataclass
+class ReaperSummary:
+    cache_files_urlpath: str
+    duration: float = 0
+    bytes_reclaimed: int = 0
+    dirs_deleted: int = 0
+    locks_deleted: int = 0
+    alive: int = 0
+    error: str | None = None
+
+
+def read_lock(path: str) -> dict[str, Any]:
+    """Return the owner of a lock, or an empty dict if it isn't recorded."""
+    try:
+        with open(path) as f:
+            lock_info = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    return lock_info if isinstance(lock_info, dict) else {}
+
+
+def is_pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def is_alive(
+    lock_info: dict[str, Any],
+    age: float,
+    max_age: float,
+    hostname: str | None = None,
+) -> bool:
+    if age > max_age:
+        return False
+    if hostname is None:
+        hostname = socket.gethostname()
+    if lock_info.get("host") == hostname and isinstance(lock_info.get("pid"), int):
+        return is_pid_alive(lock_info["pid"])
+    return True
+
+
+def _scan_dirs(path: str, depth: int) -> Iterator[str]:
+    yield path
+    if depth == 2:
+        with os.scandir(path) as it:
+            for entry in it:
+                if entry.is_dir() and not TMP_PATH_PATTERN.fullmatch(entry.name):
+                    yield entry.path
+
+
+def find_orphans(
+    path: str, depth: int, max_age: float, now: float | None = None
+) -> tuple[list[str], int]:
+    """Return the orphaned tmp paths and the number of live tmp paths."""
+    if now is None:
+        now = time.time()
+    orphans: list[str] = []
+    alive = 0
+    for dirname in _scan_dirs(path, depth):
+        tmp_paths: dict[str, dict[str, os.DirEntry[str]]] = {}
+        with os.scandir(dirname) as it:
+            for entry in it:
+                name, _, suffix = entry.name.partition(".")
+                if TMP_PATH_PATTERN.fullmatch(name) and suffix in ("", "lock"):
+                    tmp_paths.setdefault(name, {})[suffix] = entry
+        for name, entries in tmp_paths.items():
+            try:
+                if lock := entries.get("lock"):
+                    lock_info = read_lock(lock.path)
+                    age = now - lock.stat().st_mtime
+                else:
+                    lock_info = {}
+                    age = now - entries[""].stat().st_mtime
+            except FileNotFoundError:
+                # deleted meanwhile
+                continue
+            if is_alive(lock_info, age, max_age):
+                alive += 1
+            else:
+                orphans.extend(entry.path for entry in entries.values())
+    return orphans, alive
+
+
+def get_tmp_path_size(path: str) -> int:
+    if os.path.isdir(path) and not os.path.islink(path):
+        return utils.get_disk_usage(path)
+    return int(os.lstat(path).st_blocks * 512)
+
+
+def delete_tmp_path(path: str) -> int:
+    """Delete a tmp directory or lock and return the bytes reclaimed."""
+    try:
+        size = get_tmp_path_size(path)
+        if os.path.isdir(path) and not os.path.islink(path):
+            shutil.rmtree(path, ignore_errors=True)
+        else:
+            os.unlink(path)
+    except FileNotFoundError:
+        return 0
+    return size
+
+
+def reap_volume(
+    cache_files_urlpath: str,
+    depth: int = 2,
+    max_age: float = 86400,
+    delete_workers: int = 8,
+    batch_size: int = 100,
+    batch_delay: float = 0,
+    dry_run: bool = False,
+) -> ReaperSummary:
+    """Delete the orphaned tmp paths of a local volume, in parallel batches.
+
+    With ``dry_run``, the summary reports what would be deleted.
+    Errors are logged and reported in the summary.
+    """
+    summary = ReaperSummary(cache_files_urlpath)
+    tic = time.perf_counter()
+    try:
+        path = models.get_local_path(cache_files_urlpath)
+        if path is None:
+            LOGGER.debug("Not a local volume", cache_files_urlpath=cache_files_urlpath)
+            return summary
+        orphans, summary.alive = find_orphans(path, depth, max_age)
+        func = get_tmp_path_size if dry_run else delete_tmp_path
+        with concurrent.futures.ThreadPoolExecutor(delete_workers) as executor:
+            for start in range(0, len(orphans), batch_size):
+                if start:
+                    time.sleep(batch_delay)
+                batch = orphans[start : start + batch_size]
+                for orphan, size in zip(batch, executor.map(func, batch)):
+                    LOGGER.debug("Orphaned tmp path", path=orphan, dry_run=dry_run)
+                    summary.bytes_reclaimed += size
+                    if orphan.endswith(".lock"):
+                        summary.locks_deleted += 1
+                    else:
+                        summary.dirs_deleted += 1
+    except Exception as exc:
+        LOGGER.exception("reaper crashed", cache_files_urlpath=cache_files_urlpath)
+        summary.error = repr(exc)
+    finally:
+        summary.duration = time.perf_counter() - tic
+    return summary
+
+
+def reap_volumes(
+    volumes: list[str], max_workers: int = 1, **kwargs: Any
+) -> list[ReaperSummary]:
+    """Reap volumes, concurrently if ``max_workers`` is greater than 1."""
+    if max_workers <= 1:
+        return [reap_volume(volume, **kwargs) for volume in volumes]
+    with concurrent.futures.ThreadPoolExecutor(max_workers) as executor:
+        return list(executor.map(lambda volume: reap_volume(volume, **kwargs), volumes))
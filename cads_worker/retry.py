@@ -0,0 +1,117 @@
+import dataclasses
+import functools
+import os
+import random
+import threading
+import time
+from typing import Iterator, Literal
+
+import structlog
+
+LOGGER = structlog.get_logger(__name__)
+
+CircuitState = Literal["closed", "open", "half_open"]
+
+
+class CircuitOpenError(RuntimeError):
+    pass
+
+
+@dataclasses.dataclass
+class RetryPolicy:
+    """Exponential backoff with full jitter, bounded by a total deadline."""
+
+    attempts: int = 3
+    base_delay: float = 2
+    max_delay: float = 30
+    deadline: float = 60
+
+    def delays(self) -> Iterator[float]:
+        """Yield the sleeps between attempts, until attempts or deadline run out."""
+        end = time.monotonic() + self.deadline
+        for attempt in range(self.attempts - 1):
+            delay = random.uniform(0, min(self.max_delay, self.base_delay * 2**attempt))
+            remaining = end - time.monotonic()
+            if remaining <= 0:
+                return
+            yield min(delay, remaining)
+
+
+class CircuitBreaker:
+    """Fail fast after ``failure_threshold`` consecutive failed operations.
+
+    After ``reset_timeout`` seconds, one trial operation is allowed
+    (half open): if it succeeds the circuit is closed, otherwise it is
+    opened again. If the outcome of the trial is never recorded, another
+    trial is allowed after ``reset_timeout`` seconds.
+    """
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state: CircuitState = "closed"
+        self.failures = 0
+        self.dropped = 0
+        self._opened_at = 0.0
+        self._lock = threading.Lock()
+
+    def _set_state(self, state: CircuitState) -> None:
+        if state != self.state:
+            LOGGER.warning(
+                "Circuit breaker state changed",
+                old_state=self.state,
+                new_state=state,
+                failures=self.failures,
+                dropped=self.dropped,
+            )
+            self.state = state
+
+    def allow(self) -> bool:
+        if self.failure_threshold <= 0:
+            return True
+        with self._lock:
+            if self.state == "closed":
+                return True
+            if time.monotonic() - self._opened_at >= self.reset_timeout:
+                # new trial, also when the last one was never recorded
+                self._opened_at = time.monotonic()
+                self._set_state("half_open")
+                return True
+            return False
+
+    def record_success(self) -> None:
+        with self._lock:
+            self.failures = 0
+            self._set_state("closed")
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self.failures += 1
+            if self.state == "half_open" or (
+                0 < self.failure_threshold <= self.failures
+            ):
+                self._opened_at = time.monotonic()
+                self._set_state("open")
+
+    def record_dropped(self) -> None:
+        with self._lock:
+            self.dropped += 1
+
+
+@functools.lru_cache
+def get_retry_policy() -> RetryPolicy:
+    return RetryPolicy(
+        attempts=int(os.getenv("WORKER_DB_CONNECTION_RETRIES", 3)),
+        base_delay=float(os.getenv("WORKER_DB_CONNECTION_RETRY_SLEEP", 2)),
+        max_delay=float(os.getenv("WORKER_DB_CONNECTION_RETRY_MAX_SLEEP", 30)),
+        deadline=float(os.getenv("WORKER_DB_CONNECTION_RETRY_DEADLINE", 60)),
+    )
+
+
+@functools.lru_cache
+def get_circuit_breaker() -> CircuitBreaker:
+    """Circuit breaker shared by all the threads of the process."""
+    return CircuitBreaker(
+        failure_threshold=int(os.getenv("WORKER_DB_CIRCUIT_BREAKER_THRESHOLD", 5)),
+        reset_timeout=float(os.getenv("WORKER_DB_CIRCUIT_BREAKER_RESET_TIMEOUT", 30)),
+    )
@@ -0,0 +1,192 @@
+"""Dask schedulers used by the adaptors, configured per collection.
+
+``install`` sets the scheduler of dask collections to a dispatcher, once per
+process. Each job selects its scheduler with ``job_scheduler``, which is
+stored in a context variable: concurrent jobs of the same process don't
+interfere, and computations started outside of a job (or in threads started
+by the adaptors) use the default single-threaded scheduler.
+
+Threads of the thread and process pools are taken from a process-wide
+budget, so that concurrent jobs don't oversubscribe the node. A job gets
+fewer workers when the budget is exhausted, at least one. Process pools
+need non-daemonic Dask workers (``distributed.worker.daemon: False``), the
+profiles of the jobs are rejected otherwise.
+"""
+
+import concurrent.futures
+import contextlib
+import contextvars
+import dataclasses
+import functools
+import os
+import threading
+from collections.abc import Callable, Iterator
+from typing import Any
+
+import dask.config
+import dask.local
+import dask.multiprocessing
+import structlog
+
+from . import utils
+
+LOGGER = structlog.get_logger(__name__)
+
+SCHEDULERS = ("single-threaded", "threads", "processes")
+ALIASES = {
+    "sync": "single-threaded",
+    "synchronous": "single-threaded",
+    "threading": "threads",
+    "multiprocessing": "processes",
+}
+
+_GET: contextvars.ContextVar[Callable[..., Any] | None] = contextvars.ContextVar(
+    "cads_worker_dask_get", default=None
+)
+
+
+@dataclasses.dataclass
+class SchedulerProfile:
+    scheduler: str = "single-threaded"
+    num_workers: int = 1
+
+    @classmethod
+    def from_string(cls, value: str) -> "SchedulerProfile":
+        """Parse ``scheduler[:num_workers]``, e.g. ``threads:8``."""
+        scheduler, _, num_workers = value.partition(":")
+        scheduler = ALIASES.get(scheduler, scheduler)
+        if scheduler not in SCHEDULERS:
+            raise NotImplementedError(f"{scheduler=}")
+        if scheduler == "single-threaded":
+            return cls()
+        return cls(scheduler, int(num_workers or os.cpu_count() or 1))
+
+
+class ThreadBudget:
+    """Process-wide budget of scheduler threads."""
+
+    def __init__(self, max_threads: int) -> None:
+        self.max_threads = max_threads
+        self.used = 0
+        self._lock = threading.Lock()
+
+    def acquire(self, n: int) -> int:
+        """Take up to ``n`` threads (at least one) and return how many."""
+        with self._lock:
+            n = max(min(n, self.max_threads - self.used), 1)
+            self.used += n
+        return n
+
+    def release(self, n: int) -> None:
+        with self._lock:
+            self.used -= n
+
+
+def dispatch(dsk: Any, keys: Any, **kwargs: Any) -> Any:
+    """Dask scheduler running the graph with the scheduler of the current job."""
+    get = _GET.get()
+    if get is None:
+        get = dask.local.get_sync
+    return get(dsk, keys, **kwargs)
+
+
+@functools.lru_cache
+def install() -> None:
+    dask.config.set(scheduler=dispatch)
+
+
+@contextlib.contextmanager
+def use_scheduler(
+    profile: SchedulerProfile, budget: ThreadBudget | None = None
+) -> Iterator[SchedulerProfile]:
+    """Run the dask computations of this context with ``profile``.
+
+    Yield the profile actually used, with the number of workers granted by
+    the budget.
+    """
+    if profile.scheduler == "single-threaded":
+        token = _GET.set(dask.local.get_sync)
+        try:
+            yield profile
+        finally:
+            _GET.reset(token)
+        return
+
+    num_workers = profile.num_workers
+    if budget is not None:
+        num_workers = budget.acquire(num_workers)
+    try:
+        with contextlib.ExitStack() as stack:
+            executor: concurrent.futures.Executor
+            if profile.scheduler == "threads":
+                executor = stack.enter_context(
+                    concurrent.futures.ThreadPoolExecutor(
+                        num_workers, thread_name_prefix="cads-worker-dask"
+                    )
+                )
+                get = functools.partial(
+                    dask.local.get_async, executor.submit, num_workers
+                )
+            else:
+                executor = stack.enter_context(
+                    concurrent.futures.ProcessPoolExecutor(num_workers)
+                )
+                get = functools.partial(
+                    dask.multiprocessing.get, pool=executor, num_workers=num_workers
+                )
+            token = _GET.set(get)
+            try:
+                yield SchedulerProfile(profile.scheduler, num_workers)
+            finally:
+                _GET.reset(token)
+    finally:
+        if budget is not None:
+            budget.release(num_workers)
+
+
+def parse_worker_profile(value: str) -> SchedulerProfile:
+    """Parse a profile of the jobs, checking that Dask workers can run it."""
+    profile = SchedulerProfile.from_string(value)
+    if profile.scheduler == "processes" and dask.config.get(
+        "distributed.worker.daemon", True
+    ):
+        raise ValueError(
+            f"Scheduler profile {value!r} needs non-daemonic Dask workers,"
+            " set distributed.worker.daemon to False"
+            " (DASK_DISTRIBUTED__WORKER__DAEMON=False)."
+        )
+    return profile
+
+
+@functools.lru_cache
+def get_default_profile() -> SchedulerProfile:
+    return parse_worker_profile(os.getenv("WORKER_SCHEDULER_TYPE", "single-threaded"))
+
+
+@functools.lru_cache
+def get_profiles() -> dict[str, SchedulerProfile]:
+    return utils.parse_mapping(
+        os.getenv("WORKER_SCHEDULER_PROFILES", ""), parse_worker_profile
+    )
+
+
+def check_profiles() -> None:
+    """Parse the profiles of the jobs, so that invalid settings fail at startup."""
+    get_default_profile()
+    get_profiles()
+
+
+@functools.lru_cache
+def get_thread_budget() -> ThreadBudget:
+    return ThreadBudget(
+        int(os.getenv("WORKER_SCHEDULER_MAX_THREADS", 0)) or os.cpu_count() or 1
+    )
+
+
+def job_scheduler(
+    collection_id: str | None,
+) -> contextlib.AbstractContextManager[SchedulerProfile]:
+    """Use the scheduler profile of the collection for the current job."""
+    install()
+    profile = get_profiles().get(collection_id or "", get_default_profile())
+    return use_scheduler(profile, get_thread_budget())
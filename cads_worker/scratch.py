@@ -0,0 +1,208 @@
+"""Scratch space of the jobs.
+
+Job working directories are created on the scratch devices (e.g., local NVMe
+or tmpfs mount points). Each job reserves an estimated size before it starts:
+the device with the most available space is chosen, and jobs wait until
+another job releases its reservation if none of the devices fit.
+
+Reservations are opt-in: unless scratch devices or sizes are configured,
+jobs reserve nothing and the usage is only tracked.
+"""
+
+import contextlib
+import dataclasses
+import functools
+import os
+import shutil
+import tempfile
+import threading
+import time
+from collections.abc import Iterator
+
+import dask.utils
+import structlog
+
+from . import utils
+
+LOGGER = structlog.get_logger(__name__)
+
+
+class ScratchSpaceError(RuntimeError):
+    pass
+
+
+@dataclasses.dataclass
+class Reservation:
+    device: str
+    size: int
+    path: str = ""
+    usage: int = 0
+    high_water: int = 0
+    wait_time: float = 0
+    exceeded: bool = False
+
+
+class ScratchManager:
+    """Reserve scratch space on the devices and track the usage of the jobs.
+
+    A reservation that isn't used yet is subtracted from the free space of
+    its device. Usage is sampled every ``monitor_interval`` seconds (0 only
+    samples when the job is done) and the high-water mark of each job is
+    tracked. With ``learn_estimates``, the high-water mark of the last job of
+    a collection is used as estimate of the following jobs, capped to
+    ``max_estimate`` (0 is unlimited).
+    """
+
+    def __init__(
+        self,
+        devices: list[str],
+        default_size: int = 0,
+        sizes: dict[str, int] | None = None,
+        min_free: int = 0,
+        max_wait: float = 30,
+        poll_interval: float = 5,
+        monitor_interval: float = 10,
+        learn_estimates: bool = True,
+        max_estimate: int = 0,
+    ) -> None:
+        if not devices:
+            raise ValueError("At least one scratch device is required.")
+        self.devices = devices
+        self.default_size = default_size
+        self.sizes = sizes or {}
+        self.min_free = min_free
+        self.max_wait = max_wait
+        self.poll_interval = poll_interval
+        self.monitor_interval = monitor_interval
+        self.learn_estimates = learn_estimates
+        self.max_estimate = max_estimate
+        self.estimates: dict[str, int] = {}
+        self._reservations: list[Reservation] = []
+        self._condition = threading.Condition()
+        self._monitoring = False
+
+    def estimate(self, collection_id: str | None) -> int:
+        if collection_id is None:
+            return self.default_size
+        if collection_id in self.sizes:
+            return self.sizes[collection_id]
+        if not self.learn_estimates or collection_id not in self.estimates:
+            return self.default_size
+        estimate = self.estimates[collection_id]
+        return min(estimate, self.max_estimate) if self.max_estimate else estimate
+
+    def available(self, device: str) -> int:
+        pending = sum(
+            max(reservation.size - reservation.usage, 0)
+            for reservation in self._reservations
+            if reservation.device == device
+        )
+        return shutil.disk_usage(device).free - pending - self.min_free
+
+    def reserve(self, size: int) -> Reservation:
+        tic = time.monotonic()
+        waiting = False
+        with self._condition:
+            while True:
+                available = {device: self.available(device) for device in self.devices}
+                device = max(available, key=available.__getitem__)
+                if available[device] >= size:
+                    reservation = Reservation(device, size)
+                    reservation.wait_time = time.monotonic() - tic
+                    self._reservations.append(reservation)
+                    break
+                remaining = self.max_wait - (time.monotonic() - tic)
+                if remaining <= 0:
+                    raise ScratchSpaceError(
+                        f"Not enough scratch space to reserve {size} bytes."
+                    )
+                if not waiting:
+                    LOGGER.warning(
+                        "Waiting for scratch space", size=size, available=available
+                    )
+                    waiting = True
+                self._condition.wait(min(remaining, self.poll_interval))
+        LOGGER.debug("Scratch space reserved", **dataclasses.asdict(reservation))
+        return reservation
+
+    def release(self, reservation: Reservation) -> None:
+        with self._condition:
+            self._reservations.remove(reservation)
+            self._condition.notify_all()
+
+    def update_usage(self, reservation: Reservation) -> None:
+        if not reservation.path:
+            return
+        reservation.usage = utils.get_disk_usage(reservation.path)
+        reservation.high_water = max(reservation.high_water, reservation.usage)
+        if reservation.usage > reservation.size and not reservation.exceeded:
+            reservation.exceeded = True
+            LOGGER.warning(
+                "Scratch usage exceeds the reservation",
+                **dataclasses.asdict(reservation),
+            )
+
+    @contextlib.contextmanager
+    def job_dir(
+        self, reservation: Reservation, collection_id: str | None = None
+    ) -> Iterator[Reservation]:
+        """Create a temporary directory and release the reservation when done."""
+        try:
+            with tempfile.TemporaryDirectory(dir=reservation.device) as tmpdir:
+                reservation.path = tmpdir
+                self._start_monitor()
+                try:
+                    yield reservation
+                finally:
+                    self.update_usage(reservation)
+        finally:
+            self.release(reservation)
+        if collection_id is not None:
+            self.estimates[collection_id] = reservation.high_water
+
+    def _start_monitor(self) -> None:
+        if self.monitor_interval <= 0:
+            return
+        with self._condition:
+            if self._monitoring:
+                return
+            self._monitoring = True
+        threading.Thread(
+            target=self._monitor, name="cads-worker-scratch-monitor", daemon=True
+        ).start()
+
+    def _monitor(self) -> None:
+        while True:
+            time.sleep(self.monitor_interval)
+            with self._condition:
+                reservations = list(self._reservations)
+            for reservation in reservations:
+                try:
+                    self.update_usage(reservation)
+                except Exception:
+                    LOGGER.exception("Scratch usage update failed")
+
+
+@functools.lru_cache
+def get_scratch_manager() -> ScratchManager:
+    devices = [
+        device.strip()
+        for device in os.getenv("WORKER_SCRATCH_DIRS", "").split(",")
+        if device.strip()
+    ]
+    default_size = dask.utils.parse_bytes(os.getenv("WORKER_SCRATCH_DEFAULT_SIZE", "0"))
+    sizes = utils.parse_mapping(
+        os.getenv("WORKER_SCRATCH_SIZES", ""), dask.utils.parse_bytes
+    )
+    return ScratchManager(
+        devices=devices or [tempfile.gettempdir()],
+        default_size=default_size,
+        sizes=sizes,
+        min_free=dask.utils.parse_bytes(os.getenv("WORKER_SCRATCH_MIN_FREE", "0")),
+        max_wait=float(os.getenv("WORKER_SCRATCH_MAX_WAIT", 30)),
+        monitor_interval=float(os.getenv("WORKER_SCRATCH_MONITOR_INTERVAL", 10)),
+        learn_estimates=bool(devices or default_size or sizes),
+        max_estimate=dask.utils.parse_bytes(
+            os.getenv("WORKER_SCRATCH_MAX_ESTIMATE", "0")
+        ),
+    )
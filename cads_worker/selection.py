@@ -0,0 +1,163 @@
+import collections
+import functools
+import os
+import random
+import threading
+import time
+from collections.abc import Mapping
+from typing import Protocol
+
+import sqlalchemy as sa
+import structlog
+
+from . import db, models, utils
+
+LOGGER = structlog.get_logger(__name__)
+
+
+class VolumeStats:
+    """Cheap, cached measurements of the load of the data volumes.
+
+    The cache usage of a volume is compared with its ``max_size``. With a
+    ``session_maker``, the usage is read from the size index and cached for
+    ``ttl`` seconds. Otherwise, the bytes written by this process are used,
+    which only approximate the usage since the process started.
+    Bytes and time of the last write are counted per process.
+    """
+
+    def __init__(
+        self,
+        ttl: float = 30,
+        session_maker: sa.orm.sessionmaker[sa.orm.Session] | None = None,
+    ) -> None:
+        self.ttl = ttl
+        self.session_maker = session_maker
+        self.bytes_written: collections.Counter[str] = collections.Counter()
+        self.last_written: dict[str, float] = {}
+        self._lock = threading.Lock()
+        self._used_bytes: dict[str, tuple[float, int | None]] = {}
+
+    def record_write(self, volume: str, size: int) -> None:
+        with self._lock:
+            self.bytes_written[volume] += size
+            self.last_written[volume] = time.monotonic()
+
+    def measure_used_bytes(self, volume: str) -> int | None:
+        if self.session_maker is None:
+            return self.bytes_written[volume]
+        from . import size_index
+
+        try:
+            with self.session_maker() as session:
+                return size_index.get_disk_usage(session, volume)
+        except Exception:
+            LOGGER.exception("Failed to measure volume usage", volume=volume)
+            return None
+
+    def used_bytes(self, volume: str) -> int | None:
+        if self.session_maker is None:
+            return self.measure_used_bytes(volume)
+        now = time.monotonic()
+        measured_at, used_bytes = self._used_bytes.get(volume, (-self.ttl, None))
+        if now - measured_at >= self.ttl:
+            used_bytes = self.measure_used_bytes(volume)
+            self._used_bytes[volume] = (now, used_bytes)
+        return used_bytes
+
+    def free_fraction(self, volume: str, config: models.DataVolumeConfig) -> float:
+        """Free fraction of ``max_size``. Volumes that can't be measured get 1."""
+        used_bytes = self.used_bytes(volume)
+        if used_bytes is None or not config.max_size:
+            return 1
+        return max(0, 1 - used_bytes / config.max_size)
+
+
+class SelectionStrategy(Protocol):
+    def __call__(
+        self,
+        volumes: Mapping[str, models.DataVolumeConfig],
+        cum_weights: list[float],
+        stats: VolumeStats,
+    ) -> str: ...
+
+
+def select_random(
+    volumes: Mapping[str, models.DataVolumeConfig],
+    cum_weights: list[float],
+    stats: VolumeStats,
+) -> str:
+    """Choose a volume at random, weighted by the static weights."""
+    (volume,) = random.choices(list(volumes), cum_weights=cum_weights, k=1)
+    return volume
+
+
+def select_free_space(
+    volumes: Mapping[str, models.DataVolumeConfig],
+    cum_weights: list[float],
+    stats: VolumeStats,
+) -> str:
+    """Choose a volume at random, weighted by weight and free fraction."""
+    weights = [
+        config.weight * stats.free_fraction(volume, config)
+        for volume, config in volumes.items()
+    ]
+    if not any(weights):
+        return select_random(volumes, cum_weights, stats)
+    (volume,) = random.choices(list(volumes), weights=weights, k=1)
+    return volume
+
+
+def select_least_recently_written(
+    volumes: Mapping[str, models.DataVolumeConfig],
+    cum_weights: list[float],
+    stats: VolumeStats,
+) -> str:
+    """Choose the volume with the oldest write among those with a weight."""
+    candidates = [volume for volume, config in volumes.items() if config.weight]
+    if not candidates:
+        return select_random(volumes, cum_weights, stats)
+    random.shuffle(candidates)
+    return min(candidates, key=lambda volume: stats.last_written.get(volume, -1))
+
+
+def select_power_of_two(
+    volumes: Mapping[str, models.DataVolumeConfig],
+    cum_weights: list[float],
+    stats: VolumeStats,
+) -> str:
+    """Draw two volumes by weight and choose the least loaded one."""
+    first, second = random.choices(list(volumes), cum_weights=cum_weights, k=2)
+
+    def load(volume: str) -> tuple[float, int]:
+        free_fraction = stats.free_fraction(volume, volumes[volume])
+        return (-free_fraction, stats.bytes_written[volume])
+
+    return min(first, second, key=load)
+
+
+SELECTION_STRATEGIES: dict[str, SelectionStrategy] = {
+    "random": select_random,
+    "free-space": select_free_space,
+    "least-recently-written": select_least_recently_written,
+    "power-of-two": select_power_of_two,
+}
+
+
+@functools.lru_cache
+def get_volume_stats() -> VolumeStats:
+    session_maker = None
+    if utils.strtobool(os.getenv("WORKER_SIZE_INDEX", "false")):
+        session_maker = db.get_session_maker()
+    return VolumeStats(
+        ttl=float(os.getenv("DATA_VOLUMES_STATS_TTL", 30)),
+        session_maker=session_maker,
+    )
+
+
+def select_volume(registry: models.VolumeRegistry, strategy: str | None = None) -> str:
+    if strategy is None:
+        strategy = os.getenv("DATA_VOLUMES_SELECTION", "random")
+    if strategy not in SELECTION_STRATEGIES:
+        raise NotImplementedError(f"{strategy=}")
+    volumes, cum_weights = registry.get_table()
+    return SELECTION_STRATEGIES[strategy](volumes, cum_weights, get_volume_stats())
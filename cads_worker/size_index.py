@@ -0,0 +1,163 @@
+"""Index of the size of the cached results, keyed by data volume.
+
+The index lives in the cache database, next to the cacholote cache entries.
+Results written before the index was enabled are not indexed, the full
+cache cleaner must be used to evict them. The table is created by the
+``init-size-index`` command, the workers and the cleaner don't run DDL.
+"""
+
+import functools
+from typing import Callable, Literal
+
+import fsspec
+import sqlalchemy as sa
+import structlog
+from cacholote.database import CacheEntry
+
+from . import cache_files
+
+LOGGER = structlog.get_logger(__name__)
+
+METADATA = sa.MetaData()
+CACHE_SIZES = sa.Table(
+    "cads_worker_cache_sizes",
+    METADATA,
+    sa.Column("cache_id", sa.Integer, primary_key=True),
+    sa.Column("volume", sa.String, index=True, nullable=False),
+    sa.Column("size", sa.BigInteger, nullable=False),
+)
+
+
+def init_table(session_maker: Callable[[], sa.orm.Session]) -> None:
+    """Create the index table, if it doesn't exist."""
+    with session_maker() as session:
+        METADATA.create_all(session.get_bind(), checkfirst=True)
+        session.commit()
+
+
+@functools.lru_cache
+def _check_table(engine: sa.engine.Engine) -> None:
+    if not sa.inspect(engine).has_table(CACHE_SIZES.name):
+        raise RuntimeError(
+            f"Table {CACHE_SIZES.name!r} not found, run `init-size-index` first."
+        )
+
+
+def check_table(session: sa.orm.Session) -> None:
+    bind = session.get_bind()
+    _check_table(bind if isinstance(bind, sa.engine.Engine) else bind.engine)
+
+
+def record(
+    session_maker: Callable[[], sa.orm.Session], cache_id: int, volume: str, size: int
+) -> None:
+    """Index a result. Failures are logged, they must not fail the job."""
+    try:
+        with session_maker() as session:
+            check_table(session)
+            session.execute(sa.delete(CACHE_SIZES).filter_by(cache_id=cache_id))
+            session.execute(
+                sa.insert(CACHE_SIZES).values(
+                    cache_id=cache_id, volume=volume, size=size
+                )
+            )
+            session.commit()
+    except Exception:
+        LOGGER.exception("Failed to index cache size", cache_id=cache_id)
+
+
+def get_disk_usage(session: sa.orm.Session, volume: str) -> int:
+    check_table(session)
+    disk_usage = session.scalar(
+        sa.select(sa.func.coalesce(sa.func.sum(CACHE_SIZES.c.size), 0))
+        .join(CacheEntry, CacheEntry.id == CACHE_SIZES.c.cache_id)
+        .filter(CACHE_SIZES.c.volume == volume)
+    )
+    return int(disk_usage or 0)
+
+
+def reconcile(
+    session: sa.orm.Session,
+    fs: fsspec.AbstractFileSystem,
+    volume: str,
+    sample_size: int,
+) -> int:
+    """Check a random sample of indexed results against the filesystem.
+
+    Rows of deleted cache entries or missing files are dropped, sizes are
+    updated. Return the number of rows fixed.
+    """
+    rows = session.execute(
+        sa.select(CACHE_SIZES.c.cache_id, CACHE_SIZES.c.size, CacheEntry)
+        .outerjoin(CacheEntry, CacheEntry.id == CACHE_SIZES.c.cache_id)
+        .filter(CACHE_SIZES.c.volume == volume)
+        .order_by(sa.func.random())
+        .limit(sample_size)
+    ).all()
+    to_delete = []
+    to_update = {}
+    for cache_id, size, cache_entry in rows:
+        if cache_entry is None:
+            to_delete.append(cache_id)
+            continue
+        files = cache_files.get_files(cache_entry, key="file:size")
+        sizes = [fs.du(file) for file in files if fs.exists(file)]
+        if not sizes:
+            to_delete.append(cache_id)
+        elif sum(sizes) != size:
+            to_update[cache_id] = sum(sizes)
+
+    if to_delete:
+        session.execute(
+            sa.delete(CACHE_SIZES).filter(CACHE_SIZES.c.cache_id.in_(to_delete))
+        )
+    for cache_id, size in to_update.items():
+        session.execute(
+            sa.update(CACHE_SIZES).filter_by(cache_id=cache_id).values(size=size)
+        )
+    session.commit()
+    return len(to_delete) + len(to_update)
+
+
+def evict(
+    session: sa.orm.Session,
+    volume: str,
+    method: Literal["LRU", "LFU"],
+    limit: int,
+    bytes_to_free: int,
+) -> tuple[int, int]:
+    """Delete up to ``limit`` cache entries until ``bytes_to_free`` are freed.
+
+    Entries are sorted as in the cacholote cleaner (LRU or LFU).
+    Return the number of entries deleted and the number of bytes freed.
+    """
+    if method == "LRU":
+        sorters = [CacheEntry.updated_at, CacheEntry.counter]
+    elif method == "LFU":
+        sorters = [CacheEntry.counter, CacheEntry.updated_at]
+    else:
+        raise NotImplementedError(f"{method=}")
+    sorters.append(CacheEntry.expiration)
+    rows = session.execute(
+        sa.select(CacheEntry, CACHE_SIZES.c.size)
+        .join(CACHE_SIZES, CACHE_SIZES.c.cache_id == CacheEntry.id)
+        .filter(CACHE_SIZES.c.volume == volume)
+        .order_by(*sorters)
+        .limit(limit)
+    ).all()
+    cache_entries = []
+    bytes_freed = 0
+    for cache_entry, size in rows:
+        cache_entries.append(cache_entry)
+        bytes_freed += size
+        if bytes_freed >= bytes_to_free:
+            break
+    session.execute(
+        sa.delete(CACHE_SIZES).filter(
+            CACHE_SIZES.c.cache_id.in_(
+                [cache_entry.id for cache_entry in cache_entries]
+            )
+        )
+    )
+    cache_files.delete_cache_entries(session, cache_entries)
+    return len(cache_entries), bytes_freed
@@ -1,14 +1,39 @@
 import contextlib
+import json
 import os
 import pathlib
+import resource
+import socket
 import tempfile
-from collections.abc import Iterator
+import time
+from collections.abc import Callable, Iterator
+from typing import Any, TypeVar
+
+T = TypeVar("T")
+
+
+def strtobool(value: str) -> bool:
+    if value.lower() in ("y", "yes", "t", "true", "on", "1"):
+        return True
+    if value.lower() in ("n", "no", "f", "false", "off", "0"):
+        return False
+    raise ValueError(f"invalid truth value {value!r}")
+
+
+def parse_mapping(value: str, parse: Callable[[str], T]) -> dict[str, T]:
+    """Parse ``"key=value,..."`` strings, e.g. per-collection settings."""
+    mapping = {}
+    for item in value.split(","):
+        if item.strip():
+            key, _, item_value = item.partition("=")
+            mapping[key.strip()] = parse(item_value.strip())
+    return mapping
 
 
 @contextlib.contextmanager
-def enter_tmp_working_dir() -> Iterator[str]:
+def enter_tmp_working_dir(dir: str | None = None) -> Iterator[str]:
     old_cwd = os.getcwd()
-    with tempfile.TemporaryDirectory() as tmpdir:
+    with tempfile.TemporaryDirectory(dir=dir) as tmpdir:
         os.chdir(tmpdir)
         try:
             yield os.getcwd()
@@ -16,12 +41,96 @@ def enter_tmp_working_dir() -> Iterator[str]:
             os.chdir(old_cwd)
 
 
+def get_lock_info() -> dict[str, Any]:
+    """Return the owner of the locks created by this process."""
+    return {"host": socket.gethostname(), "pid": os.getpid(), "created_at": time.time()}
+
+
 @contextlib.contextmanager
 def make_cache_tmp_path(base_dir: str) -> Iterator[pathlib.Path]:
     with tempfile.TemporaryDirectory(dir=base_dir) as tmpdir:
         cache_tmp_path = pathlib.Path(tmpdir)
-        cache_tmp_path.with_suffix(".lock").touch()
+        # the owner is used to reap the tmp paths of dead workers
+        cache_tmp_path.with_suffix(".lock").write_text(json.dumps(get_lock_info()))
         try:
             yield cache_tmp_path
         finally:
             cache_tmp_path.with_suffix(".lock").unlink(missing_ok=True)
+
+
+def get_disk_usage(path: str) -> int:
+    """Return the bytes allocated on disk by the files under ``path``."""
+    size = 0
+    for root, _, filenames in os.walk(path):
+        for filename in filenames:
+            try:
+                size += os.lstat(os.path.join(root, filename)).st_blocks * 512
+            except FileNotFoundError:
+                pass
+    return size
+
+
+class MessageBuffer:
+    """Line buffer of the messages written to a file-like logger.
+
+    Carriage-return progress updates (e.g., tqdm bars) overwrite the previous
+    progress line, so only their last state is kept. Messages are popped in
+    chunks of at most ``max_message_size`` characters.
+    """
+
+    def __init__(self, max_message_size: int = 65_536) -> None:
+        self.max_message_size = max_message_size
+        self.size = 0
+        self.only_progress = True
+        self._lines: list[str] = []
+        self._progress = False
+
+    def __len__(self) -> int:
+        return self.size
+
+    def write(self, text: str) -> None:
+        for line in text.removesuffix("\n").split("\n"):
+            if "\r" not in line:
+                self._append(line)
+                self._progress = self.only_progress = False
+                continue
+            is_overwrite = line.startswith("\r") and self._progress
+            line = next(
+                (segment for segment in reversed(line.split("\r")) if segment), ""
+            )
+            if is_overwrite:
+                self.size -= len(self._lines.pop()) + 1
+            self._append(line)
+            self._progress = True
+
+    def _append(self, line: str) -> None:
+        self._lines.append(line)
+        self.size += len(line) + 1
+
+    def pop_messages(self) -> list[str]:
+        messages: list[str] = []
+        chunk: list[str] = []
+        chunk_size = 0
+        for line in self._lines:
+            line += "\n"
+            if chunk and chunk_size + len(line) > self.max_message_size:
+                messages.append("".join(chunk))
+                chunk, chunk_size = [], 0
+            while len(line) > self.max_message_size:
+                messages.append(line[: self.max_message_size])
+                line = line[self.max_message_size :]
+            chunk.append(line)
+            chunk_size += len(line)
+        if chunk:
+            messages.append("".join(chunk))
+        self._lines = []
+        self.size = 0
+        self.only_progress = True
+        self._progress = False
+        return messages
+
+
+def get_rss() -> int:
+    """Return the resident set size of the process (Linux only)."""
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[1]) * resource.getpagesize()
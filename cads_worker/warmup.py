@@ -0,0 +1,129 @@
+"""Warm up the caches of a Dask worker before it accepts jobs.
+
+Start the workers with ``dask worker --preload cads_worker.warmup`` so that
+the worker registers with the scheduler only once the warm-up is done.
+Alternatively, pass ``WarmUpPlugin`` to ``distributed.Worker(plugins=...)``.
+Invalid scheduler profiles make the worker fail to start, not the jobs.
+"""
+
+import asyncio
+import os
+import time
+from collections.abc import Callable
+from typing import Any
+
+import cacholote
+import distributed
+import structlog
+
+from . import adaptors, db, metrics, models, publish, schedulers, utils, worker
+
+LOGGER = structlog.get_logger(__name__)
+
+
+def get_entry_points() -> list[str]:
+    entry_points = os.getenv("WORKER_WARMUP_ENTRY_POINTS", "")
+    return [
+        entry_point.strip()
+        for entry_point in entry_points.split(",")
+        if entry_point.strip()
+    ]
+
+
+def warm_up_database() -> int:
+    connections = os.getenv("WORKER_WARMUP_DB_CONNECTIONS")
+    return db.warm_up_pool(
+        worker.create_session_maker(),
+        connections=None if connections is None else int(connections),
+    )
+
+
+def warm_up_volumes() -> list[str]:
+    """Load the data volumes and instantiate their cache filesystems."""
+    volumes = list(models.get_volume_registry().available_volumes)
+    for volume in volumes:
+        with cacholote.config.set(
+            cache_files_urlpath=volume, **publish.get_publish_settings(volume)
+        ):
+            cacholote.utils.get_cache_files_fs_dirname()
+    return volumes
+
+
+def warm_up_adaptors(entry_points: list[str] | None = None) -> list[str]:
+    """Import the adaptors of the most common entry points.
+
+    Entry points are resolved without setup code: modules are imported,
+    but the classes of jobs with setup code are resolved again.
+    """
+    if entry_points is None:
+        entry_points = get_entry_points()
+    cache = adaptors.get_adaptor_class_cache()
+    for entry_point in entry_points:
+        cache.get_adaptor_class(entry_point)
+    return entry_points
+
+
+WARM_UP_STEPS: dict[str, Callable[[], Any]] = {
+    "logger": worker.configure_logger,
+    "database": warm_up_database,
+    "volumes": warm_up_volumes,
+    "adaptors": warm_up_adaptors,
+}
+
+
+def warm_up(steps: list[str] | None = None) -> dict[str, float]:
+    """Run the warm-up steps and return their durations.
+
+    Failing steps are logged and skipped: jobs pay for them as usual.
+    """
+    if steps is None:
+        steps = list(WARM_UP_STEPS)
+    durations = {}
+    tic = time.perf_counter()
+    for step in steps:
+        if step not in WARM_UP_STEPS:
+            raise NotImplementedError(f"{step=}")
+        step_tic = time.perf_counter()
+        try:
+            result = WARM_UP_STEPS[step]()
+        except Exception:
+            LOGGER.exception("Warm-up step failed", step=step)
+            continue
+        durations[step] = time.perf_counter() - step_tic
+        metrics.WARMUP_DURATION.labels(step).observe(durations[step])
+        LOGGER.debug("Warm-up step done", step=step, result=result)
+    durations["total"] = time.perf_counter() - tic
+    metrics.WARMUP_DURATION.labels("total").observe(durations["total"])
+    LOGGER.info(
+        "Worker warmed up",
+        **{name: round(duration, 3) for name, duration in durations.items()},
+    )
+    return durations
+
+
+class WarmUpPlugin(distributed.WorkerPlugin):
+    """Dask worker plugin warming up the worker caches.
+
+    The warm-up runs in a thread, so the event loop of the worker isn't
+    blocked. ``durations`` holds the duration of each step.
+    """
+
+    name = "cads-worker-warmup"
+
+    def __init__(self, steps: list[str] | None = None) -> None:
+        self.steps = steps
+        self.durations: dict[str, float] = {}
+
+    async def setup(self, worker: distributed.Worker) -> None:
+        schedulers.check_profiles()
+        # the database pool is sized on the worker threads, but get_worker
+        # doesn't work outside of tasks
+        os.environ.setdefault("WORKER_DB_POOL_SIZE", str(worker.state.nthreads))
+        self.durations = await asyncio.to_thread(warm_up, self.steps)
+
+
+async def dask_setup(worker: distributed.Worker) -> None:
+    """Warm up the worker before it registers with the scheduler."""
+    schedulers.check_profiles()
+    if utils.strtobool(os.getenv("WORKER_WARMUP", "true")):
+        await worker.plugin_add(WarmUpPlugin(), catch_errors=False)
@@ -1,53 +1,111 @@
 from __future__ import annotations
 
+import dataclasses
 import datetime
 import functools
 import json
 import logging
 import os
-import socket
 import time
-from typing import Any, Callable, TypeVar, cast
+from typing import Any, Callable, TypeVar, cast, overload
 
-import cacholote
-import cads_adaptors
 import cads_broker.config
-import cads_broker.database
-import dask
-import dask.config
 import distributed.worker
-import fsspec.implementations.local
 import sqlalchemy as sa
 import structlog
 from distributed import get_worker
 
-from . import config, models, utils
-
-config.configure_logger(os.getenv("WORKER_LOG_LEVEL", "NOT_SET").upper())
+from . import (
+    adaptors,
+    admission,
+    config,
+    db,
+    events,
+    lifecycle,
+    metrics,
+    models,
+    profiling,
+    retry,
+    schedulers,
+    scratch,
+    selection,
+    utils,
+)
 
 LOGGER = structlog.get_logger(__name__)
 
 LEVELS_MAPPING = logging.getLevelNamesMapping()
 
-DB_CONNECTION_RETRIES = int(os.getenv("WORKER_DB_CONNECTION_RETRIES", 3))
 F = TypeVar("F", bound=Callable[..., Any])
 
-BROKER_CONFIG = cads_broker.config.BrokerConfig()
+
+@functools.lru_cache
+def configure_logger() -> None:
+    config.configure_logger(os.getenv("WORKER_LOG_LEVEL", "NOT_SET").upper())
 
 
 @functools.lru_cache
+def get_broker_config() -> cads_broker.config.BrokerConfig:
+    return cads_broker.config.BrokerConfig()
+
+
+def __getattr__(name: str) -> Any:
+    # BROKER_CONFIG is created on first access
+    if name == "BROKER_CONFIG":
+        return get_broker_config()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
 def create_session_maker() -> sa.orm.sessionmaker[Any]:
-    smaker: sa.orm.sessionmaker[Any] = cads_broker.database.ensure_session_obj(None)
-    return smaker
+    return db.get_session_maker()
+
+
+def write_events(batch: list[dict[str, Any]]) -> None:
+    import cads_broker.database
+
+    with create_session_maker()() as session:
+        session.execute(sa.insert(cads_broker.database.Events), batch)
+        session.commit()
+
+
+@functools.lru_cache
+def get_event_buffer() -> events.EventBuffer | None:
+    if not utils.strtobool(os.getenv("WORKER_EVENT_BUFFER", "false")):
+        return None
+    return events.EventBuffer(
+        write_events,
+        max_size=int(os.getenv("WORKER_EVENT_BUFFER_MAX_SIZE", 10_000)),
+        batch_size=int(os.getenv("WORKER_EVENT_BUFFER_BATCH_SIZE", 500)),
+        flush_interval=float(os.getenv("WORKER_EVENT_BUFFER_FLUSH_INTERVAL", 1)),
+        overflow=cast(
+            events.OverflowPolicy,
+            os.getenv("WORKER_EVENT_BUFFER_OVERFLOW", "block"),
+        ),
+    )
 
 
-def ensure_session(func: F) -> F:
+def _ensure_session(func: F, critical: bool) -> F:
     @functools.wraps(func)
     def wrapper(
         self: Context, *args: Any, session: None | sa.orm.Session = None, **kwargs: Any
     ) -> Any:
-        retries = 1
-        while retries <= DB_CONNECTION_RETRIES:
+        logger = getattr(self, "logger", LOGGER)
+        breaker = retry.get_circuit_breaker()
+        if session is None and not breaker.allow():
+            if getattr(self, "event_buffer", None) is not None:
+                # events are queued, the session is not used
+                return func(self, *args, session=session, **kwargs)
+            metrics.DB_CIRCUIT_OPEN.inc()
+            if critical:
+                raise retry.CircuitOpenError("Database circuit breaker is open.")
+            breaker.record_dropped()
+            logger.debug("Database circuit breaker is open. Event dropped.")
+            return None
+
+        policy = retry.get_retry_policy()
+        delays = policy.delays()
+        attempt = 1
+        while True:
             try:
                 close_session = False
                 # create a new session if not provided
@@ -59,37 +117,86 @@ def ensure_session(func: F) -> F:
                 # close the session if we created it
                 if close_session:
                     session.close()
+                breaker.record_success()
                 return result
             except sa.exc.OperationalError as e:
-                exception = e
-                retries += 1
-                self.logger.warning(
-                    f"Database operation failed. Retrying {retries}/{DB_CONNECTION_RETRIES}...",
-                    error=str(e),
-                )
                 # close the session anyway because it could be broken
                 if session is not None:
                     session.close()
                 session = None
-                time.sleep(float(os.getenv("WORKER_DB_CONNECTION_RETRY_SLEEP", 2)))
-
-        self.logger.error("Max retries reached. Aborting operation.")
-        raise exception
+                delay = next(delays, None)
+                if delay is None:
+                    breaker.record_failure()
+                    logger.error("Max retries reached. Aborting operation.")
+                    raise
+                attempt += 1
+                metrics.DB_RETRIES.inc()
+                logger.warning(
+                    f"Database operation failed. Retrying {attempt}/{policy.attempts}...",
+                    error=str(e),
+                    delay=delay,
+                )
+                time.sleep(delay)
+            except Exception:
+                # the database answered, or wasn't reached: not a database outage
+                if close_session and session is not None:
+                    session.close()
+                breaker.record_success()
+                raise
 
     return cast(F, wrapper)
 
 
-class Context(cacholote.config.Context):
+@overload
+def ensure_session(func: F, *, critical: bool = ...) -> F: ...
+
+
+@overload
+def ensure_session(func: None = ..., *, critical: bool = ...) -> Callable[[F], F]: ...
+
+
+def ensure_session(
+    func: F | None = None, *, critical: bool = True
+) -> F | Callable[[F], F]:
+    """Provide a session to ``func``, retrying database operational errors.
+
+    Retries follow the process retry policy. While the process circuit
+    breaker is open, non-critical operations are queued if the context has
+    an event buffer, dropped otherwise; critical operations fail fast.
+    """
+    if func is None:
+        return functools.partial(_ensure_session, critical=critical)
+    return _ensure_session(func, critical)
+
+
+class Context:
+    """Job context passed to cacholote and to the adaptors.
+
+    It's registered as a ``cacholote.config.Context`` by ``submit_workflow``,
+    so that cacholote is not imported with this module.
+    """
+
     def __init__(
         self,
         job_id: str | None = None,
         logger: Any | None = None,
         write_type: str = "stdout",
+        event_buffer: events.EventBuffer | None = None,
     ):
         self.job_id = job_id
         self.logger = logger if logger is not None else LOGGER
         self.write_type = write_type
-        self.messages_buffer = ""
+        self.event_buffer = event_buffer
+        self.messages_buffer = utils.MessageBuffer(
+            int(os.getenv("WORKER_LOG_MAX_MESSAGE_SIZE", 65_536))
+        )
+        self.max_buffer_size = int(os.getenv("WORKER_LOG_MAX_BUFFER_SIZE", 1_048_576))
+        self.progress_flush_interval = float(
+            os.getenv("WORKER_LOG_PROGRESS_FLUSH_INTERVAL", 5)
+        )
+        self._last_flush = 0.0
+        self.upload_time = 0.0
+        self._upload_tic: float | None = None
         # 60 is above all the levels. it means no log
         # get the log level at instance creation time so we don't need to restart the workers to change it
         self.worker_log_level = LEVELS_MAPPING.get(
@@ -98,22 +205,59 @@ class Context(cacholote.config.Context):
 
     def write(self, message: str) -> None:
         """Use the logger as a file-like object. Needed by tqdm progress bar."""
-        self.messages_buffer += message + "\n"
-
-    def flush(self) -> None:
-        """Write to the logger the content of the buffer."""
-        if self.messages_buffer:
+        self.messages_buffer.write(message + "\n")
+        if len(self.messages_buffer) >= self.max_buffer_size:
+            self.flush(force=True)
+
+    def flush(self, force: bool = False) -> None:
+        """Write to the logger the content of the buffer.
+
+        Unless ``force``, buffers containing only progress updates are
+        written at most every ``progress_flush_interval`` seconds.
+        """
+        if not self.messages_buffer:
+            return
+        if (
+            not force
+            and self.messages_buffer.only_progress
+            and time.monotonic() - self._last_flush < self.progress_flush_interval
+        ):
+            return
+        for message in self.messages_buffer.pop_messages():
             if self.write_type == "stdout":
-                self.add_stdout(self.messages_buffer)
+                self.add_stdout(message)
             elif self.write_type == "stderr":
-                self.add_stderr(self.messages_buffer)
-            self.messages_buffer = ""
+                self.add_stderr(message)
+        self._last_flush = time.monotonic()
 
-    @ensure_session
+    def add_event(
+        self, event_type: str, request_uid: str | None, message: str, session: Any
+    ) -> None:
+        """Write an event, or queue it if the context has an event buffer."""
+        metrics.labels(metrics.EVENTS, event_type=event_type).inc()
+        if self.event_buffer is not None:
+            self.event_buffer.put(event_type, request_uid, message)
+        else:
+            import cads_broker.database
+
+            cads_broker.database.add_event(
+                event_type=event_type,
+                request_uid=request_uid,
+                message=message,
+                session=session,
+            )
+
+    def flush_events(self) -> None:
+        """Flush the messages buffer and wait until queued events are written."""
+        self.flush(force=True)
+        if self.event_buffer is not None:
+            self.event_buffer.flush()
+
+    @ensure_session(critical=False)
     def add_user_visible_log(
         self, message: str, session: Any = None, job_id: str | None = None
     ) -> None:
-        cads_broker.database.add_event(
+        self.add_event(
             event_type="user_visible_log",
             request_uid=self.job_id if job_id is None else job_id,
             message=message,
@@ -124,35 +268,63 @@ class Context(cacholote.config.Context):
     def add_user_visible_error(
         self, message: str, session: Any = None, job_id: str | None = None
     ) -> None:
-        cads_broker.database.add_event(
+        self.add_event(
             event_type="user_visible_error",
             request_uid=self.job_id if job_id is None else job_id,
             message=message,
             session=session,
         )
 
-    @ensure_session
-    def add_stdout(
+    def _is_logger_enabled_for(self, log_level: int) -> bool:
+        is_enabled_for = getattr(self.logger, "isEnabledFor", None)
+        return is_enabled_for is None or bool(is_enabled_for(log_level))
+
+    def _log(
         self,
         message: str,
-        log_type: str = "INFO",
+        log_type: str,
         session: Any = None,
         job_id: str | None = None,
         **kwargs: Any,
     ) -> None:
+        """Log a message and write it as an event.
+
+        Levels are checked first, so suppressed messages are neither
+        rendered nor need a database session.
+        """
         if job_id is None:
             job_id = self.job_id
         log_level = LEVELS_MAPPING.get(log_type, 10)
-        self.logger.log(log_level, message, job_id=job_id, **kwargs)
+        if self._is_logger_enabled_for(log_level):
+            self.logger.log(log_level, message, job_id=job_id, **kwargs)
         if log_level >= self.worker_log_level:
-            cads_broker.database.add_event(
-                event_type=log_type,
-                request_uid=job_id,
-                message=message,
-                session=session,
-            )
+            self._add_log_event(log_type, job_id, message, session=session)
+
+    @ensure_session(critical=False)
+    def _add_log_event(
+        self,
+        event_type: str,
+        request_uid: str | None,
+        message: str,
+        session: Any = None,
+    ) -> None:
+        self.add_event(
+            event_type=event_type,
+            request_uid=request_uid,
+            message=message,
+            session=session,
+        )
+
+    def add_stdout(
+        self,
+        message: str,
+        log_type: str = "INFO",
+        session: Any = None,
+        job_id: str | None = None,
+        **kwargs: Any,
+    ) -> None:
+        self._log(message, log_type, session=session, job_id=job_id, **kwargs)
 
-    @ensure_session
     def add_stderr(
         self,
         message: str,
@@ -161,23 +333,20 @@ class Context(cacholote.config.Context):
         job_id: str | None = None,
         **kwargs: Any,
     ) -> None:
-        if job_id is None:
-            job_id = self.job_id
-        log_level = LEVELS_MAPPING.get(log_type, 10)
-        self.logger.log(log_level, message, job_id=job_id, **kwargs)
-        if log_level >= self.worker_log_level:
-            cads_broker.database.add_event(
-                event_type=log_type,
-                request_uid=job_id,
-                message=message,
-                session=session,
-            )
+        self._log(message, log_type, session=session, job_id=job_id, **kwargs)
 
     @property
     def session_maker(self) -> sa.orm.sessionmaker[Any]:
         return create_session_maker()
 
     def upload_log(self, *args: Any, **kwargs: Any) -> None:
+        # cacholote logs "start upload" and "end upload" around each upload
+        message = args[0] if args else kwargs.get("message", "")
+        if message.startswith("start upload"):
+            self._upload_tic = time.perf_counter()
+        elif message.startswith("end upload") and self._upload_tic is not None:
+            self.upload_time += time.perf_counter() - self._upload_tic
+            self._upload_tic = None
         kwargs["log_type"] = "upload"
         self.add_stdout(*args, **kwargs)
 
@@ -210,6 +379,52 @@ class Context(cacholote.config.Context):
         self.add_stderr(*args, **kwargs)
 
 
+def get_result_size(result: Any) -> int:
+    try:
+        return int(result.result["args"][0]["file:size"])
+    except (KeyError, IndexError, TypeError):
+        return 0
+
+
+def add_profile_event(
+    job: lifecycle.JobLifecycle, profile: profiling.JobProfile, context: Context
+) -> None:
+    """Add the job profile to the events written by the last job transaction."""
+    if profile.enabled:
+        # the job is loaded before admission and started after it
+        for phase in ("load", "start"):
+            profile.phases[phase] = job.db_latency.get(phase, 0)
+        profile.phases["publish"] = context.upload_time
+        job.add_event("job_profile", json.dumps(profile.summary()))
+
+
+def log_profile(
+    job: lifecycle.JobLifecycle, profile: profiling.JobProfile, logger: Any
+) -> None:
+    if profile.enabled:
+        for phase in ("complete", "fail"):
+            if phase in job.db_latency:
+                profile.phases[phase] = job.db_latency[phase]
+        logger.info("Job profile", **profile.summary())
+
+
+def add_scratch_usage(
+    profile: profiling.JobProfile,
+    scratch_dir: scratch.Reservation | None,
+    logger: Any,
+) -> None:
+    if scratch_dir is None:
+        return
+    profile.phases["scratch_wait"] = scratch_dir.wait_time
+    profile.scratch_high_water = scratch_dir.high_water
+    logger.info(
+        "Scratch usage",
+        device=scratch_dir.device,
+        reserved=scratch_dir.size,
+        high_water=scratch_dir.high_water,
+    )
+
+
 def submit_workflow(
     entry_point: str,
     setup_code: str | None = None,
@@ -218,37 +433,32 @@ def submit_workflow(
     form: dict[str, Any] = {},
     metadata: dict[str, Any] = {},
 ) -> None:
+    import cacholote
+    import fsspec.implementations.local
+
+    from . import publish, size_index
+
+    tic = time.perf_counter()
+    configure_logger()
+    cacholote.config.Context.register(Context)
     job_id = distributed.worker.thread_state.key.removeprefix(  # type: ignore[attr-defined]
-        f"{BROKER_CONFIG.broker_request_prefix}-"
+        f"{get_broker_config().broker_request_prefix}-"
     )
     # send event with worker address and pid of the job
     worker = get_worker()
     logger = LOGGER.bind(job_id=job_id)
-    context = Context(job_id=job_id, logger=logger)
-    with context.session_maker() as session:
-        cads_broker.database.add_event(
-            event_type="worker_pid",
-            request_uid=job_id,
-            message=json.dumps({"worker": worker.address, "pid": os.getpid()}),
-            session=session,
-        )
-        cads_broker.database.add_event(
-            event_type="worker_name",
-            request_uid=job_id,
-            message=socket.gethostname(),
-            session=session,
-        )
-        system_request = cads_broker.database.get_request(
-            request_uid=job_id, session=session
-        )
-        request = system_request.request_body.get("request", {})
-        form = system_request.adaptor_properties.form
-        config.update(system_request.adaptor_properties.config)
+    context = Context(job_id=job_id, logger=logger, event_buffer=get_event_buffer())
+    profile = profiling.JobProfile(enabled=profiling.is_enabled())
+    job = lifecycle.JobLifecycle(job_id, context.session_maker, logger=logger)
+    request, form, system_config = job.load()
+    config.update(system_config)
+    collection_id = config.get("collection_id")
 
     structlog.contextvars.bind_contextvars(event_type="DATASET_COMPUTE", job_id=job_id)
 
-    volumes = models.DataVolumes.from_yaml()
-    cache_files_urlpath = volumes.get_random_volume()
+    with profile.phase("volume_selection"):
+        volume = selection.select_volume(models.get_volume_registry())
+    cache_files_urlpath = volume
     depth = int(os.getenv("CACHE_DEPTH", 1))
     if depth == 2:
         cache_files_urlpath = os.path.join(
@@ -258,20 +468,53 @@ def submit_workflow(
         context.warn(f"CACHE_DETPH={depth} is not supported.")
 
     logger.info("Processing job", job_id=job_id)
-    collection_id = config.get("collection_id")
-    dask.config.set(scheduler=os.getenv("WORKER_SCHEDULER_TYPE", "single-threaded"))
     cacholote.config.set(
         logger=LOGGER,
         cache_files_urlpath=cache_files_urlpath,
         sessionmaker=context.session_maker,
         context=context,
         tag=collection_id,
+        **publish.get_publish_settings(cache_files_urlpath),
     )
     fs, dirname = cacholote.utils.get_cache_files_fs_dirname()
 
-    adaptor_class = cads_adaptors.get_adaptor_class(entry_point, setup_code)
+    with profile.phase("adaptor_class"):
+        adaptor_class = adaptors.get_adaptor_class_cache().get_adaptor_class(
+            entry_point, setup_code, collection_id=collection_id
+        )
+    # admit before starting: rescheduled jobs are not recorded on this worker
+    admission_controller = admission.get_admission_controller()
+    scratch_manager = scratch.get_scratch_manager()
     try:
-        with utils.enter_tmp_working_dir() as working_dir:
+        with profile.phase("admission"):
+            ticket = admission_controller.acquire(
+                collection_id, admission_controller.estimate(collection_id, request)
+            )
+        try:
+            reservation = scratch_manager.reserve(
+                scratch_manager.estimate(collection_id)
+            )
+        except scratch.ScratchSpaceError:
+            admission_controller.release(ticket)
+            raise
+    except (admission.AdmissionTimeoutError, scratch.ScratchSpaceError) as err:
+        logger.warning("Job rescheduled", reason=str(err))
+        context.flush_events()
+        job.reschedule(str(err))
+        metrics.labels(
+            metrics.JOBS, collection_id=collection_id, status="rescheduled"
+        ).inc()
+        raise distributed.Reschedule() from err
+
+    scratch_dir: scratch.Reservation | None = None
+    try:
+        with (
+            scratch_manager.job_dir(reservation, collection_id) as scratch_dir,
+            utils.enter_tmp_working_dir(scratch_dir.path) as working_dir,
+            schedulers.job_scheduler(collection_id) as scheduler_profile,
+        ):
+            job.start(worker.address)
+            logger.info("Dask scheduler", **dataclasses.asdict(scheduler_profile))
             base_dir = (
                 dirname
                 if isinstance(fs, fsspec.implementations.local.LocalFileSystem)
@@ -284,18 +527,60 @@ def submit_workflow(
                     cache_tmp_path=cache_tmp_path,
                     **config,
                 )
-                result = adaptor.retrieve(request)
+                with profile.phase("retrieve"):
+                    result = adaptor.retrieve(request)
     except Exception as err:
+        add_scratch_usage(profile, scratch_dir, logger)
         logger.exception(job_id=job_id, event_type="EXCEPTION")
-        context.add_user_visible_error(f"The job failed with: {err.__class__.__name__}")
-        context.error(f"{err.__class__.__name__}: {str(err)}")
+        context.flush_events()
+        job.add_event(
+            "user_visible_error", f"The job failed with: {err.__class__.__name__}"
+        )
+        message = f"{err.__class__.__name__}: {str(err)}"
+        logger.error(message)
+        if LEVELS_MAPPING["ERROR"] >= context.worker_log_level:
+            job.add_event("ERROR", message)
+        add_profile_event(job, profile, context)
+        try:
+            job.fail()
+        except Exception:
+            # keep the adaptor error, the broker will notice the lost job
+            logger.exception("Failed to record the job failure", job_id=job_id)
+        log_profile(job, profile, logger)
+        metrics.labels(metrics.JOBS, collection_id=collection_id, status="failed").inc()
+        metrics.labels(
+            metrics.JOB_FAILURES,
+            collection_id=collection_id,
+            error_type=err.__class__.__name__,
+        ).inc()
+        metrics.labels(metrics.JOB_DURATION, collection_id=collection_id).observe(
+            time.perf_counter() - tic
+        )
         raise
-
-    if result.counter == 1 and "s3" in fs.protocol:
-        fs.chmod(result.result["args"][0]["file:local_path"], acl="public-read")
-    with context.session_maker() as session:
-        request = cads_broker.database.set_request_cache_id(
-            request_uid=job_id,
-            cache_id=result.id,
-            session=session,
+    finally:
+        admission_controller.release(ticket)
+
+    context.flush_events()
+    add_scratch_usage(profile, scratch_dir, logger)
+
+    if result.counter == 1:
+        result_size = get_result_size(result)
+        profile.bytes_written += result_size
+        metrics.labels(metrics.BYTES_WRITTEN, volume=volume).inc(result_size)
+        selection.get_volume_stats().record_write(volume, result_size)
+        if utils.strtobool(os.getenv("WORKER_SIZE_INDEX", "false")):
+            with profile.phase("size_index"):
+                size_index.record(context.session_maker, result.id, volume, result_size)
+        logger.info(
+            "Result published",
+            upload_time=context.upload_time,
+            size=result_size,
+            protocol=fs.protocol,
         )
+    add_profile_event(job, profile, context)
+    job.complete(result.id)
+    log_profile(job, profile, logger)
+    metrics.labels(metrics.JOBS, collection_id=collection_id, status="completed").inc()
+    metrics.labels(metrics.JOB_DURATION, collection_id=collection_id).observe(
+        time.perf_counter() - tic
+    )
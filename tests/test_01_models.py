@@ -1,8 +1,12 @@
+import math
+import os
 import pathlib
+import threading
+import time
 
 import pytest
 
-from cads_worker.models import DataVolumes
+from cads_worker.models import DataVolumes, VolumeRegistry, get_volume_registry
 
 
 def test_data_volumes_from_yaml(
@@ -26,3 +30,62 @@ def test_data_volumes_from_yaml(
 
     assert set(volumes.filter_available_volumes()) == {"s3://foo", "bar"}
     assert volumes.get_random_volume() == "s3://foo"
+
+
+def test_volume_registry(
+    tmp_path: pathlib.Path,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    data_volumes_config = tmp_path / "data-volumes.yaml"
+    data_volumes_config.write_text("s3://foo:\ncci1:///baz:\n")
+    ismount_calls: list[str] = []
+
+    def ismount(path: str) -> bool:
+        ismount_calls.append(path)
+        return False
+
+    monkeypatch.setattr(os.path, "ismount", ismount)
+
+    registry = VolumeRegistry(str(data_volumes_config), probe_ttl=math.inf)
+    assert set(registry.data_volumes.volumes) == {"s3://foo", "cci1:///baz"}
+    assert registry.get_random_volume() == "s3://foo"
+    assert registry.get_random_volume() == "s3://foo"
+    assert ismount_calls == ["/baz"]
+
+    # reload only when the file changes
+    data_volumes_config.write_text("s3://bar:\n")
+    os.utime(data_volumes_config, ns=(0, 0))
+    assert list(registry.available_volumes) == ["s3://bar"]
+    assert registry.get_random_volume() == "s3://bar"
+    assert ismount_calls == ["/baz"]
+
+
+def test_volume_registry_probe(
+    tmp_path: pathlib.Path,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    data_volumes_config = tmp_path / "data-volumes.yaml"
+    data_volumes_config.write_text("s3://foo:\ncci1:///baz:\n")
+    mounted = threading.Event()
+    monkeypatch.setattr(os.path, "ismount", lambda path: mounted.is_set())
+
+    registry = VolumeRegistry(str(data_volumes_config), probe_ttl=0)
+    assert list(registry.available_volumes) == ["s3://foo"]
+
+    # the probe runs in the background, the previous table is used meanwhile
+    mounted.set()
+    for _ in range(100):
+        if len(registry.available_volumes) == 2:
+            break
+        time.sleep(0.01)
+    assert set(registry.available_volumes) == {"s3://foo", "cci1:///baz"}
+
+
+def test_get_volume_registry(
+    tmp_path: pathlib.Path,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    data_volumes_config = tmp_path / "data-volumes.yaml"
+    data_volumes_config.write_text("s3://foo:\n")
+    monkeypatch.setenv("DATA_VOLUMES_CONFIG", str(data_volumes_config))
+    assert get_volume_registry() is get_volume_registry(str(data_volumes_config))
@@ -1,10 +1,105 @@
 import os
+import pathlib
+from unittest.mock import patch
 
 import fsspec
 import pytest
 
+from cads_worker import filesystems
+
 
 @pytest.mark.parametrize("protocol", ["cci1", "cci2"])
 def test_unstrip_protocol(protocol: str) -> None:
     fs = fsspec.filesystem(protocol)
     assert fs.unstrip_protocol(".") == f"{protocol}://{os.getcwd()}"
+
+
+@pytest.fixture
+def tree(tmp_path: pathlib.Path) -> pathlib.Path:
+    for i in range(3):
+        for j in range(2):
+            subdir = tmp_path / f"dir{i}" / f"subdir{j}"
+            subdir.mkdir(parents=True)
+            (subdir / "file.txt").write_text("x" * (i + j))
+        (tmp_path / f"dir{i}" / "file.txt").write_text("x" * i)
+    (tmp_path / "file.txt").write_text("foo")
+    (tmp_path / "empty").mkdir()
+    return tmp_path
+
+
+@pytest.mark.parametrize("withdirs", [True, False])
+@pytest.mark.parametrize("maxdepth", [None, 1, 2])
+def test_find_and_du(tree: pathlib.Path, withdirs: bool, maxdepth: int | None) -> None:
+    local_fs = fsspec.filesystem("file")
+    fs = fsspec.filesystem("cci1", max_workers=2)
+    kwargs = {"maxdepth": maxdepth, "withdirs": withdirs}
+    assert fs.find(str(tree), **kwargs) == local_fs.find(str(tree), **kwargs)
+    assert fs.du(str(tree), total=False, **kwargs) == local_fs.du(
+        str(tree), total=False, **kwargs
+    )
+
+    actual = fs.find(str(tree), detail=True, **kwargs)
+    expected = local_fs.find(str(tree), detail=True, **kwargs)
+    assert {name: info["size"] for name, info in actual.items()} == {
+        name: info["size"] for name, info in expected.items()
+    }
+
+
+def test_find_file(tree: pathlib.Path) -> None:
+    fs = fsspec.filesystem("cci1")
+    assert fs.find(str(tree / "file.txt")) == [str(tree / "file.txt")]
+    assert fs.find(str(tree / "missing")) == []
+    assert fs.du(str(tree / "file.txt")) == 3
+
+
+def test_metadata_ttl(tree: pathlib.Path) -> None:
+    fs = fsspec.filesystem("cci2", metadata_ttl=60)
+    path = str(tree / "file.txt")
+    assert fs.info(path)["size"] == 3
+
+    # out-of-band changes are not seen until the entry expires
+    (tree / "file.txt").write_text("foobar")
+    assert fs.info(path)["size"] == 3
+    with patch("time.monotonic", return_value=float("inf")):
+        assert fs.info(path)["size"] == 6
+
+    # changes made through the filesystem invalidate the entry
+    with fs.open(path, "w") as f:
+        f.write("x")
+    assert fs.info(path)["size"] == 1
+    fs.rm(path)
+    assert not fs.exists(path)
+
+
+@pytest.mark.parametrize("readahead", [True, False])
+def test_mmap_read(tmp_path: pathlib.Path, readahead: bool) -> None:
+    path = tmp_path / "file.grib"
+    path.write_bytes(b"foo\nbar\nbaz")
+    (tmp_path / "empty.grib").touch()
+    fs = fsspec.filesystem("cci1", mmap_read=True, readahead=readahead)
+
+    with fs.open(str(path), "rb") as f:
+        assert isinstance(f, filesystems.MMapFile)
+        assert f.read(3) == b"foo"
+        assert f.readline() == b"\n"
+        assert f.readline() == b"bar\n"
+        buffer = bytearray(5)
+        assert f.readinto(buffer) == 3
+        assert buffer == b"baz\x00\x00"
+        assert f.read() == b""
+        f.seek(-3, os.SEEK_END)
+        assert f.read() == b"baz"
+        with f.getbuffer() as view:
+            assert view.tobytes() == path.read_bytes()
+    assert f.closed
+
+    with fs.open(str(path), "r") as f:
+        assert f.readlines() == ["foo\n", "bar\n", "baz"]
+
+    with fs.open(str(tmp_path / "empty.grib"), "rb") as f:
+        assert f.read() == b""
+
+    fs = fsspec.filesystem("cci1", readahead=readahead)
+    with fs.open(str(path), "rb") as f:
+        assert not isinstance(f, filesystems.MMapFile)
+        assert f.read() == path.read_bytes()
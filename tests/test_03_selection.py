@@ -0,0 +1,98 @@
+import pathlib
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from cads_worker import models, selection
+
+
+class FakeStats(selection.VolumeStats):
+    def __init__(self, used_bytes: dict[str, int]) -> None:
+        super().__init__(ttl=0)
+        self.fake_used_bytes = used_bytes
+
+    def measure_used_bytes(self, volume: str) -> int | None:
+        return self.fake_used_bytes.get(volume)
+
+
+VOLUMES = {
+    "full": models.DataVolumeConfig(max_size=10),
+    "empty": models.DataVolumeConfig(max_size=10),
+    "s3://unknown": models.DataVolumeConfig(weight=0),
+}
+CUM_WEIGHTS = [1.0, 2.0, 2.0]
+
+
+def test_volume_stats() -> None:
+    config = models.DataVolumeConfig(max_size=10)
+    stats = selection.VolumeStats(ttl=60)
+    assert stats.free_fraction("s3://foo", config) == 1
+
+    stats.record_write("foo", 1)
+    stats.record_write("foo", 2)
+    assert stats.bytes_written["foo"] == 3
+    assert "foo" in stats.last_written
+    assert stats.free_fraction("foo", config) == 0.7
+    stats.record_write("foo", 10)
+    assert stats.free_fraction("foo", config) == 0
+    assert stats.free_fraction("foo", models.DataVolumeConfig(max_size=0)) == 1
+
+    stats = FakeStats({"full": 10, "half": 5})
+    assert stats.free_fraction("full", config) == 0
+    assert stats.free_fraction("half", config) == 0.5
+    assert stats.free_fraction("s3://unknown", config) == 1
+
+
+def test_volume_stats_size_index() -> None:
+    config = models.DataVolumeConfig(max_size=10)
+    stats = selection.VolumeStats(ttl=60, session_maker=MagicMock())
+    # volumes sharing a filesystem have their own usage
+    disk_usage = {"/data/a": 8, "/data/b": 2}
+    with patch(
+        "cads_worker.size_index.get_disk_usage",
+        side_effect=lambda session, volume: disk_usage[volume],
+    ) as mock_get_disk_usage:
+        assert stats.free_fraction("/data/a", config) == pytest.approx(0.2)
+        assert stats.free_fraction("/data/b", config) == 0.8
+        assert stats.free_fraction("/data/a", config) == pytest.approx(0.2)
+    assert mock_get_disk_usage.call_count == 2
+
+    stats = selection.VolumeStats(ttl=60, session_maker=MagicMock())
+    with patch("cads_worker.size_index.get_disk_usage", side_effect=RuntimeError):
+        assert stats.free_fraction("/data/a", config) == 1
+
+
+def test_select_free_space() -> None:
+    stats = FakeStats({"full": 10, "empty": 0})
+    for _ in range(10):
+        assert selection.select_free_space(VOLUMES, CUM_WEIGHTS, stats) == "empty"
+
+
+def test_select_least_recently_written() -> None:
+    stats = FakeStats({})
+    first = selection.select_least_recently_written(VOLUMES, CUM_WEIGHTS, stats)
+    stats.record_write(first, 1)
+    second = selection.select_least_recently_written(VOLUMES, CUM_WEIGHTS, stats)
+    assert {first, second} == {"full", "empty"}
+
+
+def test_select_power_of_two() -> None:
+    stats = FakeStats({"full": 10, "empty": 0})
+    selected = {
+        selection.select_power_of_two(VOLUMES, CUM_WEIGHTS, stats) for _ in range(20)
+    }
+    # "full" is chosen only if drawn twice
+    assert "empty" in selected
+    assert "s3://unknown" not in selected
+
+
+def test_select_volume(tmp_path: pathlib.Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    data_volumes_config = tmp_path / "data-volumes.yaml"
+    data_volumes_config.write_text("s3://foo:\n")
+    registry = models.VolumeRegistry(str(data_volumes_config))
+    for strategy in selection.SELECTION_STRATEGIES:
+        monkeypatch.setenv("DATA_VOLUMES_SELECTION", strategy)
+        assert selection.select_volume(registry) == "s3://foo"
+
+    with pytest.raises(NotImplementedError):
+        selection.select_volume(registry, "foo")
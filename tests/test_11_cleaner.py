@@ -0,0 +1,57 @@
+import pathlib
+
+import cacholote
+import pytest
+
+from cads_worker import cleaner
+
+
+def make_cached_file(tmp_path: pathlib.Path, cache_files_urlpath: str) -> pathlib.Path:
+    dummy_path = tmp_path / "dummy.txt"
+    dummy_path.write_text("dummy")
+    with cacholote.config.set(cache_files_urlpath=cache_files_urlpath):
+        return pathlib.Path(cacholote.cacheable(open)(dummy_path).name)
+
+
+@pytest.mark.parametrize("max_workers", [1, 2])
+def test_clean_volumes(
+    tmp_path: pathlib.Path, monkeypatch: pytest.MonkeyPatch, max_workers: int
+) -> None:
+    cache_db_urlpath = f"sqlite:///{tmp_path / 'cacholote.db'}"
+    monkeypatch.setenv("CACHOLOTE_CACHE_DB_URLPATH", cache_db_urlpath)
+    cacholote.config.reset()
+
+    cache_files_urlpath = str(tmp_path / "cache_files")
+    cached_path = make_cached_file(tmp_path, cache_files_urlpath)
+    not_a_dir = tmp_path / "not_a_dir"
+    not_a_dir.touch()
+
+    cleaner_kwargs = cleaner.CleanerKwargs(
+        maxsize=0,
+        method="LRU",
+        delete_unknown_files=False,
+        lock_validity_period=86400,
+        use_database=True,
+        depth=1,
+        batch_size=None,
+        batch_delay=0,
+    )
+    summaries = cleaner.clean_volumes(
+        {cache_files_urlpath: cleaner_kwargs, str(not_a_dir): cleaner_kwargs},
+        max_workers=max_workers,
+    )
+    assert not cached_path.exists()
+
+    ok, failed = summaries
+    assert ok.cache_files_urlpath == cache_files_urlpath
+    assert ok.error is None
+    # only measured with the size index
+    assert ok.bytes_freed is None
+    assert ok.files_deleted is None
+    assert ok.duration > 0
+
+    assert failed.cache_files_urlpath == str(not_a_dir)
+    assert failed.error is not None
+
+    monkeypatch.undo()
+    cacholote.config.reset()
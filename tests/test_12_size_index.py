@@ -0,0 +1,109 @@
+import pathlib
+from collections.abc import Iterator
+from typing import Any
+
+import cacholote
+import fsspec
+import pytest
+
+from cads_worker import cleaner, size_index
+
+
+@pytest.fixture
+def cache_files_urlpath(
+    tmp_path: pathlib.Path, monkeypatch: pytest.MonkeyPatch
+) -> Iterator[str]:
+    monkeypatch.setenv(
+        "CACHOLOTE_CACHE_DB_URLPATH", f"sqlite:///{tmp_path / 'cacholote.db'}"
+    )
+    cacholote.config.reset()
+    size_index.init_table(cacholote.config.get().instantiated_sessionmaker)
+    yield str(tmp_path / "cache_files")
+    monkeypatch.undo()
+    cacholote.config.reset()
+
+
+def cache_file(
+    tmp_path: pathlib.Path, cache_files_urlpath: str, content: str
+) -> tuple[int, pathlib.Path]:
+    path = tmp_path / f"{content}.txt"
+    path.write_text(content)
+    with cacholote.config.set(
+        cache_files_urlpath=cache_files_urlpath, return_cache_entry=True
+    ):
+        cache_entry: Any = cacholote.cacheable(open)(path)
+    cached_path = pathlib.Path(cache_entry.result["args"][0]["file:local_path"])
+    size_index.record(
+        cacholote.config.get().instantiated_sessionmaker,
+        cache_entry.id,
+        cache_files_urlpath,
+        cached_path.stat().st_size,
+    )
+    return cache_entry.id, cached_path
+
+
+def test_size_index_clean(tmp_path: pathlib.Path, cache_files_urlpath: str) -> None:
+    _, old = cache_file(tmp_path, cache_files_urlpath, "old")
+    _, new = cache_file(tmp_path, cache_files_urlpath, "newer")
+    sessionmaker = cacholote.config.get().instantiated_sessionmaker
+    with sessionmaker() as session:
+        assert size_index.get_disk_usage(session, cache_files_urlpath) == 8
+        assert size_index.get_disk_usage(session, "other") == 0
+
+    cleaner_kwargs = cleaner.CleanerKwargs(
+        maxsize=5,
+        method="LRU",
+        delete_unknown_files=False,
+        lock_validity_period=86400,
+        use_database=True,
+        depth=1,
+        batch_size=None,
+        batch_delay=0,
+    )
+    (summary,) = cleaner.clean_volumes(
+        {cache_files_urlpath: cleaner_kwargs}, use_size_index=True
+    )
+    assert summary.error is None
+    assert summary.bytes_freed == 3
+    assert summary.files_deleted == 1
+    assert not old.exists()
+    assert new.exists()
+    with sessionmaker() as session:
+        assert size_index.get_disk_usage(session, cache_files_urlpath) == 5
+
+    (summary,) = cleaner.clean_volumes(
+        {cache_files_urlpath: {**cleaner_kwargs, "maxsize": 0}}, use_size_index=True
+    )
+    assert summary.files_deleted == 1
+    assert not new.exists()
+
+
+def test_size_index_reconcile(tmp_path: pathlib.Path, cache_files_urlpath: str) -> None:
+    _, missing = cache_file(tmp_path, cache_files_urlpath, "missing")
+    cache_id, resized = cache_file(tmp_path, cache_files_urlpath, "resized")
+    missing.unlink()
+    resized.write_text("resized!")
+
+    fs = fsspec.filesystem("file")
+    sessionmaker = cacholote.config.get().instantiated_sessionmaker
+    with sessionmaker() as session:
+        assert size_index.reconcile(session, fs, cache_files_urlpath, 10) == 2
+        assert size_index.get_disk_usage(session, cache_files_urlpath) == 8
+        assert size_index.reconcile(session, fs, cache_files_urlpath, 10) == 0
+
+
+def test_size_index_missing_table(
+    tmp_path: pathlib.Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    monkeypatch.setenv(
+        "CACHOLOTE_CACHE_DB_URLPATH", f"sqlite:///{tmp_path / 'missing.db'}"
+    )
+    cacholote.config.reset()
+    sessionmaker = cacholote.config.get().instantiated_sessionmaker
+    with (
+        sessionmaker() as session,
+        pytest.raises(RuntimeError, match="init-size-index"),
+    ):
+        size_index.get_disk_usage(session, "volume")
+    monkeypatch.undo()
+    cacholote.config.reset()
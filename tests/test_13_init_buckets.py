@@ -0,0 +1,143 @@
+import json
+import pathlib
+from collections.abc import Iterator
+from typing import Any
+from unittest.mock import patch
+
+import boto3
+import cads_broker.object_storage
+import moto
+import pytest
+import typer
+import typer.testing
+
+from cads_worker import buckets, entry_points
+
+OBJECT_STORAGE_URL = "https://s3.amazonaws.com"
+STORAGE_KWS: dict[str, Any] = {
+    "aws_access_key_id": "admin",
+    "aws_secret_access_key": "password",
+}
+
+
+@pytest.fixture(autouse=True)
+def mock_aws(monkeypatch: pytest.MonkeyPatch) -> Iterator[None]:
+    monkeypatch.setenv("AWS_DEFAULT_REGION", "us-east-1")
+    with moto.mock_aws():
+        yield
+
+
+def test_init_buckets() -> None:
+    client = boto3.client("s3", endpoint_url=OBJECT_STORAGE_URL, **STORAGE_KWS)
+    client.create_bucket(Bucket="configured")
+    client.put_bucket_policy(
+        Bucket="configured",
+        Policy=json.dumps(
+            {
+                "Version": "2012-10-17",
+                "Statement": [
+                    {
+                        "Effect": "Allow",
+                        "Principal": "*",
+                        "Action": "s3:GetObject",
+                        "Resource": "arn:aws:s3:::configured/*",
+                    }
+                ],
+            }
+        ),
+    )
+    assert buckets.is_bucket_configured(client, "configured")
+    assert not buckets.is_bucket_configured(client, "foo")
+
+    summaries = buckets.init_buckets(
+        ["s3://configured", "s3://foo", "s3://bar"],
+        OBJECT_STORAGE_URL,
+        max_workers=2,
+        **STORAGE_KWS,
+    )
+    assert [(summary.data_volume, summary.status) for summary in summaries] == [
+        ("s3://configured", "skipped"),
+        ("s3://foo", "initialized"),
+        ("s3://bar", "initialized"),
+    ]
+    assert all(summary.duration > 0 for summary in summaries)
+    assert {bucket["Name"] for bucket in client.list_buckets()["Buckets"]} == {
+        "configured",
+        "foo",
+        "bar",
+    }
+
+
+def test_is_bucket_configured() -> None:
+    client = boto3.client("s3", endpoint_url=OBJECT_STORAGE_URL, **STORAGE_KWS)
+    client.create_bucket(Bucket="private")
+    client.put_bucket_policy(
+        Bucket="private",
+        Policy=json.dumps(
+            {
+                "Version": "2012-10-17",
+                "Statement": [
+                    {
+                        "Effect": "Deny",
+                        "Principal": {"AWS": ["*"]},
+                        "Action": ["s3:GetObject"],
+                        "Resource": ["arn:aws:s3:::private/*"],
+                    }
+                ],
+            }
+        ),
+    )
+    assert not buckets.is_bucket_configured(client, "private")
+
+    lifecycle = {
+        "Rules": [
+            {
+                "ID": "expire",
+                "Filter": {"Prefix": ""},
+                "Status": "Enabled",
+                "Expiration": {"Days": 30},
+            }
+        ]
+    }
+    (summary,) = buckets.init_buckets(
+        ["s3://expiring"], OBJECT_STORAGE_URL, lifecycle=lifecycle, **STORAGE_KWS
+    )
+    assert summary.status == "initialized"
+    assert buckets.is_bucket_configured(client, "expiring", lifecycle)
+
+    lifecycle["Rules"][0]["Expiration"] = {"Days": 7}
+    assert not buckets.is_bucket_configured(client, "expiring", lifecycle)
+
+
+def test_init_buckets_exit_status(
+    tmp_path: pathlib.Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    data_volumes_config = tmp_path / "data-volumes.yaml"
+    data_volumes_config.write_text("s3://foo:\ns3://bar:\n")
+    monkeypatch.setenv("DATA_VOLUMES_CONFIG", str(data_volumes_config))
+    monkeypatch.setenv("OBJECT_STORAGE_URL", OBJECT_STORAGE_URL)
+    monkeypatch.setenv("STORAGE_ADMIN", STORAGE_KWS["aws_access_key_id"])
+    monkeypatch.setenv("STORAGE_PASSWORD", STORAGE_KWS["aws_secret_access_key"])
+    app = typer.Typer()
+    app.command()(entry_points._init_buckets)
+    runner = typer.testing.CliRunner()
+
+    create_download_bucket = cads_broker.object_storage.create_download_bucket
+
+    def fail_on_bar(data_volume: str, *args: Any, **kwargs: Any) -> None:
+        if data_volume == "s3://bar":
+            raise ValueError("Access denied")
+        create_download_bucket(data_volume, *args, **kwargs)
+
+    with patch("cads_broker.object_storage.create_download_bucket", fail_on_bar):
+        result = runner.invoke(app)
+    assert result.exit_code == 1
+    assert "['s3://bar']" in str(result.exception)
+
+    with patch("cads_worker.buckets.is_bucket_configured", return_value=False):
+        result = runner.invoke(app)
+    assert result.exit_code == 1
+    assert "['s3://foo', 's3://bar']" in str(result.exception)
+
+    result = runner.invoke(app)
+    assert result.exit_code == 0
@@ -0,0 +1,112 @@
+import json
+import os
+import pathlib
+import socket
+import subprocess
+import sys
+import time
+
+import pytest
+
+from cads_worker import reaper
+
+
+def make_tmp_path(
+    dirname: pathlib.Path,
+    name: str,
+    lock_info: dict[str, object] | None = None,
+    age: float = 0,
+    size: int = 0,
+) -> pathlib.Path:
+    tmp_path = dirname / name
+    tmp_path.mkdir(parents=True)
+    (tmp_path / "data").write_bytes(b"0" * size)
+    mtime = time.time() - age
+    if lock_info is not None:
+        lock_path = tmp_path.with_suffix(".lock")
+        lock_path.write_text(json.dumps(lock_info))
+        os.utime(lock_path, (mtime, mtime))
+    os.utime(tmp_path, (mtime, mtime))
+    return tmp_path
+
+
+def get_dead_pid() -> int:
+    process = subprocess.Popen([sys.executable, "-c", "pass"])
+    process.wait()
+    return process.pid
+
+
+@pytest.fixture
+def volume(tmp_path: pathlib.Path) -> pathlib.Path:
+    volume = tmp_path / "volume"
+    date = volume / "2024-01-01"
+    host = socket.gethostname()
+    make_tmp_path(volume, "tmpalive001", {"host": host, "pid": os.getpid()})
+    make_tmp_path(date, "tmpalive002", {"host": "other", "pid": 1})
+    make_tmp_path(date, "tmpalive003")
+    make_tmp_path(date, "tmpdead0001", {"host": "other", "pid": 1}, age=100, size=10)
+    make_tmp_path(date, "tmpdead0002", {"host": host, "pid": get_dead_pid()})
+    make_tmp_path(volume, "tmpdead0003", age=100)
+    # lock left without its directory
+    (date / "tmpdead0004.lock").write_text("")
+    os.utime(date / "tmpdead0004.lock", (0, 0))
+    # cache files
+    (date / "tmpcache.grib").write_text("")
+    (date / "0123456789abcdef.grib").write_text("")
+    os.utime(date / "0123456789abcdef.grib", (0, 0))
+    return volume
+
+
+def test_find_orphans(volume: pathlib.Path) -> None:
+    orphans, alive = reaper.find_orphans(str(volume), depth=2, max_age=10)
+    assert alive == 3
+    assert sorted(
+        str(pathlib.Path(orphan).relative_to(volume)) for orphan in orphans
+    ) == [
+        "2024-01-01/tmpdead0001",
+        "2024-01-01/tmpdead0001.lock",
+        "2024-01-01/tmpdead0002",
+        "2024-01-01/tmpdead0002.lock",
+        "2024-01-01/tmpdead0004.lock",
+        "tmpdead0003",
+    ]
+
+    orphans, alive = reaper.find_orphans(str(volume), depth=1, max_age=10)
+    assert (len(orphans), alive) == (1, 1)
+
+
+def test_reap_volume(volume: pathlib.Path) -> None:
+    summary = reaper.reap_volume(str(volume), max_age=10, dry_run=True)
+    assert (summary.dirs_deleted, summary.locks_deleted) == (3, 3)
+    assert summary.bytes_reclaimed > 0
+    assert (volume / "tmpdead0003").exists()
+
+    summary = reaper.reap_volume(str(volume), max_age=10, batch_size=2)
+    assert summary.error is None
+    assert (summary.dirs_deleted, summary.locks_deleted, summary.alive) == (3, 3, 3)
+    assert not (volume / "tmpdead0003").exists()
+    assert not (volume / "2024-01-01" / "tmpdead0004.lock").exists()
+    assert (volume / "2024-01-01" / "0123456789abcdef.grib").exists()
+    assert reaper.find_orphans(str(volume), depth=2, max_age=10) == ([], 3)
+
+
+def test_reap_volumes(tmp_path: pathlib.Path) -> None:
+    summaries = reaper.reap_volumes(
+        [str(tmp_path / "missing"), "s3://bucket"], max_workers=2
+    )
+    assert summaries[0].error is not None
+    assert summaries[1].error is None
+
+
+def test_cache_cleaner_reaper(
+    volume: pathlib.Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    data_volumes_config = volume.parent / "data-volumes.yaml"
+    data_volumes_config.write_text(f"{volume}:")
+    monkeypatch.setenv("DATA_VOLUMES_CONFIG", str(data_volumes_config))
+    monkeypatch.setenv("USE_REAPER", "1")
+    monkeypatch.setenv("REAPER_ONLY", "1")
+    monkeypatch.setenv("REAPER_MAX_AGE", "10")
+    subprocess.run("cache-cleaner", check=True)
+    assert not (volume / "tmpdead0003").exists()
+    assert (volume / "tmpalive001").exists()
@@ -51,3 +51,20 @@ def test_cache_entries(
             )
             assert count == 1
             assert now != cached_now()
+
+
+def test_cache_entries_stream(tmp_path: Path) -> None:
+    today = datetime.datetime.now(tz=datetime.timezone.utc)
+    with cacholote.config.set(
+        cache_db_urlpath=f"sqlite:///{tmp_path / 'cacholote.db'}",
+        tag="foo",
+    ):
+        now = cached_now()
+        count = entry_points._expire_cache_entries(
+            before=today + datetime.timedelta(days=1),
+            after=today - datetime.timedelta(days=1),
+            collection_id=["foo"],
+            stream=True,
+        )
+        assert count == 1
+        assert now != cached_now()
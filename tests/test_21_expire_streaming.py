@@ -0,0 +1,80 @@
+import datetime
+import json
+import pathlib
+from collections.abc import Iterator
+from typing import Any
+from unittest.mock import patch
+
+import cacholote
+import pytest
+
+from cads_worker import expire
+
+TODAY = datetime.datetime.now(tz=datetime.timezone.utc)
+TOMORROW = TODAY + datetime.timedelta(days=1)
+YESTERDAY = TODAY - datetime.timedelta(days=1)
+
+
+@pytest.fixture(autouse=True)
+def set_cache(tmp_path: pathlib.Path) -> Iterator[None]:
+    with cacholote.config.set(
+        cache_db_urlpath=f"sqlite:///{tmp_path / 'cacholote.db'}",
+        cache_files_urlpath=str(tmp_path / "cache_files"),
+        tag="foo",
+    ):
+        yield
+
+
+def cache_files(tmp_path: pathlib.Path, n: int) -> list[pathlib.Path]:
+    paths = []
+    for i in range(n):
+        path = tmp_path / f"{i}.txt"
+        path.write_text("x" * (i + 1))
+        paths.append(pathlib.Path(cacholote.cacheable(open)(path).name))
+    return paths
+
+
+def test_expire_streaming(tmp_path: pathlib.Path) -> None:
+    paths = cache_files(tmp_path, 3)
+    kwargs: dict[str, Any] = {
+        "tags": ["foo"],
+        "before": TOMORROW,
+        "after": YESTERDAY,
+        "batch_size": 2,
+    }
+    assert expire.expire_cache_entries(**kwargs, dry_run=True) == 3
+    assert expire.expire_cache_entries(**kwargs, delete=True) == 3
+    assert not any(path.exists() for path in paths)
+    assert expire.expire_cache_entries(**kwargs, dry_run=True) == 0
+    assert expire.expire_cache_entries(**{**kwargs, "tags": ["bar"]}) == 0
+
+
+def test_expire_streaming_resume(tmp_path: pathlib.Path) -> None:
+    paths = cache_files(tmp_path, 3)
+    checkpoint = str(tmp_path / "checkpoint.json")
+    kwargs: dict[str, Any] = {
+        "tags": None,
+        "before": TOMORROW,
+        "after": YESTERDAY,
+        "delete": True,
+        "batch_size": 2,
+        "checkpoint_path": checkpoint,
+    }
+
+    # interrupt after the first chunk
+    with patch("time.sleep", side_effect=KeyboardInterrupt):
+        with pytest.raises(KeyboardInterrupt):
+            expire.expire_cache_entries(**kwargs)
+    assert [path.exists() for path in paths] == [False, False, True]
+    with open(checkpoint) as f:
+        saved = json.load(f)
+    assert saved["count"] == 2
+    assert saved["bytes_freed"] == 3
+
+    # parameters must match
+    with pytest.raises(ValueError, match="different parameters"):
+        expire.expire_cache_entries(**{**kwargs, "delete": False}, resume=True)
+
+    assert expire.expire_cache_entries(**kwargs, resume=True) == 3
+    assert not paths[-1].exists()
+    assert not pathlib.Path(checkpoint).exists()
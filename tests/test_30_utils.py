@@ -1,3 +1,4 @@
+import json
 import os
 import pathlib
 import tempfile
@@ -17,6 +18,39 @@ def test_utils_enter_tmp_working_dir() -> None:
 def test_utils_make_cache_tmp_path(tmp_path: pathlib.Path) -> None:
     with utils.make_cache_tmp_path(str(tmp_path)) as cache_tmp_path:
         assert cache_tmp_path.parent == tmp_path
-        assert cache_tmp_path.with_suffix(".lock").exists()
+        lock_info = json.loads(cache_tmp_path.with_suffix(".lock").read_text())
+        assert lock_info["pid"] == os.getpid()
+        assert set(lock_info) == {"host", "pid", "created_at"}
     assert not cache_tmp_path.exists()
     assert not cache_tmp_path.with_suffix(".lock").exists()
+
+
+def test_get_disk_usage(tmp_path: pathlib.Path) -> None:
+    (tmp_path / "dir").mkdir()
+    (tmp_path / "dir" / "data").write_bytes(b"0" * 10_000)
+    assert utils.get_disk_usage(str(tmp_path)) >= 10_000
+
+
+def test_utils_message_buffer() -> None:
+    buffer = utils.MessageBuffer(max_message_size=10)
+    buffer.write("\r  0%|\n")
+    buffer.write("\r 50%|\n")
+    buffer.write("\r100%|\n")
+    assert buffer.only_progress
+    assert buffer.pop_messages() == ["100%|\n"]
+    assert not buffer
+
+    buffer.write("foo\n")
+    buffer.write("\r 50%|\n")
+    buffer.write("\r100%|\r\n")
+    buffer.write("bar\n")
+    assert not buffer.only_progress
+    assert len(buffer) == len("foo\n100%|\nbar\n")
+    assert buffer.pop_messages() == ["foo\n100%|\n", "bar\n"]
+
+    buffer.write("0123456789abcdef\n")
+    assert buffer.pop_messages() == ["0123456789", "abcdef\n"]
+
+
+def test_get_rss() -> None:
+    assert utils.get_rss() > 0
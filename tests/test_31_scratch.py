@@ -0,0 +1,81 @@
+import os
+import pathlib
+import threading
+from types import SimpleNamespace
+from typing import Any
+from unittest.mock import patch
+
+import pytest
+
+from cads_worker import scratch
+
+
+def disk_usage(free: dict[str, int]) -> Any:
+    return lambda path: SimpleNamespace(free=free[path])
+
+
+def test_reserve() -> None:
+    manager = scratch.ScratchManager(["a", "b"], min_free=10)
+    with patch("shutil.disk_usage", disk_usage({"a": 100, "b": 60})):
+        first = manager.reserve(50)
+        assert first.device == "a"
+        # unused reservations are subtracted from the free space
+        second = manager.reserve(40)
+        assert second.device == "b"
+        assert manager.available("a") == 40
+        first.usage = 30
+        assert manager.available("a") == 70
+        manager.release(first)
+        manager.release(second)
+        assert manager.available("a") == 90
+
+
+def test_reserve_wait() -> None:
+    manager = scratch.ScratchManager(["a"], max_wait=0.1, poll_interval=0.01)
+    with patch("shutil.disk_usage", disk_usage({"a": 100})):
+        reservation = manager.reserve(80)
+        with pytest.raises(scratch.ScratchSpaceError):
+            manager.reserve(80)
+
+        manager.max_wait = 10
+        timer = threading.Timer(0.05, manager.release, [reservation])
+        timer.start()
+        assert manager.reserve(80).wait_time > 0
+        timer.join()
+
+
+def test_job_dir(tmp_path: pathlib.Path) -> None:
+    manager = scratch.ScratchManager(
+        [str(tmp_path)], default_size=1, sizes={"bar": 2}, monitor_interval=0
+    )
+    assert manager.estimate(None) == 1
+    assert manager.estimate("foo") == 1
+    assert manager.estimate("bar") == 2
+
+    reservation = manager.reserve(manager.estimate("foo"))
+    with manager.job_dir(reservation, "foo"):
+        assert os.path.dirname(reservation.path) == str(tmp_path)
+        (pathlib.Path(reservation.path) / "data").write_bytes(b"0" * 10_000)
+    assert not os.path.exists(reservation.path)
+    assert reservation.high_water >= 10_000
+    assert reservation.exceeded
+    assert manager.estimate("foo") == reservation.high_water
+    assert manager.available(str(tmp_path)) > 0
+
+    manager.max_estimate = 5_000
+    assert manager.estimate("foo") == 5_000
+    manager.learn_estimates = False
+    assert manager.estimate("foo") == 1
+
+
+def test_get_scratch_manager(monkeypatch: pytest.MonkeyPatch) -> None:
+    scratch.get_scratch_manager.cache_clear()
+    assert not scratch.get_scratch_manager().learn_estimates
+
+    scratch.get_scratch_manager.cache_clear()
+    monkeypatch.setenv("WORKER_SCRATCH_DEFAULT_SIZE", "1GB")
+    monkeypatch.setenv("WORKER_SCRATCH_MAX_ESTIMATE", "10GB")
+    manager = scratch.get_scratch_manager()
+    assert manager.learn_estimates
+    assert manager.max_estimate == 10 * 10**9
+    scratch.get_scratch_manager.cache_clear()
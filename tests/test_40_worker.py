@@ -1,6 +1,9 @@
+import datetime
+import logging
 from typing import Any
-from unittest.mock import patch
+from unittest.mock import MagicMock, patch
 
+import cads_broker.database
 import pytest
 import sqlalchemy as sa
 from sqlalchemy.orm import Session
@@ -102,3 +105,70 @@ def test_ensure_session_retry() -> None:
     ):
         result = successful_function(self=context)
     assert isinstance(result, Session)
+
+
+def test_context_flush() -> None:
+    context = worker.Context()
+    context.messages_buffer.max_message_size = 10
+    with patch.object(context, "add_stdout") as add_stdout:
+        context.write("\r 50%|")
+        context.flush()
+        add_stdout.assert_called_once_with(" 50%|\n")
+
+        # progress updates are rate limited
+        context.write("\r100%|")
+        context.flush()
+        add_stdout.assert_called_once()
+
+        context.write("foo")
+        context.flush()
+        assert add_stdout.call_args_list[1:] == [(("100%|\nfoo\n",),)]
+
+        context.write("0123456789")
+        context.flush_events()
+        assert add_stdout.call_args_list[2:] == [(("0123456789",),), (("\n",),)]
+
+
+def test_context_suppressed_levels() -> None:
+    logger = MagicMock()
+    logger.isEnabledFor.side_effect = lambda level: level >= logging.INFO
+    context = worker.Context(logger=logger)
+    context.worker_log_level = logging.WARNING
+    with (
+        patch("cads_worker.worker.create_session_maker") as create_session_maker,
+        patch("cads_broker.database.add_event") as add_event,
+    ):
+        context.debug("foo")
+        logger.log.assert_not_called()
+        create_session_maker.assert_not_called()
+
+        context.info("foo")
+        logger.log.assert_called_once()
+        create_session_maker.assert_not_called()
+
+        context.warning("foo")
+        assert logger.log.call_count == 2
+        create_session_maker.assert_called_once()
+        add_event.assert_called_once()
+
+
+def test_write_events() -> None:
+    engine = sa.create_engine("sqlite://")
+    cads_broker.database.Events.__table__.create(engine)
+    timestamp = datetime.datetime(2024, 1, 1, 12)
+    batch = [
+        {
+            "event_type": "INFO",
+            "request_uid": "00000000-0000-0000-0000-000000000000",
+            "message": "foo",
+            "timestamp": timestamp,
+        }
+    ]
+    with patch(
+        "cads_worker.worker.create_session_maker",
+        return_value=sa.orm.sessionmaker(engine),
+    ):
+        worker.write_events(batch)
+    with Session(engine) as session:
+        (event,) = session.scalars(sa.select(cads_broker.database.Events))
+        assert (event.message, event.timestamp) == ("foo", timestamp)
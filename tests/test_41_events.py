@@ -0,0 +1,91 @@
+import datetime
+import threading
+from typing import Any
+
+import pytest
+
+from cads_worker import events
+
+
+class Recorder:
+    def __init__(self) -> None:
+        self.batches: list[list[dict[str, Any]]] = []
+        self.release = threading.Event()
+        self.release.set()
+
+    def __call__(self, batch: list[dict[str, Any]]) -> None:
+        self.release.wait()
+        self.batches.append(batch)
+
+    @property
+    def messages(self) -> list[str]:
+        return [event["message"] for batch in self.batches for event in batch]
+
+
+def test_event_buffer_batches() -> None:
+    recorder = Recorder()
+    buffer = events.EventBuffer(recorder, batch_size=2, flush_interval=60)
+    for i in range(5):
+        assert buffer.put("INFO", "job", str(i))
+    assert buffer.flush(timeout=10)
+    assert recorder.messages == ["0", "1", "2", "3", "4"]
+    assert all(len(batch) <= 2 for batch in recorder.batches)
+    event = recorder.batches[0][0]
+    assert isinstance(event.pop("timestamp"), datetime.datetime)
+    assert event == {
+        "event_type": "INFO",
+        "request_uid": "job",
+        "message": "0",
+    }
+    assert len(buffer) == 0
+    buffer.close()
+
+
+def test_event_buffer_flush_interval() -> None:
+    recorder = Recorder()
+    buffer = events.EventBuffer(recorder, batch_size=100, flush_interval=0.01)
+    buffer.put("INFO", "job", "foo")
+    buffer.close(timeout=10)
+    assert recorder.messages == ["foo"]
+    with pytest.raises(RuntimeError):
+        buffer.put("INFO", "job", "bar")
+
+
+@pytest.mark.parametrize(
+    "overflow,expected",
+    [("drop_newest", ["0", "1"]), ("drop_oldest", ["1", "2"])],
+)
+def test_event_buffer_overflow(
+    overflow: events.OverflowPolicy, expected: list[str]
+) -> None:
+    recorder = Recorder()
+    recorder.release.clear()
+    buffer = events.EventBuffer(
+        recorder, max_size=2, batch_size=2, flush_interval=60, overflow=overflow
+    )
+    # the first event is picked up by the writer and blocks there
+    buffer.put("INFO", "job", "blocked")
+    assert not buffer.flush(timeout=0.1)
+    for i in range(3):
+        buffer.put("INFO", "job", str(i))
+    assert buffer.dropped == 1
+    recorder.release.set()
+    assert buffer.flush(timeout=10)
+    assert recorder.messages == ["blocked", *expected]
+    buffer.close()
+
+
+def test_event_buffer_write_error() -> None:
+    def failing_writer(batch: list[dict[str, Any]]) -> None:
+        raise ValueError
+
+    buffer = events.EventBuffer(failing_writer, flush_interval=60)
+    buffer.put("INFO", "job", "foo")
+    assert buffer.flush(timeout=10)
+    assert buffer.dropped == 1
+    buffer.close()
+
+
+def test_event_buffer_invalid_overflow() -> None:
+    with pytest.raises(ValueError):
+        events.EventBuffer(lambda batch: None, overflow="foo")  # type: ignore[arg-type]
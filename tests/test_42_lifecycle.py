@@ -0,0 +1,167 @@
+import datetime
+import pathlib
+from typing import Any
+from unittest.mock import MagicMock, patch
+
+import pytest
+import sqlalchemy as sa
+import sqlalchemy.orm
+
+from cads_worker import lifecycle, retry
+
+
+def test_job_lifecycle() -> None:
+    session = MagicMock()
+    session_maker = MagicMock()
+    session_maker.return_value.__enter__.return_value = session
+    system_request = MagicMock()
+    system_request.request_body = {"request": {"foo": "bar"}}
+    system_request.adaptor_properties.form = {"form": 1}
+    system_request.adaptor_properties.config = {"config": 1}
+
+    job = lifecycle.JobLifecycle("job", session_maker)
+    with (
+        patch("cads_broker.database.Events", side_effect=dict) as events,
+        patch(
+            "cads_broker.database.get_request", return_value=system_request
+        ) as get_request,
+        patch("cads_broker.database.set_request_cache_id") as set_request_cache_id,
+    ):
+        assert job.load() == ({"foo": "bar"}, {"form": 1}, {"config": 1})
+        get_request.assert_called_once_with(request_uid="job", session=session)
+        # nothing is recorded until the job is admitted and started
+        events.assert_not_called()
+
+        job.start("tcp://worker")
+        assert [call.kwargs["event_type"] for call in events.call_args_list] == [
+            "worker_pid",
+            "worker_name",
+        ]
+        assert session.commit.call_count == 2
+
+        before = datetime.datetime.now(datetime.timezone.utc)
+        job.add_event("job_metrics", "{}")
+        job.complete(1)
+        set_request_cache_id.assert_called_once_with(
+            request_uid="job", cache_id=1, session=session
+        )
+        event = dict(events.call_args.kwargs)
+        assert (
+            before
+            <= event.pop("timestamp")
+            <= datetime.datetime.now(datetime.timezone.utc)
+        )
+        assert event == {
+            "event_type": "job_metrics",
+            "request_uid": "job",
+            "message": "{}",
+        }
+        assert session.commit.call_count == 3
+
+    assert session_maker.call_count == 3
+    assert set(job.db_latency) == {"load", "start", "complete"}
+
+
+def test_job_lifecycle_reschedule() -> None:
+    session_maker = MagicMock()
+    job = lifecycle.JobLifecycle("job", session_maker)
+    with patch("cads_broker.database.Events", side_effect=dict) as events:
+        job.reschedule("not admitted")
+    assert events.call_args.kwargs == {
+        "event_type": "job_rescheduled",
+        "request_uid": "job",
+        "message": "not admitted",
+        "timestamp": events.call_args.kwargs["timestamp"],
+    }
+    session_maker.return_value.__enter__.return_value.commit.assert_called_once()
+    assert set(job.db_latency) == {"reschedule"}
+
+
+def test_job_lifecycle_retry() -> None:
+    session = MagicMock()
+    session.commit.side_effect = [
+        sa.exc.OperationalError("COMMIT", {}, Exception()),
+        None,
+    ]
+    session_maker = MagicMock()
+    session_maker.return_value.__enter__.return_value = session
+    breaker = retry.CircuitBreaker()
+    job = lifecycle.JobLifecycle("job", session_maker)
+    job.add_event("user_visible_error", "failed")
+    with (
+        patch("cads_broker.database.Events", side_effect=dict) as events,
+        patch.object(
+            retry, "get_retry_policy", return_value=retry.RetryPolicy(base_delay=0)
+        ),
+        patch.object(retry, "get_circuit_breaker", return_value=breaker),
+    ):
+        job.fail()
+    assert session.commit.call_count == 2
+    # the events of the rolled back attempt are added again, with their time
+    first, second = (call.kwargs for call in events.call_args_list)
+    assert first["message"] == second["message"] == "failed"
+    assert first["timestamp"] == second["timestamp"]
+    assert breaker.allow()
+
+    session.commit.side_effect = sa.exc.OperationalError("COMMIT", {}, Exception())
+    job.add_event("user_visible_error", "failed")
+    with (
+        patch("cads_broker.database.Events", side_effect=dict),
+        patch.object(
+            retry, "get_retry_policy", return_value=retry.RetryPolicy(base_delay=0)
+        ),
+        patch.object(retry, "get_circuit_breaker", return_value=breaker),
+        pytest.raises(sa.exc.OperationalError),
+    ):
+        job.fail()
+    assert session.commit.call_count == 5
+
+
+class Base(sa.orm.DeclarativeBase):
+    pass
+
+
+class AdaptorProperties(Base):
+    __tablename__ = "adaptor_properties"
+    hash = sa.Column(sa.String, primary_key=True)
+    form = sa.Column(sa.JSON)
+    config = sa.Column(sa.JSON)
+
+
+class SystemRequest(Base):
+    __tablename__ = "system_requests"
+    request_uid = sa.Column(sa.String, primary_key=True)
+    request_body = sa.Column(sa.JSON)
+    adaptor_properties_hash = sa.Column(
+        sa.String, sa.ForeignKey("adaptor_properties.hash")
+    )
+    adaptor_properties = sa.orm.relationship(AdaptorProperties)
+
+
+def get_request(request_uid: str, session: sa.orm.Session) -> Any:
+    return session.scalars(
+        sa.select(SystemRequest).filter_by(request_uid=request_uid)
+    ).one()
+
+
+def test_job_lifecycle_load(tmp_path: pathlib.Path) -> None:
+    engine = sa.create_engine(f"sqlite:///{tmp_path / 'broker.db'}")
+    Base.metadata.create_all(engine)
+    # expire_on_commit, as the session maker of the worker
+    session_maker = sa.orm.sessionmaker(engine)
+    with session_maker() as session:
+        session.add(
+            SystemRequest(
+                request_uid="job",
+                request_body={"request": {"foo": "bar"}},
+                adaptor_properties=AdaptorProperties(
+                    hash="hash", form={"form": 1}, config={"config": 1}
+                ),
+            )
+        )
+        session.commit()
+
+    job = lifecycle.JobLifecycle("job", session_maker)
+    with patch("cads_broker.database.get_request", get_request):
+        assert job.load() == ({"foo": "bar"}, {"form": 1}, {"config": 1})
+    assert set(job.db_latency) == {"load"}
@@ -0,0 +1,33 @@
+from unittest.mock import patch
+
+from cads_worker import adaptors
+
+
+def test_adaptor_class_cache() -> None:
+    cache = adaptors.AdaptorClassCache(maxsize=2, skip_collections={"impure"})
+    with patch(
+        "cads_adaptors.get_adaptor_class", side_effect=lambda *args: object()
+    ) as get_adaptor_class:
+        foo = cache.get_adaptor_class("foo", "code")
+        assert cache.get_adaptor_class("foo", "code") is foo
+        assert cache.get_adaptor_class("foo", None) is not foo
+        assert (cache.hits, cache.misses) == (1, 2)
+
+        # LRU eviction
+        bar = cache.get_adaptor_class("bar")
+        assert len(cache) == 2
+        assert cache.get_adaptor_class("bar") is bar
+        assert cache.get_adaptor_class("foo", "code") is not foo
+
+        # skipped collections
+        n_calls = get_adaptor_class.call_count
+        cache.get_adaptor_class("bar", collection_id="impure")
+        cache.get_adaptor_class("bar", collection_id="impure")
+        assert get_adaptor_class.call_count == n_calls + 2
+
+
+def test_adaptor_class_cache_disabled() -> None:
+    cache = adaptors.AdaptorClassCache(maxsize=0)
+    with patch("cads_adaptors.get_adaptor_class", side_effect=lambda *args: object()):
+        assert cache.get_adaptor_class("foo") is not cache.get_adaptor_class("foo")
+    assert len(cache) == 0
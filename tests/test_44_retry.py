@@ -0,0 +1,126 @@
+from typing import Any
+from unittest.mock import MagicMock, patch
+
+import pytest
+import sqlalchemy as sa
+from sqlalchemy.orm import Session
+
+from cads_worker import lifecycle, retry, worker
+
+
+def test_retry_policy() -> None:
+    policy = retry.RetryPolicy(attempts=5, base_delay=1, max_delay=3, deadline=60)
+    delays = list(policy.delays())
+    assert len(delays) == 4
+    assert all(
+        0 <= delay <= max_delay for delay, max_delay in zip(delays, [1, 2, 3, 3])
+    )
+
+    policy = retry.RetryPolicy(attempts=5, deadline=0)
+    assert list(policy.delays()) == []
+
+
+def test_circuit_breaker() -> None:
+    breaker = retry.CircuitBreaker(failure_threshold=2, reset_timeout=0.1)
+    breaker.record_failure()
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == "open"
+    assert not breaker.allow()
+
+    with patch("time.monotonic", return_value=float("inf")):
+        assert breaker.allow()
+    assert breaker.state == "half_open"  # type: ignore[comparison-overlap]
+    assert not breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == "open"
+
+    with patch("time.monotonic", return_value=float("inf")):
+        assert breaker.allow()
+    breaker.record_success()
+    assert breaker.state == "closed"
+    assert breaker.failures == 0
+
+
+def test_ensure_session_circuit_breaker() -> None:
+    breaker = retry.CircuitBreaker(failure_threshold=1)
+    policy = retry.RetryPolicy(attempts=2, base_delay=0)
+    context = worker.Context()
+
+    @worker.ensure_session
+    def critical_function(self: Any, session: None | Session = None) -> None:
+        raise sa.exc.OperationalError("Simulated DB error", None, Exception())
+
+    @worker.ensure_session(critical=False)
+    def non_critical_function(self: Any, session: None | Session = None) -> str:
+        return "written"
+
+    with (
+        patch("cads_worker.retry.get_circuit_breaker", return_value=breaker),
+        patch("cads_worker.retry.get_retry_policy", return_value=policy),
+        patch("cads_worker.worker.create_session_maker", return_value=Session),
+    ):
+        with pytest.raises(sa.exc.OperationalError):
+            critical_function(self=context)
+        assert breaker.state == "open"
+
+        with pytest.raises(retry.CircuitOpenError):
+            critical_function(self=context)
+
+        assert non_critical_function(self=context) is None
+        assert breaker.dropped == 1
+
+        # events are queued when the context has an event buffer
+        context.event_buffer = object()  # type: ignore[assignment]
+        assert non_critical_function(self=context) == "written"
+
+
+def test_circuit_breaker_unrecorded_trial() -> None:
+    breaker = retry.CircuitBreaker(failure_threshold=1, reset_timeout=0.1)
+    breaker.record_failure()
+    with patch("time.monotonic", return_value=1e9):
+        assert breaker.allow()
+        assert breaker.state == "half_open"
+        # the outcome of the trial is never recorded
+        assert not breaker.allow()
+    with patch("time.monotonic", return_value=1e9 + 1):
+        assert breaker.allow()
+
+
+def test_ensure_session_half_open_error() -> None:
+    breaker = retry.CircuitBreaker(failure_threshold=1)
+    breaker.record_failure()
+    context = worker.Context()
+
+    @worker.ensure_session
+    def failing_function(self: Any, session: None | Session = None) -> None:
+        raise sa.exc.IntegrityError("INSERT", None, Exception())
+
+    with (
+        patch("cads_worker.retry.get_circuit_breaker", return_value=breaker),
+        patch("cads_worker.worker.create_session_maker", return_value=Session),
+        patch("time.monotonic", return_value=1e9),
+    ):
+        with pytest.raises(sa.exc.IntegrityError):
+            failing_function(self=context)
+    # the trial reached the database
+    assert breaker.state == "closed"
+    assert breaker.allow()
+
+
+def test_job_lifecycle_half_open_error() -> None:
+    breaker = retry.CircuitBreaker(failure_threshold=1)
+    breaker.record_failure()
+    job = lifecycle.JobLifecycle("job", MagicMock())
+    with (
+        patch("cads_worker.retry.get_circuit_breaker", return_value=breaker),
+        patch("cads_broker.database.Events", side_effect=dict),
+        patch(
+            "cads_broker.database.set_request_cache_id",
+            side_effect=sa.exc.NoResultFound(),
+        ),
+        patch("time.monotonic", return_value=1e9),
+        pytest.raises(sa.exc.NoResultFound),
+    ):
+        job.complete(1)
+    assert breaker.state == "closed"
@@ -0,0 +1,80 @@
+import pathlib
+import threading
+from unittest.mock import patch
+
+import prometheus_client
+import pytest
+import sqlalchemy as sa
+import sqlalchemy.orm
+
+from cads_worker import db
+
+
+def get_sample_value(name: str) -> float:
+    return prometheus_client.REGISTRY.get_sample_value(name) or 0
+
+
+def test_create_engine(tmp_path: pathlib.Path) -> None:
+    engine = db.create_engine(
+        f"sqlite:///{tmp_path / 'test.db'}", pool_size=1, max_overflow=0
+    )
+    assert isinstance(engine.pool, db.InstrumentedQueuePool)
+    assert engine.pool.size() == 1
+
+    session_maker = sa.orm.sessionmaker(engine)
+    with session_maker() as session:
+        assert session.scalar(sa.text("SELECT 1")) == 1
+        stats = db.get_pool_stats(session_maker)
+        assert stats["checked_out"] == 1
+    stats = db.get_pool_stats(session_maker)
+    assert stats["checked_out"] == 0
+    assert stats["checkouts"] == 1
+
+
+def test_pool_wait_time(tmp_path: pathlib.Path) -> None:
+    engine = db.create_engine(
+        f"sqlite:///{tmp_path / 'test.db'}",
+        pool_size=1,
+        max_overflow=0,
+        pool_timeout=0.1,
+    )
+    session_maker = sa.orm.sessionmaker(engine)
+    timeouts = get_sample_value("cads_worker_db_pool_timeouts_total")
+    with engine.connect():
+        with pytest.raises(sa.exc.TimeoutError):
+            with session_maker() as session:
+                session.execute(sa.text("SELECT 1"))
+    stats = db.get_pool_stats(session_maker)
+    assert stats["timeouts"] == 1
+    assert stats["max_wait_time"] >= 0.1
+    assert get_sample_value("cads_worker_db_pool_timeouts_total") == timeouts + 1
+
+    released = threading.Event()
+
+    def hold_connection() -> None:
+        with engine.connect():
+            released.wait()
+
+    thread = threading.Thread(target=hold_connection)
+    thread.start()
+    threading.Timer(0.05, released.set).start()
+    engine.pool._timeout = 5  # type: ignore[attr-defined]
+    with engine.connect():
+        pass
+    thread.join()
+    assert db.get_pool_stats(session_maker)["checkouts"] == 4
+
+
+def test_get_default_pool_size() -> None:
+    with patch("os.cpu_count", return_value=3):
+        assert db.get_default_pool_size() == 3
+
+
+def test_create_session_maker_metrics(tmp_path: pathlib.Path) -> None:
+    settings = type("Settings", (), {"connection_string": f"sqlite:///{tmp_path}.db"})
+    with patch("cads_broker.config.ensure_settings", return_value=settings):
+        session_maker = db.create_session_maker()
+    with session_maker() as session:
+        session.execute(sa.text("SELECT 1"))
+        assert get_sample_value("cads_worker_db_pool_checked_out") == 1
+    assert get_sample_value("cads_worker_db_pool_checked_out") == 0
@@ -0,0 +1,77 @@
+import pathlib
+from unittest.mock import patch
+
+import cacholote
+import pytest
+
+from cads_worker import publish, worker
+
+
+def test_get_publish_settings(
+    tmp_path: pathlib.Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    assert publish.get_publish_settings(str(tmp_path)) == {"io_delete_original": False}
+
+    monkeypatch.setenv("WORKER_PUBLISH_MOVE_LOCAL", "true")
+    assert publish.get_publish_settings(str(tmp_path)) == {"io_delete_original": True}
+
+    monkeypatch.setenv("WORKER_S3_MAX_CONCURRENCY", "4")
+    assert publish.get_publish_settings("s3://bucket") == {
+        "cache_files_storage_options": {
+            "s3_additional_kwargs": {"ACL": "public-read"},
+            "max_concurrency": 4,
+        }
+    }
+
+    assert publish.get_publish_settings("memory://bucket") == {}
+
+
+def test_get_publish_settings_storage_options() -> None:
+    storage_options = {
+        "key": "key",
+        "client_kwargs": {"endpoint_url": "http://localhost:9000"},
+        "s3_additional_kwargs": {"ServerSideEncryption": "AES256"},
+        "max_concurrency": 2,
+    }
+    with cacholote.config.set(cache_files_storage_options=storage_options):
+        settings = publish.get_publish_settings("s3://bucket")
+    assert settings == {
+        "cache_files_storage_options": {
+            "key": "key",
+            "client_kwargs": {"endpoint_url": "http://localhost:9000"},
+            "s3_additional_kwargs": {
+                "ACL": "public-read",
+                "ServerSideEncryption": "AES256",
+            },
+            "max_concurrency": 2,
+        }
+    }
+    # the configured storage options are not modified
+    assert storage_options["s3_additional_kwargs"] == {"ServerSideEncryption": "AES256"}
+
+
+def test_publish_keeps_adaptor_files(tmp_path: pathlib.Path) -> None:
+    # e.g., an input or a shared file returned by an adaptor
+    shared_path = tmp_path / "shared.grib"
+    shared_path.write_text("shared")
+    cache_files_urlpath = str(tmp_path / "cache_files")
+    with cacholote.config.set(
+        cache_db_urlpath=f"sqlite:///{tmp_path / 'cacholote.db'}",
+        cache_files_urlpath=cache_files_urlpath,
+        **publish.get_publish_settings(cache_files_urlpath),
+    ):
+        cached_path = pathlib.Path(cacholote.cacheable(open)(shared_path).name)
+    assert cached_path.read_text() == "shared"
+    assert shared_path.read_text() == "shared"
+
+
+def test_context_upload_time() -> None:
+    context = worker.Context()
+    with (
+        patch.object(context, "add_stdout"),
+        patch("time.perf_counter", side_effect=[1.0, 3.0, 10.0, 11.0]),
+    ):
+        for _ in range(2):
+            context.upload_log("start upload. urlpath=foo")
+            context.upload_log("end upload. urlpath=foo, upload_time=...")
+    assert context.upload_time == 3.0
@@ -0,0 +1,56 @@
+import json
+from unittest.mock import MagicMock, patch
+
+from cads_worker import profiling, worker
+
+
+def test_job_profile() -> None:
+    with patch("cads_worker.utils.get_rss", return_value=100):
+        profile = profiling.JobProfile()
+    with (
+        patch("time.perf_counter", side_effect=[1.0, 3.0, 4.0, 5.0]),
+        patch("cads_worker.utils.get_rss", side_effect=[150, 120]),
+    ):
+        for _ in range(2):
+            with profile.phase("retrieve"):
+                pass
+    profile.bytes_written = 10
+    with patch("cads_worker.utils.get_rss", return_value=110):
+        summary = profile.summary()
+    assert summary["phases"] == {"retrieve": 3.0}
+    assert summary["bytes_written"] == 10
+    assert summary["rss_growth"] == 50
+    assert summary["process_max_rss"] > 0
+    assert set(summary) == {
+        "phases",
+        "elapsed",
+        "cpu_time",
+        "rss_growth",
+        "process_max_rss",
+        "bytes_written",
+        "scratch_high_water",
+    }
+
+    profile = profiling.JobProfile(enabled=False)
+    with profile.phase("retrieve"):
+        pass
+    assert profile.phases == {}
+
+
+def test_add_profile_event() -> None:
+    job = MagicMock(db_latency={"load": 0.2, "start": 0.1})
+    context = worker.Context()
+    context.upload_time = 2.0
+    profile = profiling.JobProfile()
+    worker.add_profile_event(job, profile, context)
+    ((event_type, message), _) = job.add_event.call_args
+    assert event_type == "job_profile"
+    assert json.loads(message)["phases"] == {
+        "load": 0.2,
+        "start": 0.1,
+        "publish": 2.0,
+    }
+
+    job.reset_mock()
+    worker.add_profile_event(job, profiling.JobProfile(enabled=False), context)
+    job.add_event.assert_not_called()
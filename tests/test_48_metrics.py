@@ -0,0 +1,60 @@
+import urllib.request
+from unittest.mock import MagicMock
+
+import prometheus_client
+import pytest
+
+from cads_worker import metrics, worker
+
+
+def test_labels_cardinality() -> None:
+    registry = prometheus_client.CollectorRegistry()
+    counter = prometheus_client.Counter("test", "Test.", ("volume",), registry=registry)
+    metrics.labels(counter, max_label_sets=2, volume="a").inc()
+    metrics.labels(counter, max_label_sets=2, volume="b").inc(2)
+    metrics.labels(counter, max_label_sets=2, volume="c").inc()
+    metrics.labels(counter, max_label_sets=2, volume="d").inc()
+    metrics.labels(counter, max_label_sets=2, volume="a").inc()
+
+    def get(volume: str) -> float | None:
+        return registry.get_sample_value("test_total", {"volume": volume})
+
+    assert get("a") == 2
+    assert get("b") == 2
+    assert get("c") is None
+    assert get(metrics.OTHER) == 2
+    with pytest.raises(KeyError):
+        metrics.labels(counter, collection_id="a")
+
+
+def test_scrape(monkeypatch: pytest.MonkeyPatch) -> None:
+    before = (
+        prometheus_client.REGISTRY.get_sample_value(
+            "cads_worker_events_total", {"event_type": "INFO"}
+        )
+        or 0
+    )
+    worker.Context(event_buffer=MagicMock()).add_event("INFO", "uid", "foo", None)
+    assert (
+        prometheus_client.REGISTRY.get_sample_value(
+            "cads_worker_events_total", {"event_type": "INFO"}
+        )
+        == before + 1
+    )
+
+    monkeypatch.delenv("WORKER_METRICS_PORT", raising=False)
+    plugin = metrics.MetricsPlugin(addr="127.0.0.1")
+    plugin.setup(MagicMock())
+    assert plugin.server is None
+
+    plugin = metrics.MetricsPlugin(port=0, addr="127.0.0.1")
+    plugin.setup(MagicMock())
+    assert plugin.server is not None
+    port = plugin.server.server_address[1]
+    try:
+        with urllib.request.urlopen(f"http://127.0.0.1:{port}/metrics") as response:
+            body = response.read().decode()
+    finally:
+        plugin.teardown(MagicMock())
+    assert "# TYPE cads_worker_jobs_total counter" in body
+    assert 'cads_worker_events_total{event_type="INFO"}' in body
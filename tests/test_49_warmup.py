@@ -0,0 +1,72 @@
+import asyncio
+import os
+import pathlib
+from unittest.mock import MagicMock, patch
+
+import pytest
+import sqlalchemy as sa
+import sqlalchemy.orm
+
+from cads_worker import adaptors, db, models, schedulers, warmup
+
+
+def test_warm_up(tmp_path: pathlib.Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    data_volumes_config = tmp_path / "volumes.yaml"
+    data_volumes_config.write_text(f"{tmp_path / 'volume'}:\n")
+    monkeypatch.setenv("DATA_VOLUMES_CONFIG", str(data_volumes_config))
+    monkeypatch.setenv("WORKER_WARMUP_ENTRY_POINTS", "foo:Foo, bar:Bar")
+    engine = db.create_engine(f"sqlite:///{tmp_path / 'test.db'}", pool_size=2)
+    session_maker = sa.orm.sessionmaker(engine)
+
+    models._get_volume_registry.cache_clear()
+    adaptors.get_adaptor_class_cache.cache_clear()
+    with (
+        patch("cads_worker.worker.create_session_maker", return_value=session_maker),
+        patch("cads_adaptors.get_adaptor_class") as get_adaptor_class,
+    ):
+        durations = warmup.warm_up()
+    assert set(durations) == {"logger", "database", "volumes", "adaptors", "total"}
+    assert engine.pool.checkedin() == 2  # type: ignore[attr-defined]
+    assert [call.args for call in get_adaptor_class.call_args_list] == [
+        ("foo:Foo", None),
+        ("bar:Bar", None),
+    ]
+    assert len(adaptors.get_adaptor_class_cache()) == 2
+    models._get_volume_registry.cache_clear()
+    adaptors.get_adaptor_class_cache.cache_clear()
+
+
+def test_warm_up_failing_step() -> None:
+    with patch(
+        "cads_worker.worker.create_session_maker", side_effect=RuntimeError("down")
+    ):
+        durations = warmup.warm_up(["database", "logger"])
+    assert set(durations) == {"logger", "total"}
+
+    with pytest.raises(NotImplementedError, match="step='foo'"):
+        warmup.warm_up(["foo"])
+
+
+def test_warm_up_plugin(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.delenv("WORKER_DB_POOL_SIZE", raising=False)
+    dask_worker = MagicMock()
+    dask_worker.state.nthreads = 3
+    plugin = warmup.WarmUpPlugin(steps=["logger"])
+    asyncio.run(plugin.setup(worker=dask_worker))
+    assert set(plugin.durations) == {"logger", "total"}
+    assert os.environ["WORKER_DB_POOL_SIZE"] == "3"
+
+
+def test_dask_setup_invalid_scheduler(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setenv("WORKER_SCHEDULER_TYPE", "foo")
+    monkeypatch.setenv("WORKER_WARMUP", "false")
+    schedulers.get_default_profile.cache_clear()
+    dask_worker = MagicMock()
+    try:
+        with pytest.raises(NotImplementedError, match="scheduler='foo'"):
+            asyncio.run(warmup.dask_setup(dask_worker))
+        with pytest.raises(NotImplementedError, match="scheduler='foo'"):
+            asyncio.run(warmup.WarmUpPlugin(steps=[]).setup(worker=dask_worker))
+    finally:
+        schedulers.get_default_profile.cache_clear()
+    dask_worker.plugin_add.assert_not_called()
@@ -0,0 +1,30 @@
+import subprocess
+import sys
+
+# slow modules that are imported on first use
+LAZY_MODULES = {"boto3", "cacholote", "cads_adaptors", "pandas", "xarray"}
+
+
+def import_modules(*modules: str) -> set[str]:
+    """Import modules in a fresh interpreter, return the modules imported."""
+    process = subprocess.run(
+        [
+            sys.executable,
+            "-c",
+            f"import sys, {', '.join(modules)}; print(' '.join(sys.modules))",
+        ],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    return set(process.stdout.split())
+
+
+def test_import_time_entry_points() -> None:
+    modules = import_modules("cads_worker.entry_points")
+    assert not (LAZY_MODULES | {"dask", "distributed", "sqlalchemy"}) & modules
+
+
+def test_import_time_worker() -> None:
+    modules = import_modules("cads_worker.worker")
+    assert not (LAZY_MODULES | {"cads_broker.database"}) & modules
@@ -0,0 +1,82 @@
+import threading
+from unittest.mock import patch
+
+import pytest
+
+from cads_worker import admission
+
+
+def test_estimate() -> None:
+    controller = admission.AdmissionController(
+        memory={"era5": 1_000}, default_memory=10, memory_per_item=1
+    )
+    request = {"variable": ["a", "b"], "year": ["2000", "2001", "2002"], "area": 1}
+    assert admission.get_request_items(request) == 6
+    assert admission.get_request_items({}) == 1
+    assert controller.estimate("era5", request) == 1_006
+    assert controller.estimate("other", {"variable": []}) == 11
+    assert controller.estimate(None, {}) == 11
+
+
+def test_caps() -> None:
+    controller = admission.AdmissionController(
+        caps={"heavy": 1}, default_cap=2, max_wait=0
+    )
+    heavy = controller.acquire("heavy", 0)
+    with pytest.raises(admission.AdmissionTimeoutError):
+        controller.acquire("heavy", 0)
+    light = [controller.acquire("light", 0) for _ in range(2)]
+    with pytest.raises(admission.AdmissionTimeoutError):
+        controller.acquire("light", 0)
+    assert controller.running == {"heavy": 1, "light": 2}
+
+    controller.release(heavy)
+    for ticket in light:
+        controller.release(ticket)
+    assert controller.running == {}
+
+
+def test_memory_budget() -> None:
+    controller = admission.AdmissionController(memory_budget=100, max_wait=0)
+    with patch("cads_worker.utils.get_rss", return_value=20):
+        # a job running alone is always admitted
+        big = controller.acquire("foo", 200)
+        with pytest.raises(admission.AdmissionTimeoutError):
+            controller.acquire("foo", 0)
+        controller.release(big)
+
+        first = controller.acquire("foo", 60)
+        with pytest.raises(admission.AdmissionTimeoutError):
+            controller.acquire("foo", 50)
+        second = controller.acquire("foo", 40)
+        assert controller.reserved_memory == 100
+        controller.release(first)
+        controller.release(second)
+
+    # live RSS above the reserved memory
+    with patch("cads_worker.utils.get_rss", return_value=90):
+        ticket = controller.acquire("foo", 10)
+        with pytest.raises(admission.AdmissionTimeoutError):
+            controller.acquire("foo", 20)
+        controller.release(ticket)
+
+
+def test_wait() -> None:
+    controller = admission.AdmissionController(
+        default_cap=1, max_wait=10, poll_interval=0.01
+    )
+    ticket = controller.acquire("foo", 0)
+    timer = threading.Timer(0.05, controller.release, [ticket])
+    timer.start()
+    controller.release(controller.acquire("foo", 0))
+    timer.join()
+    assert controller.running == {}
+
+
+def test_get_memory_budget(monkeypatch: pytest.MonkeyPatch) -> None:
+    assert admission.get_memory_budget() == 0
+    monkeypatch.setenv("WORKER_ADMISSION_MEMORY_BUDGET", "4GB")
+    assert admission.get_memory_budget() == 4_000_000_000
+    # no Dask worker
+    monkeypatch.setenv("WORKER_ADMISSION_MEMORY_BUDGET", "auto")
+    assert admission.get_memory_budget() == 0
@@ -0,0 +1,107 @@
+import os
+import threading
+
+import dask.config
+import pytest
+from dask.base import compute
+from dask.delayed import delayed
+
+from cads_worker import schedulers
+
+
+def get_thread_name() -> str:
+    return threading.current_thread().name
+
+
+def compute_thread_names(n: int = 4) -> set[str]:
+    (names,) = compute([delayed(get_thread_name)() for _ in range(n)])  # type: ignore[no-untyped-call]
+    return set(names)
+
+
+def test_scheduler_profile() -> None:
+    profile = schedulers.SchedulerProfile.from_string
+    assert profile("single-threaded") == schedulers.SchedulerProfile()
+    assert profile("sync") == schedulers.SchedulerProfile()
+    assert profile("threads:8") == schedulers.SchedulerProfile("threads", 8)
+    assert profile("processes:2") == schedulers.SchedulerProfile("processes", 2)
+    assert profile("threading").num_workers == (os.cpu_count() or 1)
+    with pytest.raises(NotImplementedError, match="scheduler='foo'"):
+        profile("foo:2")
+
+
+def test_thread_budget() -> None:
+    budget = schedulers.ThreadBudget(4)
+    assert budget.acquire(3) == 3
+    assert budget.acquire(3) == 1
+    assert budget.acquire(3) == 1
+    assert budget.used == 5
+    budget.release(5)
+    assert budget.acquire(8) == 4
+
+
+def test_use_scheduler() -> None:
+    with dask.config.set(scheduler=schedulers.dispatch):
+        assert compute_thread_names() == {get_thread_name()}
+
+        profile = schedulers.SchedulerProfile("threads", 2)
+        budget = schedulers.ThreadBudget(8)
+        with schedulers.use_scheduler(profile, budget) as used:
+            assert used == profile
+            assert budget.used == 2
+            names = compute_thread_names()
+            assert all(name.startswith("cads-worker-dask") for name in names)
+        assert budget.used == 0
+
+        # the scheduler of a job doesn't leak into other threads
+        results: list[set[str]] = []
+        with schedulers.use_scheduler(profile):
+            thread = threading.Thread(
+                target=lambda: results.append(compute_thread_names())
+            )
+            thread.start()
+            thread.join()
+        assert results == [{thread.name}]
+
+
+def test_use_scheduler_processes() -> None:
+    profile = schedulers.SchedulerProfile("processes", 2)
+    with (
+        dask.config.set(scheduler=schedulers.dispatch),
+        schedulers.use_scheduler(profile),
+    ):
+        (pid,) = compute(delayed(os.getpid)())  # type: ignore[no-untyped-call]
+    assert pid != os.getpid()
+
+
+def test_job_scheduler(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setenv("WORKER_SCHEDULER_PROFILES", "heavy=threads:4")
+    monkeypatch.setenv("WORKER_SCHEDULER_MAX_THREADS", "3")
+    for func in (
+        schedulers.get_profiles,
+        schedulers.get_default_profile,
+        schedulers.get_thread_budget,
+    ):
+        func.cache_clear()
+    with dask.config.set(scheduler="sync"):
+        with schedulers.job_scheduler("heavy") as profile:
+            assert profile == schedulers.SchedulerProfile("threads", 3)
+            assert dask.config.get("scheduler") is schedulers.dispatch
+        with schedulers.job_scheduler("light") as profile:
+            assert profile == schedulers.SchedulerProfile()
+    schedulers.install.cache_clear()
+    schedulers.get_profiles.cache_clear()
+    schedulers.get_thread_budget.cache_clear()
+
+
+def test_parse_worker_profile() -> None:
+    assert schedulers.parse_worker_profile("threads:2") == schedulers.SchedulerProfile(
+        "threads", 2
+    )
+    with (
+        dask.config.set({"distributed.worker.daemon": True}),
+        pytest.raises(ValueError, match="non-daemonic"),
+    ):
+        schedulers.parse_worker_profile("processes:2")
+    with dask.config.set({"distributed.worker.daemon": False}):
+        profile = schedulers.parse_worker_profile("processes:2")
+    assert profile == schedulers.SchedulerProfile("processes", 2)